@@ -51,6 +51,8 @@ class PollingTask(object):
 
 class AgentManager(os_service.Service):
 
+    pipeline_manager = None
+
     def __init__(self, extension_manager):
         super(AgentManager, self).__init__()
 
@@ -88,6 +90,11 @@ class AgentManager(os_service.Service):
                               self.interval_task,
                               task=task)
 
+    def stop(self):
+        super(AgentManager, self).stop()
+        if self.pipeline_manager:
+            self.pipeline_manager.close()
+
     @staticmethod
     def interval_task(task):
         task.poll_and_publish()
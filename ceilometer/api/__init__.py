@@ -30,6 +30,16 @@ API_SERVICE_OPTS = [
                default='0.0.0.0',
                help='The listen IP for the ceilometer API server',
                ),
+    cfg.IntOpt('workers',
+               default=1,
+               help='Number of processes serving the API, each with its '
+                    'own storage connection',
+               ),
+    cfg.IntOpt('max_concurrent_requests',
+               default=100,
+               help='Maximum number of requests each API process handles '
+                    'concurrently, using green threads',
+               ),
 ]
 
 CONF = cfg.CONF
@@ -18,8 +18,9 @@
 
 import logging
 import os
-from wsgiref import simple_server
 
+import eventlet
+import eventlet.wsgi
 from oslo.config import cfg
 import pecan
 
@@ -28,6 +29,7 @@ from ceilometer.api import config as api_config
 from ceilometer.api import hooks
 from ceilometer.api import middleware
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import service as os_service
 from ceilometer import service
 from ceilometer import storage
 
@@ -107,15 +109,50 @@ class VersionSelectorApplication(object):
         return self.v2(environ, start_response)
 
 
+# Seconds a stopping worker waits for the requests in progress to complete
+SHUTDOWN_TIMEOUT = 30
+
+
+class APIService(os_service.Service):
+    """Serve the API on a listening socket with an eventlet WSGI server.
+
+    The application, and thus the storage connection, is built when the
+    service starts so each worker process gets its own. On stop, the
+    service stops accepting connections and lets the requests in progress
+    complete, which makes restarts on SIGHUP graceful.
+    """
+
+    def __init__(self, sock):
+        super(APIService, self).__init__()
+        self.sock = sock
+        self.pool = None
+
+    def start(self):
+        super(APIService, self).start()
+        app = VersionSelectorApplication()
+        self.pool = eventlet.GreenPool(cfg.CONF.api.max_concurrent_requests)
+        # NOTE: the server closes the socket it is given when it exits,
+        # give it a copy so the service can be started again.
+        self.tg.add_thread(eventlet.wsgi.server, self.sock.dup(), app,
+                           custom_pool=self.pool,
+                           log=log.WritableLogger(LOG))
+
+    def stop(self):
+        # Stop accepting connections before waiting for the requests in
+        # progress, idle keep-alive connections are dropped on timeout.
+        self.tg.stop()
+        if self.pool is not None:
+            with eventlet.Timeout(SHUTDOWN_TIMEOUT, False):
+                self.pool.waitall()
+        super(APIService, self).stop()
+
+
 def start():
     service.prepare_service()
 
-    # Build the WSGI app
-    root = VersionSelectorApplication()
-
-    # Create the WSGI server and start it
+    # Open the socket before forking so all the workers share it
     host, port = cfg.CONF.api.host, cfg.CONF.api.port
-    srv = simple_server.make_server(host, port, root)
+    sock = eventlet.listen((host, port))
 
     LOG.info(_('Starting server in PID %s') % os.getpid())
     LOG.info(_("Configuration:"))
@@ -129,4 +166,7 @@ def start():
         LOG.info(_("serving on http://%(host)s:%(port)s") % (
                  {'host': host, 'port': port}))
 
-    srv.serve_forever()
+    workers = cfg.CONF.api.workers
+    launcher = os_service.launch(APIService(sock),
+                                 workers=workers if workers > 1 else None)
+    launcher.wait()
@@ -28,6 +28,7 @@ import copy
 import datetime
 import functools
 import inspect
+import itertools
 import json
 import uuid
 
@@ -36,6 +37,7 @@ import pecan
 from pecan import rest
 import six
 import wsme
+import wsme.rest.json
 from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
@@ -67,6 +69,8 @@ state_kind = ["ok", "alarm", "insufficient data"]
 state_kind_enum = wtypes.Enum(str, *state_kind)
 operation_kind = wtypes.Enum(str, 'lt', 'le', 'eq', 'ne', 'ge', 'gt')
 
+NDJSON = 'application/x-ndjson'
+
 
 class ClientSideError(wsme.exc.ClientSideError):
     def __init__(self, error, status_code=400):
@@ -532,6 +536,63 @@ def _send_notification(event, payload):
                   notification, notify.INFO, payload)
 
 
+def _ndjson_requested():
+    return pecan.request.pecan['content_type'] == NDJSON
+
+
+def _list_or_stream(items):
+    """Return the items as a list, or as an iterator consuming them lazily
+    if the response is streamed.
+
+    The first item is fetched right away so errors raised by the storage
+    driver are still reported to the client with the proper status.
+    """
+    if not _ndjson_requested():
+        return list(items)
+    items = iter(items)
+    try:
+        first = next(items)
+    except StopIteration:
+        return []
+    return itertools.chain([first], items)
+
+
+def wsexpose_streamable(*args, **kwargs):
+    """Like wsexpose, for a method returning a list, which is streamed as
+    newline delimited JSON, one item per line, when the client accepts
+    application/x-ndjson.
+
+    The method should build its result with _list_or_stream().
+    """
+    def decorate(func):
+        # NOTE: the content type is registered on the method before
+        # wsexpose wraps it, so wsexpose, which keeps the pecan
+        # configuration of the method, still sets the default one.
+        return _stream(wsme_pecan.wsexpose(*args, **kwargs)(
+            pecan.expose(content_type=NDJSON)(func)))
+    return decorate
+
+
+def _stream(func):
+    @functools.wraps(func)
+    def callfunction(self, *args, **kwargs):
+        result = func(self, *args, **kwargs)
+        if not _ndjson_requested():
+            return result
+        if 'faultcode' in result:
+            pecan.response.content_type = 'application/json'
+            pecan.response.body = wsme.rest.json.encode_error(None, result)
+        else:
+            item_type = result['datatype'].item_type
+            pecan.response.content_type = NDJSON
+            pecan.response.app_iter = (
+                json.dumps(wsme.rest.json.tojson(item_type, item)) + '\n'
+                for item in result['result'])
+        return pecan.response
+
+    return callfunction
+
+
 class OldSample(_Base):
     """A single measurement for a given meter and resource.
 
@@ -880,15 +941,16 @@ class MetersController(rest.RestController):
             remainder = remainder[:-1]
         return MeterController(meter_id), remainder
 
-    @wsme_pecan.wsexpose([Meter], [Query])
+    @wsexpose_streamable([Meter], [Query])
     def get_all(self, q=[]):
         """Return all known meters, based on the data recorded so far.
 
         :param q: Filter rules for the meters to be returned.
         """
         kwargs = _query_to_kwargs(q, pecan.request.storage_conn.get_meters)
-        return [Meter.from_db_model(m)
-                for m in pecan.request.storage_conn.get_meters(**kwargs)]
+        return _list_or_stream(
+            Meter.from_db_model(m)
+            for m in pecan.request.storage_conn.get_meters(**kwargs))
 
 
 class Sample(_Base):
@@ -959,7 +1021,7 @@ class Sample(_Base):
 class SamplesController(rest.RestController):
     """Controller managing the samples."""
 
-    @wsme_pecan.wsexpose([Sample], [Query], int)
+    @wsexpose_streamable([Sample], [Query], int)
     def get_all(self, q=[], limit=None):
         """Return all known samples, based on the data recorded so far.
 
@@ -970,8 +1032,10 @@ class SamplesController(rest.RestController):
             raise ClientSideError(_("Limit must be positive"))
         kwargs = _query_to_kwargs(q, storage.SampleFilter.__init__)
         f = storage.SampleFilter(**kwargs)
-        return map(Sample.from_db_model,
-                   pecan.request.storage_conn.get_samples(f, limit=limit))
+        return _list_or_stream(
+            itertools.imap(Sample.from_db_model,
+                           pecan.request.storage_conn.get_samples(
+                               f, limit=limit)))
 
 
 class Resource(_Base):
@@ -1029,13 +1093,12 @@ class Resource(_Base):
 class ResourcesController(rest.RestController):
     """Works on resources."""
 
-    def _resource_links(self, resource_id):
-        links = [_make_link('self', pecan.request.host_url, 'resources',
-                            resource_id)]
-        for meter in pecan.request.storage_conn.get_meters(resource=
-                                                           resource_id):
+    @staticmethod
+    def _resource_links(resource_id, conn, host_url):
+        links = [_make_link('self', host_url, 'resources', resource_id)]
+        for meter in conn.get_meters(resource=resource_id):
             query = {'field': 'resource_id', 'value': resource_id}
-            links.append(_make_link(meter.name, pecan.request.host_url,
+            links.append(_make_link(meter.name, host_url,
                                     'meters', meter.name, query=query))
         return links
 
@@ -1050,21 +1113,26 @@ class ResourcesController(rest.RestController):
             resource=resource_id, project=authorized_project))
         if not resources:
             raise EntityNotFound(_('Resource'), resource_id)
-        return Resource.from_db_and_links(resources[0],
-                                          self._resource_links(resource_id))
+        return Resource.from_db_and_links(
+            resources[0],
+            self._resource_links(resource_id, pecan.request.storage_conn,
+                                 pecan.request.host_url))
 
-    @wsme_pecan.wsexpose([Resource], [Query])
+    @wsexpose_streamable([Resource], [Query])
     def get_all(self, q=[]):
         """Retrieve definitions of all of the resources.
 
         :param q: Filter rules for the resources to be returned.
         """
         kwargs = _query_to_kwargs(q, pecan.request.storage_conn.get_resources)
-        resources = [
-            Resource.from_db_and_links(r,
-                                       self._resource_links(r.resource_id))
-            for r in pecan.request.storage_conn.get_resources(**kwargs)]
-        return resources
+        # NOTE: the links may be computed once the request is over if the
+        # response is streamed, so don't use pecan.request there.
+        conn = pecan.request.storage_conn
+        host_url = pecan.request.host_url
+        return _list_or_stream(
+            Resource.from_db_and_links(
+                r, self._resource_links(r.resource_id, conn, host_url))
+            for r in conn.get_resources(**kwargs))
 
 
 class AlarmThresholdRule(_Base):
@@ -0,0 +1,213 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Archive files of metering messages.
+
+The messages are written through a buffer either as line-delimited JSON
+or as msgpack records prefixed by their length. Archive files are rotated
+once they reach a size or an age, and can be compressed when rotated.
+"""
+
+import contextlib
+import datetime
+import glob
+import gzip
+import itertools
+import json
+import os
+import shutil
+import struct
+import time
+
+import eventlet
+import msgpack
+from oslo.config import cfg
+
+from ceilometer.openstack.common.gettextutils import _  # noqa
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import service
+
+LOG = log.getLogger(__name__)
+
+FORMATS = ('json', 'msgpack')
+
+# Length prefix of the msgpack records
+_LENGTH = struct.Struct('>I')
+
+
+def _default(obj):
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    return unicode(obj)
+
+
+def encode(record, format):
+    """Return a record encoded for an archive file of the given format."""
+    if format == 'json':
+        return json.dumps(record, default=_default) + '\n'
+    packed = msgpack.dumps(record, default=_default)
+    return _LENGTH.pack(len(packed)) + packed
+
+
+class ArchiveWriter(object):
+    """Write records to an archive file through a buffer.
+
+    The buffer is flushed every flush_interval seconds, or after each
+    write if it is 0. The file is rotated once it holds max_bytes or was
+    opened max_age seconds ago: the rotated file gets a timestamp suffix,
+    is gzipped if compress is set, and only the backup_count most recent
+    rotated files are kept. 0 disables any of these limits. The age and
+    the flush are checked by a timer as well as when writing, so an idle
+    file doesn't keep its records in the buffer; close() flushes them.
+    """
+
+    def __init__(self, path, format='json', max_bytes=0, max_age=0,
+                 backup_count=0, compress=False, buffer_size=64 * 1024,
+                 flush_interval=1):
+        if format not in FORMATS:
+            raise ValueError(_('Unknown archive format %s') % format)
+        self.path = path
+        self.format = format
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._open()
+        self.timer = None
+        if flush_interval:
+            self.timer = eventlet.spawn_after(flush_interval, self._tick)
+
+    def _open(self):
+        self.stream = open(self.path, 'ab', self.buffer_size)
+        self.size = os.fstat(self.stream.fileno()).st_size
+        self.opened_at = self.flushed_at = time.time()
+
+    def write(self, records):
+        data = ''.join(encode(r, self.format) for r in records)
+        self.stream.write(data)
+        self.size += len(data)
+        if self.max_bytes and self.size >= self.max_bytes:
+            self.rotate()
+        else:
+            self.check()
+
+    def check(self):
+        """Rotate the file if it is too old, else flush it if it's time."""
+        now = time.time()
+        if self.max_age and now - self.opened_at >= self.max_age:
+            self.rotate()
+        elif now - self.flushed_at >= self.flush_interval:
+            self.stream.flush()
+            self.flushed_at = now
+
+    def _tick(self):
+        try:
+            self.check()
+        except Exception:
+            LOG.exception(_('Unable to flush archive %s'), self.path)
+        self.timer = eventlet.spawn_after(self.flush_interval, self._tick)
+
+    def rotate(self):
+        self.stream.close()
+        if self.size:
+            name = '%s.%s' % (self.path,
+                              timeutils.utcnow().strftime('%Y%m%d%H%M%S%f'))
+            os.rename(self.path, name)
+            if self.compress:
+                with contextlib.closing(open(name, 'rb')) as src:
+                    with contextlib.closing(gzip.open(name + '.gz',
+                                                      'wb')) as dst:
+                        shutil.copyfileobj(src, dst)
+                os.remove(name)
+            if self.backup_count:
+                rotated = sorted(glob.glob(self.path + '.[0-9]*'))
+                for old in rotated[:-self.backup_count]:
+                    os.remove(old)
+        self._open()
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.stream.close()
+
+
+def read_archive(path):
+    """Yield the records of an archive file, gzipped or not.
+
+    The format is told from the first byte, an opening brace being a
+    JSON record rather than the start of a 2GB msgpack one. A record
+    truncated by a crash of the writer ends the reading.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with contextlib.closing(opener(path, 'rb')) as f:
+        first = f.read(1)
+        if first == '{':
+            for line in itertools.chain([first + f.readline()], f):
+                if not line.endswith('\n'):
+                    LOG.warn(_('Truncated record at the end of %s'), path)
+                    return
+                yield json.loads(line)
+        elif first:
+            header = first + f.read(_LENGTH.size - 1)
+            while header:
+                packed = ''
+                if len(header) == _LENGTH.size:
+                    length, = _LENGTH.unpack(header)
+                    packed = f.read(length)
+                if not packed or len(packed) < length:
+                    LOG.warn(_('Truncated record at the end of %s'), path)
+                    return
+                yield msgpack.loads(packed)
+                header = f.read(_LENGTH.size)
+
+
+def replay_archive(path, dispatcher_manager, batch_size=100):
+    """Hand the metering messages of an archive file to the dispatchers.
+
+    :returns: the number of messages replayed.
+    """
+    count = 0
+    batch = []
+    for record in read_archive(path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            dispatcher_manager.map_method('record_metering_data', data=batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        dispatcher_manager.map_method('record_metering_data', data=batch)
+        count += len(batch)
+    return count
+
+
+def replay():
+    cfg.CONF.register_cli_opts([
+        cfg.IntOpt('batch-size',
+                   default=100,
+                   help='number of messages handed to the dispatchers '
+                        'at once'),
+        cfg.MultiStrOpt('archive_file',
+                        positional=True,
+                        help='archive files to replay'),
+    ])
+    service.prepare_service()
+    dispatcher_manager = service.DispatchedService().dispatcher_manager
+    for path in cfg.CONF.archive_file:
+        count = replay_archive(path, dispatcher_manager,
+                               cfg.CONF.batch_size)
+        LOG.info(_('Replayed %(count)d messages from %(path)s'),
+                 {'count': count, 'path': path})
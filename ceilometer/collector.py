@@ -17,7 +17,10 @@
 # under the License.
 
 import socket
+import time
 
+from eventlet import event
+from eventlet import queue
 import msgpack
 from oslo.config import cfg
 
@@ -36,6 +39,26 @@ OPTS = [
     cfg.IntOpt('udp_port',
                default=4952,
                help='port to bind the UDP socket to'),
+    cfg.IntOpt('batch_size',
+               default=1,
+               help='number of samples to gather before handing them '
+               'to the dispatchers, 1 disables batching'),
+    cfg.IntOpt('batch_timeout',
+               default=500,
+               help='maximum time in milliseconds a sample waits in '
+               'a batch before it is handed to the dispatchers'),
+    cfg.IntOpt('batch_queue_size',
+               default=10000,
+               help='maximum number of samples waiting to be dispatched, '
+               'receiving is throttled when it is reached'),
+    cfg.IntOpt('workers',
+               default=1,
+               help='number of collector worker processes, each of them '
+               'binds its own UDP socket with SO_REUSEPORT'),
+    cfg.IntOpt('udp_rcvbuf',
+               default=0,
+               help='size in bytes of the receive buffer of the UDP '
+               'socket, 0 keeps the system default'),
 ]
 
 cfg.CONF.register_opts(OPTS, group="collector")
@@ -46,13 +69,142 @@ cfg.CONF.import_opt('metering_topic', 'ceilometer.publisher.rpc',
 
 LOG = log.getLogger(__name__)
 
+# Not defined by the socket module of Python 2, this is the Linux value
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+
+class SampleBuffer(object):
+    """Gather samples and hand them to the dispatchers in batches.
+
+    A batch is flushed once it holds batch_size samples or its oldest
+    sample has waited batch_timeout seconds. Samples wait in a queue
+    bounded to queue_size: when the dispatchers fall behind, add()
+    blocks and the receiving loops are throttled.
+
+    The flush times measure how long the dispatchers take to accept a
+    batch. A storage driver writing in the background, like the
+    SQLAlchemy one with a connection pool, only accounts there for
+    handing the batch over; it logs the time of the write itself.
+    """
+
+    def __init__(self, dispatcher_manager, batch_size, batch_timeout,
+                 queue_size):
+        self.dispatcher_manager = dispatcher_manager
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue = queue.LightQueue(queue_size)
+        self.running = False
+        self.done = None
+        self.stats = {'samples': 0,
+                      'batches': 0,
+                      'throttled': 0,
+                      'flush_time': 0.0,
+                      'last_flush_time': 0.0}
+
+    @property
+    def depth(self):
+        """Number of samples waiting to be dispatched."""
+        return self.queue.qsize()
+
+    def add(self, data, block=True):
+        """Queue samples to be dispatched.
+
+        :param block: if False and the queue has no room left for all
+                      the samples, none of them is queued and queue.Full
+                      is raised.
+        """
+        # We may have receive only one counter on the wire
+        if not isinstance(data, list):
+            data = [data]
+        if not block and self.depth + len(data) > self.queue.maxsize:
+            raise queue.Full()
+        for sample in data:
+            if self.queue.full():
+                self.stats['throttled'] += 1
+            self.queue.put(sample)
+
+    def _gather(self, block=True):
+        try:
+            batch = [self.queue.get(block, self.batch_timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if block and remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(block, remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch):
+        start = time.time()
+        try:
+            self.dispatcher_manager.map_method('record_metering_data',
+                                               data=batch)
+        except Exception:
+            LOG.exception(_("Unable to dispatch %d samples"), len(batch))
+        elapsed = time.time() - start
+        self.stats['samples'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['flush_time'] += elapsed
+        self.stats['last_flush_time'] = elapsed
+        LOG.debug(_("Handed %(count)d samples to the dispatchers in "
+                    "%(time).3fs, %(depth)d waiting"),
+                  {'count': len(batch), 'time': elapsed,
+                   'depth': self.depth})
+
+    def run(self):
+        self.running = True
+        self.done = event.Event()
+        try:
+            while self.running:
+                batch = self._gather()
+                if batch:
+                    self.flush(batch)
+        finally:
+            self.done.send()
+
+    def stop(self):
+        if self.running:
+            # Let run() hand the batch it gathered to the dispatchers,
+            # it returns within batch_timeout
+            self.running = False
+            self.done.wait()
+        batch = self._gather(block=False)
+        while batch:
+            self.flush(batch)
+            batch = self._gather(block=False)
+
 
 class CollectorService(service.DispatchedService, rpc_service.Service):
     """Listener for the collector service."""
 
+    sample_buffer = None
+    udp_buffer = None
+    udp_stats = None
+
+    def _start_sample_buffer(self, batch_size):
+        sample_buffer = SampleBuffer(
+            self.dispatcher_manager,
+            batch_size,
+            cfg.CONF.collector.batch_timeout / 1000.0,
+            cfg.CONF.collector.batch_queue_size)
+        self.tg.add_thread(sample_buffer.run)
+        return sample_buffer
+
     def start(self):
         """Bind the UDP socket and handle incoming data."""
+        if cfg.CONF.collector.batch_size > 1:
+            self.sample_buffer = self._start_sample_buffer(
+                cfg.CONF.collector.batch_size)
         if cfg.CONF.collector.udp_address:
+            # Decoded datagrams are queued and dispatched by another
+            # greenthread, so a slow dispatcher doesn't stop the receiving
+            self.udp_buffer = (self.sample_buffer or
+                               self._start_sample_buffer(1))
             self.tg.add_thread(self.start_udp)
         if cfg.CONF.rpc_backend:
             super(CollectorService, self).start()
@@ -63,29 +215,73 @@ class CollectorService(service.DispatchedService, rpc_service.Service):
     def start_udp(self):
         udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if cfg.CONF.collector.workers > 1:
+            # Every worker binds its own socket and the kernel spreads
+            # the datagrams between them.
+            udp.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        if cfg.CONF.collector.udp_rcvbuf:
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                           cfg.CONF.collector.udp_rcvbuf)
         udp.bind((cfg.CONF.collector.udp_address,
                   cfg.CONF.collector.udp_port))
 
+        self.udp_stats = {'received': 0,
+                          'decoded': 0,
+                          'queued': 0,
+                          'dropped': 0}
         self.udp_run = True
         while self.udp_run:
             # NOTE(jd) Arbitrary limit of 64K because that ought to be
             # enough for anybody.
             data, source = udp.recvfrom(64 * 1024)
+            self.udp_stats['received'] += 1
             try:
                 sample = msgpack.loads(data)
             except Exception:
+                self.udp_stats['dropped'] += 1
                 LOG.warn(_("UDP: Cannot decode data sent by %s"), str(source))
             else:
+                self.udp_stats['decoded'] += 1
                 try:
-                    LOG.debug(_("UDP: Storing %s"), str(sample))
-                    self.dispatcher_manager.map_method('record_metering_data',
-                                                       sample)
+                    # The UDP publisher packs several samples in a list
+                    # when they fit in one datagram, the dispatchers and
+                    # the sample buffer take the whole list at once.
+                    LOG.debug(_("UDP: Storing %(count)d samples sent by "
+                                "%(source)s"),
+                              {'count': (len(sample)
+                                         if isinstance(sample, list) else 1),
+                               'source': source})
+                    if self.udp_buffer:
+                        # Drop rather than block, the kernel would drop
+                        # the next datagrams without us knowing.
+                        self.udp_buffer.add(sample, block=False)
+                    else:
+                        self.dispatcher_manager.map_method(
+                            'record_metering_data', sample)
+                except queue.Full:
+                    self.udp_stats['dropped'] += 1
+                    LOG.warn(_("UDP: Dispatch queue full, dropping data "
+                               "sent by %s"), str(source))
                 except Exception:
+                    self.udp_stats['dropped'] += 1
                     LOG.exception(_("UDP: Unable to store meter"))
+                else:
+                    self.udp_stats['queued'] += 1
 
     def stop(self):
         self.udp_run = False
+        if self.udp_stats:
+            # The UDP thread is killed while waiting for a datagram, so
+            # it can't report this itself
+            LOG.info(_("UDP: %(received)d datagrams received, %(decoded)d "
+                       "decoded, %(queued)d queued, %(dropped)d "
+                       "dropped"), self.udp_stats)
+        if self.sample_buffer:
+            self.sample_buffer.stop()
+        if self.udp_buffer and self.udp_buffer is not self.sample_buffer:
+            self.udp_buffer.stop()
         super(CollectorService, self).stop()
+        self.close_dispatchers()
 
     def initialize_service_hook(self, service):
         '''Consumers must be declared before consume_thread start.'''
@@ -103,11 +299,16 @@ class CollectorService(service.DispatchedService, rpc_service.Service):
         When the notification messages are re-published through the
         RPC publisher, this method receives them for processing.
         """
-        self.dispatcher_manager.map_method('record_metering_data',
-                                           data=data)
+        if self.sample_buffer:
+            self.sample_buffer.add(data)
+        else:
+            self.dispatcher_manager.map_method('record_metering_data',
+                                               data=data)
 
 
 def collector():
     service.prepare_service()
+    workers = cfg.CONF.collector.workers
     os_service.launch(CollectorService(cfg.CONF.host,
-                                       'ceilometer.collector')).wait()
+                                       'ceilometer.collector'),
+                      workers=workers if workers > 1 else None).wait()
@@ -16,10 +16,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
+import math
+import time
+
+import eventlet
 from oslo.config import cfg
 from stevedore import extension
 
 from ceilometer import agent
+from ceilometer.compute.pollsters import util
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer import nova_client
 from ceilometer.openstack.common.gettextutils import _  # noqa
@@ -29,36 +35,111 @@ from ceilometer import service
 
 LOG = log.getLogger(__name__)
 
+OPTS = [
+    cfg.IntOpt('polling_workers',
+               default=8,
+               help='Number of instances polled concurrently by the compute '
+                    'agent. 1 polls them one after the other'),
+    cfg.BoolOpt('local_instance_discovery',
+                default=False,
+                help='Tell the instances running on the host from the '
+                     'hypervisor, and only list them from nova when they '
+                     'change rather than on every polling cycle'),
+    cfg.IntOpt('instance_resync_interval',
+               default=600,
+               help='Number of seconds after which the instances are listed '
+                    'from nova again with local_instance_discovery, even '
+                    'though the hypervisor runs the same ones'),
+]
+
+cfg.CONF.register_opts(OPTS, group="compute")
+
 
 class PollingTask(agent.PollingTask):
+    """Polling task for the instances running on the compute node.
+
+    When the inspector can, the stats of all the instances are inspected
+    at once and handed to the pollsters through their cache. The instances
+    are polled by a pool of polling_workers greenthreads, every pollster
+    sharing the same cache for an instance, while their samples are
+    published from the task itself as they come. A cycle outlasting the
+    interval is counted as an overrun, and the cycles it has run over are
+    skipped rather than started back to back.
+    """
+
+    def __init__(self, agent_manager):
+        super(PollingTask, self).__init__(agent_manager)
+        self.pool = eventlet.GreenPool(cfg.CONF.compute.polling_workers)
+        self.resume_at = 0
+        self.stats = {'cycles': 0,
+                      'overruns': 0,
+                      'skipped': 0,
+                      'last_duration': 0}
+
+    @property
+    def interval(self):
+        # A polling task only holds pipelines sharing the same interval
+        return min([p.interval for p in self.publish_context.pipelines]
+                   or [0])
+
+    def _poll_instance(self, instance, all_stats):
+        cache = {}
+        if all_stats is not None:
+            cache[util.CACHE_KEY_INSTANCE_STATS] = all_stats
+        samples = []
+        for pollster in self.pollsters:
+            try:
+                LOG.info(_("Polling pollster %s"), pollster.name)
+                samples.extend(pollster.obj.get_samples(
+                    self.manager,
+                    cache,
+                    instance,
+                ))
+            except Exception as err:
+                LOG.warning(_(
+                    'Continue after error from %(name)s: %(error)s')
+                    % ({'name': pollster.name, 'error': err}))
+                LOG.exception(err)
+        return samples
+
     def poll_and_publish_instances(self, instances):
+        instances = [i for i in instances
+                     if getattr(i, 'OS-EXT-STS:vm_state', None) != 'error']
+        all_stats = self.manager.inspect_all() if instances else None
         with self.publish_context as publisher:
-            for instance in instances:
-                if getattr(instance, 'OS-EXT-STS:vm_state', None) == 'error':
-                    continue
-                cache = {}
-                for pollster in self.pollsters:
-                    try:
-                        LOG.info(_("Polling pollster %s"), pollster.name)
-                        samples = list(pollster.obj.get_samples(
-                            self.manager,
-                            cache,
-                            instance,
-                        ))
-                        publisher(samples)
-                    except Exception as err:
-                        LOG.warning(_(
-                            'Continue after error from %(name)s: %(error)s')
-                            % ({'name': pollster.name, 'error': err}))
-                        LOG.exception(err)
+            for samples in self.pool.imap(self._poll_instance, instances,
+                                          itertools.repeat(all_stats)):
+                publisher(samples)
 
     def poll_and_publish(self):
+        start = time.time()
+        if start < self.resume_at:
+            self.stats['skipped'] += 1
+            LOG.warning(_('Skipping a polling cycle of the %ds interval '
+                          'after an overrun'), self.interval)
+            return
         try:
-            instances = self.manager.nv.instance_get_all_by_host(cfg.CONF.host)
+            instances = self.manager.discover_instances()
         except Exception as err:
             LOG.exception(_('Unable to retrieve instances: %s') % err)
         else:
             self.poll_and_publish_instances(instances)
+        duration = time.time() - start
+        self.stats['cycles'] += 1
+        self.stats['last_duration'] = duration
+        interval = self.interval
+        if interval and duration > interval:
+            self.stats['overruns'] += 1
+            self.resume_at = start + interval * math.ceil(
+                duration / float(interval))
+            LOG.warning(_('Polling cycle of the %(interval)ds interval took '
+                          '%(duration).2fs, %(overruns)d overruns so far'),
+                        {'interval': interval, 'duration': duration,
+                         'overruns': self.stats['overruns']})
+        else:
+            LOG.info(_('Polling cycle of the %(interval)ds interval took '
+                       '%(duration).2fs'),
+                     {'interval': interval, 'duration': duration})
 
 
 class AgentManager(agent.AgentManager):
@@ -72,6 +153,11 @@ class AgentManager(agent.AgentManager):
         )
         self._inspector = virt_inspector.get_hypervisor_inspector()
         self.nv = nova_client.Client()
+        # The names of the instances the hypervisor ran when they were
+        # last listed from nova, with local_instance_discovery
+        self.instance_names = None
+        self.instances = []
+        self.instances_listed_at = 0
 
     def create_polling_task(self):
         return PollingTask(self)
@@ -80,6 +166,33 @@ class AgentManager(agent.AgentManager):
     def inspector(self):
         return self._inspector
 
+    def discover_instances(self):
+        """Return the instances on the host, as listed by nova."""
+        if not cfg.CONF.compute.local_instance_discovery:
+            return self.nv.instance_get_all_by_host(cfg.CONF.host)
+        now = time.time()
+        names = frozenset(i.name for i in self.inspector.inspect_instances())
+        if (names != self.instance_names or now - self.instances_listed_at
+                >= cfg.CONF.compute.instance_resync_interval):
+            self.instances = self.nv.instance_get_all_by_host(cfg.CONF.host)
+            self.instance_names = names
+            self.instances_listed_at = now
+        return self.instances
+
+    def inspect_all(self):
+        """Return the stats of all the instances by name.
+
+        :return: None if the inspector cannot inspect them all at once
+        """
+        try:
+            return dict((stats.instance.name, stats)
+                        for stats in self.inspector.inspect_all())
+        except NotImplementedError:
+            return None
+        except Exception as err:
+            LOG.exception(_('Unable to inspect all instances: %s') % err)
+            return None
+
 
 def agent_compute():
     service.prepare_service()
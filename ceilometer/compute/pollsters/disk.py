@@ -57,7 +57,12 @@ class _Base(plugin.ComputePollster):
             r_requests = 0
             w_bytes = 0
             w_requests = 0
-            for disk, info in inspector.inspect_disks(instance_name):
+            instance_stats = util.get_instance_stats(cache, instance_name)
+            if instance_stats:
+                disks = instance_stats.disks
+            else:
+                disks = inspector.inspect_disks(instance_name)
+            for disk, info in disks:
                 LOG.info(self.DISKIO_USAGE_MESSAGE,
                          instance, disk.device, info.read_requests,
                          info.read_bytes, info.write_requests,
@@ -75,7 +80,7 @@ class _Base(plugin.ComputePollster):
         return i_cache[instance_name]
 
     @abc.abstractmethod
-    def _get_sample(instance, c_data):
+    def _get_sample(instance, c_data, cache):
         """Return one Sample."""
 
     def get_samples(self, manager, cache, instance):
@@ -87,7 +92,7 @@ class _Base(plugin.ComputePollster):
                 instance,
                 instance_name,
             )
-            yield self._get_sample(instance, c_data)
+            yield self._get_sample(instance, c_data, cache)
         except virt_inspector.InstanceNotFoundException as err:
             # Instance was deleted while getting samples. Ignore it.
             LOG.debug(_('Exception while getting samples %s'), err)
@@ -100,50 +105,54 @@ class _Base(plugin.ComputePollster):
 class ReadRequestsPollster(_Base):
 
     @staticmethod
-    def _get_sample(instance, c_data):
+    def _get_sample(instance, c_data, cache):
         return util.make_sample_from_instance(
             instance,
             name='disk.read.requests',
             type=sample.TYPE_CUMULATIVE,
             unit='request',
             volume=c_data.r_requests,
+            cache=cache,
         )
 
 
 class ReadBytesPollster(_Base):
 
     @staticmethod
-    def _get_sample(instance, c_data):
+    def _get_sample(instance, c_data, cache):
         return util.make_sample_from_instance(
             instance,
             name='disk.read.bytes',
             type=sample.TYPE_CUMULATIVE,
             unit='B',
             volume=c_data.r_bytes,
+            cache=cache,
         )
 
 
 class WriteRequestsPollster(_Base):
 
     @staticmethod
-    def _get_sample(instance, c_data):
+    def _get_sample(instance, c_data, cache):
         return util.make_sample_from_instance(
             instance,
             name='disk.write.requests',
             type=sample.TYPE_CUMULATIVE,
             unit='request',
             volume=c_data.w_requests,
+            cache=cache,
         )
 
 
 class WriteBytesPollster(_Base):
 
     @staticmethod
-    def _get_sample(instance, c_data):
+    def _get_sample(instance, c_data, cache):
         return util.make_sample_from_instance(
             instance,
             name='disk.write.bytes',
             type=sample.TYPE_CUMULATIVE,
             unit='B',
             volume=c_data.w_bytes,
+            cache=cache,
         )
@@ -33,6 +33,7 @@ class InstancePollster(plugin.ComputePollster):
             type=sample.TYPE_GAUGE,
             unit='instance',
             volume=1,
+            cache=cache,
         )
 
 
@@ -48,4 +49,5 @@ class InstanceFlavorPollster(plugin.ComputePollster):
             type=sample.TYPE_GAUGE,
             unit='instance',
             volume=1,
+            cache=cache,
         )
@@ -67,9 +67,13 @@ class _Base(plugin.ComputePollster):
     def _get_vnics_for_instance(self, cache, inspector, instance_name):
         i_cache = cache.setdefault(self.CACHE_KEY_VNIC, {})
         if instance_name not in i_cache:
-            i_cache[instance_name] = list(
-                inspector.inspect_vnics(instance_name)
-            )
+            instance_stats = util.get_instance_stats(cache, instance_name)
+            if instance_stats:
+                i_cache[instance_name] = instance_stats.vnics
+            else:
+                i_cache[instance_name] = list(
+                    inspector.inspect_vnics(instance_name)
+                )
         return i_cache[instance_name]
 
     def get_samples(self, manager, cache, instance):
@@ -100,10 +100,33 @@ def _get_metadata_from_object(instance):
     return _add_reserved_user_metadata(instance, metadata)
 
 
+# Key of the metadata of the instances in the cache of the pollsters
+CACHE_KEY_METADATA = 'instance_metadata'
+
+
+def _get_cached_metadata(instance, cache):
+    i_cache = cache.setdefault(CACHE_KEY_METADATA, {})
+    if instance.id not in i_cache:
+        i_cache[instance.id] = _get_metadata_from_object(instance)
+    return i_cache[instance.id]
+
+
 def make_sample_from_instance(instance, name, type, unit, volume,
-                              additional_metadata={}):
-    resource_metadata = _get_metadata_from_object(instance)
-    resource_metadata.update(additional_metadata)
+                              additional_metadata={}, cache=None):
+    """Return a sample of an instance, with the metadata of the instance.
+
+    Given the cache of the pollsters, the metadata of an instance is built
+    once and shared by the samples of all the pollsters, and only copied
+    to add additional_metadata. The samples must then not modify it.
+    """
+    if cache is None:
+        resource_metadata = _get_metadata_from_object(instance)
+        resource_metadata.update(additional_metadata)
+    else:
+        resource_metadata = _get_cached_metadata(instance, cache)
+        if additional_metadata:
+            resource_metadata = dict(resource_metadata)
+            resource_metadata.update(additional_metadata)
     return sample.Sample(
         name=name,
         type=type,
@@ -120,3 +143,15 @@ def make_sample_from_instance(instance, name, type, unit, volume,
 def instance_name(instance):
     """Shortcut to get instance name."""
     return getattr(instance, 'OS-EXT-SRV-ATTR:instance_name', None)
+
+
+# Key of the stats of all the instances in the cache of the pollsters, when
+# the compute agent could inspect them at once
+CACHE_KEY_INSTANCE_STATS = 'instance_stats'
+
+
+def get_instance_stats(cache, instance_name):
+    """Return the InstanceStats of an instance inspected with all the others,
+    or None if the pollster has to inspect the instance on its own.
+    """
+    return cache.get(CACHE_KEY_INSTANCE_STATS, {}).get(instance_name)
@@ -39,8 +39,11 @@ class HyperVInspector(virt_inspector.Inspector):
                 UUID=name)
 
     def inspect_cpus(self, instance_name):
-        (cpu_clock_used,
-         cpu_count, uptime) = self._utils.get_cpu_metrics(instance_name)
+        return self._make_cpu_stats(
+            self._utils.get_cpu_metrics(instance_name))
+
+    def _make_cpu_stats(self, cpu_metrics):
+        cpu_clock_used, cpu_count, uptime = cpu_metrics
         host_cpu_clock, host_cpu_count = self._utils.get_host_cpu_info()
 
         cpu_percent_used = (cpu_clock_used /
@@ -52,7 +55,12 @@ class HyperVInspector(virt_inspector.Inspector):
         return virt_inspector.CPUStats(number=cpu_count, time=cpu_time)
 
     def inspect_vnics(self, instance_name):
-        for vnic_metrics in self._utils.get_vnic_metrics(instance_name):
+        return self._make_vnics_stats(
+            self._utils.get_vnic_metrics(instance_name))
+
+    @staticmethod
+    def _make_vnics_stats(vnics_metrics):
+        for vnic_metrics in vnics_metrics:
             interface = virt_inspector.Interface(
                 name=vnic_metrics["element_name"],
                 mac=vnic_metrics["address"],
@@ -68,7 +76,12 @@ class HyperVInspector(virt_inspector.Inspector):
             yield (interface, stats)
 
     def inspect_disks(self, instance_name):
-        for disk_metrics in self._utils.get_disk_metrics(instance_name):
+        return self._make_disks_stats(
+            self._utils.get_disk_metrics(instance_name))
+
+    @staticmethod
+    def _make_disks_stats(disks_metrics):
+        for disk_metrics in disks_metrics:
             device = dict([(i, disk_metrics[i])
                           for i in ['instance_id', 'host_resource']
                           if i in disk_metrics])
@@ -83,3 +96,13 @@ class HyperVInspector(virt_inspector.Inspector):
                 errors=0)
 
             yield (disk, stats)
+
+    def inspect_all(self):
+        for (element_name, name, cpu_metrics, vnics_metrics,
+             disks_metrics) in self._utils.get_all_vm_metrics():
+            yield virt_inspector.InstanceStats(
+                instance=virt_inspector.Instance(name=element_name,
+                                                 UUID=name),
+                cpu=self._make_cpu_stats(cpu_metrics),
+                vnics=list(self._make_vnics_stats(vnics_metrics)),
+                disks=list(self._make_disks_stats(disks_metrics)))
@@ -84,8 +84,11 @@ class UtilsV2(object):
 
     def get_cpu_metrics(self, vm_name):
         vm = self._lookup_vm(vm_name)
-        cpu_sd = self._get_vm_resources(vm, self._PROC_SETTING)[0]
         cpu_metrics_def = self._get_metric_def(self._CPU_METRIC_NAME)
+        return self._get_cpu_metrics(vm, cpu_metrics_def)
+
+    def _get_cpu_metrics(self, vm, cpu_metrics_def):
+        cpu_sd = self._get_vm_resources(vm, self._PROC_SETTING)[0]
         cpu_metric_aggr = self._get_metrics(vm, cpu_metrics_def)
 
         cpu_used = 0
@@ -98,11 +101,13 @@ class UtilsV2(object):
 
     def get_vnic_metrics(self, vm_name):
         vm = self._lookup_vm(vm_name)
-        ports = self._get_vm_resources(vm, self._ETH_PORT_ALLOC)
-        vnics = self._get_vm_resources(vm, self._SYNTH_ETH_PORT)
-
         metric_def_in = self._get_metric_def(self._NET_IN_METRIC_NAME)
         metric_def_out = self._get_metric_def(self._NET_OUT_METRIC_NAME)
+        return self._get_vnic_metrics(vm, metric_def_in, metric_def_out)
+
+    def _get_vnic_metrics(self, vm, metric_def_in, metric_def_out):
+        ports = self._get_vm_resources(vm, self._ETH_PORT_ALLOC)
+        vnics = self._get_vm_resources(vm, self._SYNTH_ETH_PORT)
 
         for port in ports:
             vnic = [v for v in vnics if port.Parent == v.path_()][0]
@@ -120,7 +125,9 @@ class UtilsV2(object):
         vm = self._lookup_vm(vm_name)
         metric_def_r = self._get_metric_def(self._DISK_RD_METRIC_NAME)
         metric_def_w = self._get_metric_def(self._DISK_WR_METRIC_NAME)
+        return self._get_disk_metrics(vm, metric_def_r, metric_def_w)
 
+    def _get_disk_metrics(self, vm, metric_def_r, metric_def_w):
         disks = self._get_vm_resources(vm, self._STORAGE_ALLOC)
         for disk in disks:
             metric_values = self._get_metric_values(
@@ -138,6 +145,34 @@ class UtilsV2(object):
                 'host_resource': host_resource
             }
 
+    def get_all_vm_metrics(self):
+        """Return the CPU, vNIC and disk metrics of all the VMs.
+
+        The VMs and the metric definitions are queried once for all of
+        them, rather than once per VM and kind of metric.
+
+        :return: for each VM, its element name and name followed by what
+                 get_cpu_metrics, get_vnic_metrics and get_disk_metrics
+                 return for it
+        """
+        metric_defs = dict((name, self._get_metric_def(name))
+                           for name in (self._CPU_METRIC_NAME,
+                                        self._NET_IN_METRIC_NAME,
+                                        self._NET_OUT_METRIC_NAME,
+                                        self._DISK_RD_METRIC_NAME,
+                                        self._DISK_WR_METRIC_NAME))
+        for vm in self._conn.Msvm_ComputerSystem(Caption="Virtual Machine"):
+            yield (vm.ElementName,
+                   vm.Name,
+                   self._get_cpu_metrics(
+                       vm, metric_defs[self._CPU_METRIC_NAME]),
+                   list(self._get_vnic_metrics(
+                       vm, metric_defs[self._NET_IN_METRIC_NAME],
+                       metric_defs[self._NET_OUT_METRIC_NAME])),
+                   list(self._get_disk_metrics(
+                       vm, metric_defs[self._DISK_RD_METRIC_NAME],
+                       metric_defs[self._DISK_WR_METRIC_NAME])))
+
     def _sum_metric_values(self, metrics):
         tot_metric_val = 0
         for metric in metrics:
@@ -98,6 +98,17 @@ DiskStats = collections.namedtuple('DiskStats',
                                     'errors'])
 
 
+# Named tuple representing the statistics of an instance.
+#
+# instance: the Instance
+# cpu: the CPUStats
+# vnics: the (Interface, InterfaceStats) pairs of its vNICs
+# disks: the (Disk, DiskStats) pairs of its disks
+#
+InstanceStats = collections.namedtuple('InstanceStats',
+                                       ['instance', 'cpu', 'vnics', 'disks'])
+
+
 # Exception types
 #
 class InspectorException(Exception):
@@ -143,6 +154,17 @@ class Inspector(object):
         """
         raise NotImplementedError()
 
+    def inspect_all(self):
+        """Inspect the CPU, vNIC and disk statistics of all the instances.
+
+        Inspectors implement it only when the hypervisor can return them
+        for every instance at once, or at least with far fewer calls than
+        inspecting the instances one by one.
+
+        :return: an InstanceStats for each instance on the current host
+        """
+        raise NotImplementedError()
+
 
 def get_hypervisor_inspector():
     try:
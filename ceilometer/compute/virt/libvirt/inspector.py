@@ -17,12 +17,17 @@
 # under the License.
 """Implementation of Inspector abstraction for libvirt."""
 
+import collections
+import time
+
+from eventlet import tpool
 from lxml import etree
 from oslo.config import cfg
 
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.openstack.common.gettextutils import _  # noqa
 from ceilometer.openstack.common import log as logging
+from ceilometer import utils
 
 libvirt = None
 
@@ -37,6 +42,11 @@ libvirt_opts = [
                default='',
                help='Override the default libvirt URI '
                     '(which is dependent on libvirt_type)'),
+    cfg.IntOpt('libvirt_device_cache_ttl',
+               default=600,
+               help='Number of seconds the vNICs and disks parsed from the '
+                    'XML description of a domain are reused for, unless '
+                    'the domain is restarted. 0 parses it on every poll'),
 ]
 
 CONF = cfg.CONF
@@ -47,9 +57,14 @@ class LibvirtInspector(virt_inspector.Inspector):
 
     per_type_uris = dict(uml='uml:///system', xen='xen:///', lxc='lxc:///')
 
+    # Most domains a host runs whose devices are cached
+    device_cache_size = 1024
+
     def __init__(self):
         self.uri = self._get_uri()
         self.connection = None
+        self.devices = utils.LRUCache(self.device_cache_size)
+        self.bulk_stats_supported = True
 
     def _get_uri(self):
         return CONF.libvirt_uri or self.per_type_uris.get(CONF.libvirt_type,
@@ -62,14 +77,18 @@ class LibvirtInspector(virt_inspector.Inspector):
                 libvirt = __import__('libvirt')
 
             LOG.debug(_('Connecting to libvirt: %s'), self.uri)
-            self.connection = libvirt.openReadOnly(self.uri)
+            # NOTE: the calls to libvirt block, run them in native threads
+            # so the compute agent can poll several instances at once.
+            self.connection = tpool.proxy_call(
+                (libvirt.virDomain, libvirt.virConnect),
+                libvirt.openReadOnly, self.uri)
 
         return self.connection
 
     def _test_connection(self):
         try:
-            self.connection.getCapabilities()
-            return True
+            # NOTE: isAlive does not call the daemon, unlike getCapabilities
+            return bool(self.connection.isAlive())
         except libvirt.libvirtError as e:
             if (e.get_error_code() == libvirt.VIR_ERR_SYSTEM_ERROR and
                 e.get_error_domain() in (libvirt.VIR_FROM_REMOTE,
@@ -105,6 +124,23 @@ class LibvirtInspector(virt_inspector.Inspector):
                     # Instance was deleted while listing... ignore it
                     pass
 
+    def _get_devices(self, instance_name, domain):
+        """Return the vNICs and disks of a domain.
+
+        They are parsed from the XML description of the domain, which is
+        only fetched again once the domain was restarted, hence got a new
+        ID, or after libvirt_device_cache_ttl seconds so hot-plugged
+        devices get polled too.
+        """
+        domain_id = domain.ID()
+        devices = self.devices.get(instance_name)
+        if (devices is None or devices.domain_id != domain_id or
+                time.time() - devices.parsed_at >=
+                CONF.libvirt_device_cache_ttl):
+            devices = _parse_devices(domain.XMLDesc(0), domain_id)
+            self.devices[instance_name] = devices
+        return devices
+
     def inspect_cpus(self, instance_name):
         domain = self._lookup_by_name(instance_name)
         (_, _, _, num_cpu, cpu_time) = domain.info()
@@ -112,28 +148,10 @@ class LibvirtInspector(virt_inspector.Inspector):
 
     def inspect_vnics(self, instance_name):
         domain = self._lookup_by_name(instance_name)
-        tree = etree.fromstring(domain.XMLDesc(0))
-        for iface in tree.findall('devices/interface'):
-            target = iface.find('target')
-            if target is not None:
-                name = target.get('dev')
-            else:
-                continue
-            mac = iface.find('mac')
-            if mac is not None:
-                mac_address = mac.get('address')
-            else:
-                continue
-            fref = iface.find('filterref')
-            if fref is not None:
-                fref = fref.get('filter')
-
-            params = dict((p.get('name').lower(), p.get('value'))
-                          for p in iface.findall('filterref/parameter'))
-            interface = virt_inspector.Interface(name=name, mac=mac_address,
-                                                 fref=fref, parameters=params)
+        for interface in self._get_devices(instance_name, domain).interfaces:
             rx_bytes, rx_packets, _, _, \
-                tx_bytes, tx_packets, _, _ = domain.interfaceStats(name)
+                tx_bytes, tx_packets, _, _ = domain.interfaceStats(
+                    interface.name)
             stats = virt_inspector.InterfaceStats(rx_bytes=rx_bytes,
                                                   rx_packets=rx_packets,
                                                   tx_bytes=tx_bytes,
@@ -142,16 +160,124 @@ class LibvirtInspector(virt_inspector.Inspector):
 
     def inspect_disks(self, instance_name):
         domain = self._lookup_by_name(instance_name)
-        tree = etree.fromstring(domain.XMLDesc(0))
-        for device in filter(
-                bool,
-                [target.get("dev")
-                 for target in tree.findall('devices/disk/target')]):
-            disk = virt_inspector.Disk(device=device)
-            block_stats = domain.blockStats(device)
+        for disk in self._get_devices(instance_name, domain).disks:
+            block_stats = domain.blockStats(disk.device)
             stats = virt_inspector.DiskStats(read_requests=block_stats[0],
                                              read_bytes=block_stats[1],
                                              write_requests=block_stats[2],
                                              write_bytes=block_stats[3],
                                              errors=block_stats[4])
             yield (disk, stats)
+
+    def _get_all_domain_stats(self):
+        """Return the stats of all the active domains in one call.
+
+        :return: a list of (domain, stats) pairs, or None if libvirt is
+                 older than 1.2.8 and cannot get them at once
+        """
+        connection = self._get_connection()
+        if self.bulk_stats_supported:
+            try:
+                return connection.getAllDomainStats(
+                    libvirt.VIR_DOMAIN_STATS_CPU_TOTAL |
+                    libvirt.VIR_DOMAIN_STATS_VCPU |
+                    libvirt.VIR_DOMAIN_STATS_INTERFACE |
+                    libvirt.VIR_DOMAIN_STATS_BLOCK,
+                    libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+            except AttributeError:
+                # The python bindings lack the call or its flags
+                pass
+            except libvirt.libvirtError as e:
+                if e.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                    raise
+            LOG.info(_('libvirt cannot get the stats of all domains at '
+                       'once, inspecting them domain by domain'))
+            self.bulk_stats_supported = False
+
+    def _make_instance_stats(self, domain, stats):
+        name = domain.name()
+        devices = self._get_devices(name, domain)
+        vnics = {}
+        for i in range(stats.get('net.count', 0)):
+            prefix = 'net.%d.' % i
+            vnics[stats[prefix + 'name']] = virt_inspector.InterfaceStats(
+                rx_bytes=stats.get(prefix + 'rx.bytes'),
+                rx_packets=stats.get(prefix + 'rx.pkts'),
+                tx_bytes=stats.get(prefix + 'tx.bytes'),
+                tx_packets=stats.get(prefix + 'tx.pkts'))
+        disks = {}
+        for i in range(stats.get('block.count', 0)):
+            prefix = 'block.%d.' % i
+            disks[stats[prefix + 'name']] = virt_inspector.DiskStats(
+                read_requests=stats.get(prefix + 'rd.reqs'),
+                read_bytes=stats.get(prefix + 'rd.bytes'),
+                write_requests=stats.get(prefix + 'wr.reqs'),
+                write_bytes=stats.get(prefix + 'wr.bytes'),
+                # Not reported by the bulk stats, as by blockStats when
+                # the hypervisor does not count them
+                errors=-1)
+        return virt_inspector.InstanceStats(
+            instance=virt_inspector.Instance(name=name,
+                                             UUID=domain.UUIDString()),
+            cpu=virt_inspector.CPUStats(number=stats.get('vcpu.current'),
+                                        time=stats.get('cpu.time')),
+            vnics=[(interface, vnics[interface.name])
+                   for interface in devices.interfaces
+                   if interface.name in vnics],
+            disks=[(disk, disks[disk.device])
+                   for disk in devices.disks
+                   if disk.device in disks])
+
+    def inspect_all(self):
+        """Inspect the CPU, vNIC and disk statistics of all the instances.
+
+        Only libvirt 1.2.8 and later return them in one call.
+        """
+        all_stats = self._get_all_domain_stats()
+        if all_stats is None:
+            raise NotImplementedError()
+        # We skip domains with ID 0 (hypervisors).
+        return [self._make_instance_stats(domain, stats)
+                for domain, stats in all_stats if domain.ID() != 0]
+
+
+# The vNICs and disks of a domain
+#
+# domain_id: the ID of the domain they were parsed for
+# parsed_at: when they were parsed
+# interfaces: the Interfaces of the domain
+# disks: the Disks of the domain
+#
+_Devices = collections.namedtuple('_Devices', ['domain_id', 'parsed_at',
+                                               'interfaces', 'disks'])
+
+
+def _parse_devices(xml, domain_id):
+    tree = etree.fromstring(xml)
+    interfaces = []
+    for iface in tree.findall('devices/interface'):
+        target = iface.find('target')
+        if target is not None:
+            name = target.get('dev')
+        else:
+            continue
+        mac = iface.find('mac')
+        if mac is not None:
+            mac_address = mac.get('address')
+        else:
+            continue
+        fref = iface.find('filterref')
+        if fref is not None:
+            fref = fref.get('filter')
+
+        params = dict((p.get('name').lower(), p.get('value'))
+                      for p in iface.findall('filterref/parameter'))
+        interfaces.append(virt_inspector.Interface(name=name,
+                                                   mac=mac_address,
+                                                   fref=fref,
+                                                   parameters=params))
+    disks = [virt_inspector.Disk(device=disk.get('dev'))
+             for disk in tree.findall('devices/disk/target')
+             if disk.get('dev')]
+    return _Devices(domain_id=domain_id, parsed_at=time.time(),
+                    interfaces=interfaces, disks=disks)
@@ -33,3 +33,6 @@ class Base(object):
     @abc.abstractmethod
     def record_events(self, events):
         """Recording events interface."""
+
+    def close(self):
+        """Record what is still buffered and release the resources."""
@@ -46,6 +46,7 @@ class DatabaseDispatcher(dispatcher.Base):
         if not isinstance(data, list):
             data = [data]
 
+        samples = []
         for meter in data:
             LOG.debug(_(
                 'metering data %(counter_name)s '
@@ -60,19 +61,39 @@ class DatabaseDispatcher(dispatcher.Base):
                 try:
                     # Convert the timestamp to a datetime instance.
                     # Storage engines are responsible for converting
-                    # that value to something they can store.
+                    # that value to something they can store. The other
+                    # dispatchers get the same messages, so leave them
+                    # as they were signed.
                     if meter.get('timestamp'):
                         ts = timeutils.parse_isotime(meter['timestamp'])
-                        meter['timestamp'] = timeutils.normalize_time(ts)
-                    self.storage_conn.record_metering_data(meter)
+                        meter = dict(meter,
+                                     timestamp=timeutils.normalize_time(ts))
                 except Exception as err:
                     LOG.exception(_('Failed to record metering data: %s'),
                                   err)
+                else:
+                    samples.append(meter)
             else:
                 LOG.warning(_(
                     'message signature invalid, discarding message: %r'),
                     meter)
 
+        if samples:
+            try:
+                self.storage_conn.record_metering_data_batch(samples)
+            except Exception as err:
+                # Drivers writing the batch at once fail as a whole, so
+                # record the samples one by one to only lose the bad ones
+                LOG.warning(_('Failed to record %(count)d samples at once, '
+                              'recording them one by one: %(err)s'),
+                            {'count': len(samples), 'err': err})
+                for meter in samples:
+                    try:
+                        self.storage_conn.record_metering_data(meter)
+                    except Exception as err:
+                        LOG.exception(_('Failed to record metering data: '
+                                        '%s'), err)
+
     def record_events(self, events):
         if not isinstance(events, list):
             events = [events]
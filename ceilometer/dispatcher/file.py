@@ -18,9 +18,11 @@
 
 import logging
 import logging.handlers
+import os
 
 from oslo.config import cfg
 
+from ceilometer import archive
 from ceilometer import dispatcher
 
 file_dispatcher_opts = [
@@ -34,9 +36,23 @@ file_dispatcher_opts = [
     cfg.IntOpt('backup_count',
                default=0,
                help='The max number of the files to keep'),
+    cfg.StrOpt('format',
+               default=None,
+               help='Write the meters as buffered "json" lines or '
+                    'length-prefixed "msgpack" records that '
+                    'ceilometer-replay-archive can replay, instead of '
+                    'logging them. Events are not recorded then.'),
+    cfg.IntOpt('max_age',
+               default=0,
+               help='The max age in seconds of the file before it is '
+                    'rotated, with format set'),
+    cfg.BoolOpt('compress',
+                default=False,
+                help='Gzip the rotated files, with format set'),
 ]
 
 cfg.CONF.register_opts(file_dispatcher_opts, group="dispatcher_file")
+cfg.CONF.import_opt('workers', 'ceilometer.collector', group='collector')
 
 
 class FileDispatcher(dispatcher.Base):
@@ -54,19 +70,39 @@ class FileDispatcher(dispatcher.Base):
 
     [collector]
     dispatchers = file
+
+    Setting format to json or msgpack archives the meters in a buffered
+    file instead, rotated on max_bytes or max_age.
+
+    When the collector runs several workers, each of them writes to its
+    own file, named after file_path and the process id.
     '''
 
     def __init__(self, conf):
         super(FileDispatcher, self).__init__(conf)
         self.log = None
-
+        self.archive = None
+
+        file_path = self.conf.dispatcher_file.file_path
+        if file_path and self.conf.collector.workers > 1:
+            # The workers can't share a file they each buffer and rotate
+            file_path = '%s.%d' % (file_path, os.getpid())
+
+        if file_path and self.conf.dispatcher_file.format:
+            self.archive = archive.ArchiveWriter(
+                file_path,
+                format=self.conf.dispatcher_file.format,
+                max_bytes=self.conf.dispatcher_file.max_bytes or 0,
+                max_age=self.conf.dispatcher_file.max_age,
+                backup_count=self.conf.dispatcher_file.backup_count or 0,
+                compress=self.conf.dispatcher_file.compress)
         # if the directory and path are configured, then log to the file
-        if self.conf.dispatcher_file.file_path:
+        elif file_path:
             dispatcher_logger = logging.Logger('dispather.file')
             dispatcher_logger.setLevel(logging.INFO)
             # create rotating file handler which logs meters
             rfh = logging.handlers.RotatingFileHandler(
-                self.conf.dispatcher_file.file_path,
+                file_path,
                 maxBytes=self.conf.dispatcher_file.max_bytes,
                 backupCount=self.conf.dispatcher_file.backup_count,
                 encoding='utf8')
@@ -79,10 +115,19 @@ class FileDispatcher(dispatcher.Base):
             self.log = dispatcher_logger
 
     def record_metering_data(self, data):
-        if self.log:
+        if self.archive:
+            # We may have receive only one counter on the wire
+            if not isinstance(data, list):
+                data = [data]
+            self.archive.write(data)
+        elif self.log:
             self.log.info(data)
 
     def record_events(self, events):
         if self.log:
             self.log.info(events)
         return []
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
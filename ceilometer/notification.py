@@ -60,11 +60,19 @@ class NotificationService(service.DispatchedService, rpc_service.Service):
 
     NOTIFICATION_NAMESPACE = 'ceilometer.notification'
 
+    pipeline_manager = None
+
     def start(self):
         super(NotificationService, self).start()
         # Add a dummy thread to have wait() working
         self.tg.add_timer(604800, lambda: None)
 
+    def stop(self):
+        super(NotificationService, self).stop()
+        if self.pipeline_manager:
+            self.pipeline_manager.close()
+        self.close_dispatchers()
+
     def initialize_service_hook(self, service):
         '''Consumers must be declared before consume_thread start.'''
         self.pipeline_manager = pipeline.setup_pipeline(
@@ -15,13 +15,23 @@
 # under the License.
 
 import functools
+import time
 
 import novaclient
 from novaclient.v1_1 import client as nova_client
 from oslo.config import cfg
 
 from ceilometer.openstack.common import log
+from ceilometer import utils
 
+OPTS = [
+    cfg.IntOpt('nova_cache_ttl',
+               default=600,
+               help='Number of seconds the flavors and images got from nova '
+                    'are reused for. 0 gets them on every call'),
+]
+
+cfg.CONF.register_opts(OPTS)
 cfg.CONF.import_group('service_credentials', 'ceilometer.service')
 
 LOG = log.getLogger(__name__)
@@ -43,6 +53,9 @@ def logged(func):
 class Client(object):
     """A client which gets information via python-novaclient."""
 
+    # Most flavors and images whose details are cached
+    cache_size = 1024
+
     def __init__(self):
         """Initialize a nova client object."""
         conf = cfg.CONF.service_credentials
@@ -56,6 +69,24 @@ class Client(object):
             endpoint_type=conf.os_endpoint_type,
             cacert=conf.os_cacert,
             no_cache=True)
+        self.flavors = utils.LRUCache(self.cache_size)
+        self.images = utils.LRUCache(self.cache_size)
+
+    @staticmethod
+    def _get_cached(cache, manager, id):
+        """Return a flavor or an image, None if nova does not know it.
+
+        It is only got from nova again once nova_cache_ttl seconds passed.
+        """
+        now = time.time()
+        fetched_at, resource = cache.get(id, (None, None))
+        if fetched_at is None or now - fetched_at >= cfg.CONF.nova_cache_ttl:
+            try:
+                resource = manager.get(id)
+            except novaclient.exceptions.NotFound:
+                resource = None
+            cache[id] = (now, resource)
+        return resource
 
     def _with_flavor_and_image(self, instances):
         for instance in instances:
@@ -66,10 +97,7 @@ class Client(object):
 
     def _with_flavor(self, instance):
         fid = instance.flavor['id']
-        try:
-            flavor = self.nova_client.flavors.get(fid)
-        except novaclient.exceptions.NotFound:
-            flavor = None
+        flavor = self._get_cached(self.flavors, self.nova_client.flavors, fid)
 
         attr_defaults = [('name', 'unknown-id-%s' % fid),
                          ('vcpus', 0), ('ram', 0), ('disk', 0),
@@ -90,9 +118,8 @@ class Client(object):
             instance.ramdisk_id = None
             return
 
-        try:
-            image = self.nova_client.images.get(iid)
-        except novaclient.exceptions.NotFound:
+        image = self._get_cached(self.images, self.nova_client.images, iid)
+        if image is None:
             instance.image['name'] = 'unknown-id-%s' % iid
             instance.kernel_id = None
             instance.ramdisk_id = None
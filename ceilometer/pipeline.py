@@ -16,10 +16,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import fnmatch
 import itertools
+import logging
 import operator
 import os
+import re
 
 from oslo.config import cfg
 import yaml
@@ -27,6 +30,7 @@ import yaml
 from ceilometer.openstack.common.gettextutils import _  # noqa
 from ceilometer.openstack.common import log
 from ceilometer import publisher
+from ceilometer import utils
 
 
 OPTS = [
@@ -40,6 +44,11 @@ cfg.CONF.register_opts(OPTS)
 
 LOG = log.getLogger(__name__)
 
+# Number of meter names each pipeline remembers whether it supports
+METER_CACHE_SIZE = 1024
+
+_WILDCARD = re.compile('[*?[]')
+
 
 class PipelineException(Exception):
     def __init__(self, message, pipeline_cfg):
@@ -52,18 +61,38 @@ class PipelineException(Exception):
 
 class PublishContext(object):
 
-    def __init__(self, context, pipelines=[]):
+    def __init__(self, context, pipelines=[], routes=None):
         self.pipelines = set(pipelines)
         self.context = context
+        # The pipelines supporting each meter name, which may be shared
+        # with other contexts publishing to the same pipelines
+        self.routes = routes
+        if self.routes is None:
+            self.routes = utils.LRUCache(METER_CACHE_SIZE)
 
     def add_pipelines(self, pipelines):
         self.pipelines.update(pipelines)
+        self.routes = utils.LRUCache(METER_CACHE_SIZE)
+
+    def _route(self, meter_name):
+        pipelines = self.routes.get(meter_name)
+        if pipelines is None:
+            pipelines = [p for p in self.pipelines
+                         if p.support_meter(meter_name)]
+            self.routes[meter_name] = pipelines
+        return pipelines
 
     def __enter__(self):
         def p(samples):
-            for p in self.pipelines:
-                p.publish_samples(self.context,
-                                  samples)
+            # Group the samples by meter name once, and hand each group to
+            # the pipelines supporting it only
+            groups = {}
+            for s in samples:
+                groups.setdefault(s.name, []).append(s)
+            for meter_name in sorted(groups):
+                for p in self._route(meter_name):
+                    p.publish_meter_samples(self.context,
+                                            groups[meter_name])
         return p
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -114,6 +143,7 @@ class Pipeline(object):
             raise PipelineException("Interval value should > 0", cfg)
 
         self._check_meters()
+        self._compile_meters()
 
         if not cfg.get('publishers'):
             raise PipelineException("No publisher specified", cfg)
@@ -130,6 +160,12 @@ class Pipeline(object):
 
         self.transformers = self._setup_transformers(cfg, transformer_manager)
 
+        # Number of samples in, out, dropped or in error, for the pipeline
+        # and for each of its transformers, see get_counters()
+        self.counters = collections.defaultdict(int)
+        self.transformer_counters = [collections.defaultdict(int)
+                                     for t in self.transformers]
+
         self.resources = cfg.get('resources') or []
         if not isinstance(self.resources, list):
             raise PipelineException("Resources should be a list", cfg)
@@ -161,6 +197,26 @@ class Pipeline(object):
                 "Included meters specified with wildcard",
                 self.cfg)
 
+    @staticmethod
+    def _compile_patterns(patterns):
+        """Split meter patterns into a set of exact names and a single
+        regular expression matching all the wildcard ones, or None.
+        """
+        exact = set(p for p in patterns if not _WILDCARD.search(p))
+        wildcards = [fnmatch.translate(p) for p in patterns
+                     if p not in exact]
+        return exact, re.compile('|'.join(wildcards)) if wildcards else None
+
+    def _compile_meters(self):
+        # Special case: if we only have negation, we suppose the default it
+        # allow
+        self._default = all(meter.startswith('!') for meter in self.meters)
+        self._excluded = self._compile_patterns(
+            [meter[1:] for meter in self.meters if meter[0] == '!'])
+        self._included = self._compile_patterns(
+            [meter for meter in self.meters if meter[0] != '!'])
+        self._supported = utils.LRUCache(METER_CACHE_SIZE)
+
     def _setup_transformers(self, cfg, transformer_manager):
         transformer_cfg = cfg['transformers'] or []
         transformers = []
@@ -183,16 +239,24 @@ class Pipeline(object):
 
     def _transform_sample(self, start, ctxt, sample):
         try:
-            for transformer in self.transformers[start:]:
+            for i, transformer in enumerate(self.transformers[start:],
+                                            start):
+                counters = self.transformer_counters[i]
+                counters['in'] += 1
                 sample = transformer.handle_sample(ctxt, sample)
                 if not sample:
-                    LOG.debug(_(
-                        "Pipeline %(pipeline)s: Sample dropped by "
-                        "transformer %(trans)s") % ({'pipeline': self,
-                                                     'trans': transformer}))
+                    counters['dropped'] += 1
+                    self.counters['dropped'] += 1
+                    if LOG.isEnabledFor(logging.DEBUG):
+                        LOG.debug(_(
+                            "Pipeline %(pipeline)s: Sample dropped by "
+                            "transformer %(trans)s"), {'pipeline': self,
+                                                       'trans': transformer})
                     return
+                counters['out'] += 1
             return sample
         except Exception as err:
+            counters['errors'] += 1
             LOG.warning(_("Pipeline %(pipeline)s: "
                           "Exit after error from transformer "
                           "%(trans)s for %(smp)s") % ({'pipeline': self,
@@ -210,29 +274,55 @@ class Pipeline(object):
         :param samples: Sample list.
 
         """
+        # Only build the debug messages if they are going to be logged
+        debug = LOG.isEnabledFor(logging.DEBUG)
 
         transformed_samples = []
         for sample in samples:
-            LOG.debug(_(
-                "Pipeline %(pipeline)s: Transform sample "
-                "%(smp)s from %(trans)s transformer") % ({'pipeline': self,
-                                                          'smp': sample,
-                                                          'trans': start}))
+            if debug:
+                LOG.debug(_(
+                    "Pipeline %(pipeline)s: Transform sample "
+                    "%(smp)s from %(trans)s transformer"), {'pipeline': self,
+                                                            'smp': sample,
+                                                            'trans': start})
             sample = self._transform_sample(start, ctxt, sample)
             if sample:
                 transformed_samples.append(sample)
+            self.counters['in'] += 1
 
         if transformed_samples:
-            LOG.audit(_("Pipeline %s: Publishing samples"), self)
             for p in self.publishers:
                 try:
                     p.publish_samples(ctxt, transformed_samples)
                 except Exception:
+                    self.counters['errors'] += len(transformed_samples)
                     LOG.exception(_(
                         "Pipeline %(pipeline)s: Continue after error "
                         "from publisher %(pub)s") % ({'pipeline': self,
                                                       'pub': p}))
-            LOG.audit(_("Pipeline %s: Published samples") % self)
+            self.counters['out'] += len(transformed_samples)
+            if debug:
+                LOG.debug(_("Pipeline %(pipeline)s: Published %(count)d "
+                            "samples"), {'pipeline': self,
+                                         'count': len(transformed_samples)})
+
+    def get_counters(self):
+        """Return the number of samples that got in and out of the pipeline
+        and each of its transformers, that were dropped by transformers
+        or that raised an error.
+
+        A sample a transformer failed on only counts in the errors of
+        that transformer, the ones a publisher failed on in the errors of
+        the pipeline.
+        """
+        return {
+            'name': self.name,
+            'counters': dict(self.counters),
+            'transformers': [
+                {'name': t['name'], 'counters': dict(c)}
+                for t, c in zip(self.transformer_cfg,
+                                self.transformer_counters)],
+        }
 
     def publish_sample(self, ctxt, sample):
         self.publish_samples(ctxt, [sample])
@@ -244,6 +334,10 @@ class Pipeline(object):
             if self.support_meter(meter_name):
                 self._publish_samples(0, ctxt, samples)
 
+    def publish_meter_samples(self, ctxt, samples):
+        """Publish samples of a single meter this pipeline supports."""
+        self._publish_samples(0, ctxt, samples)
+
     # (yjiang5) To support meters like instance:m1.tiny,
     # which include variable part at the end starting with ':'.
     # Hope we will not add such meters in future.
@@ -254,34 +348,31 @@ class Pipeline(object):
         else:
             return name
 
+    @staticmethod
+    def _match(meter_name, patterns):
+        exact, wildcards = patterns
+        return meter_name in exact or bool(wildcards and
+                                           wildcards.match(meter_name))
+
     def support_meter(self, meter_name):
         meter_name = self._variable_meter_name(meter_name)
-
-        # Special case: if we only have negation, we suppose the default it
-        # allow
-        if all(meter.startswith('!') for meter in self.meters):
-            default = True
-        else:
-            default = False
-
-        # Support wildcard like storage.* and !disk.*
-        # Start with negation, we consider that the order is deny, allow
-        if any(fnmatch.fnmatch(meter_name, meter[1:])
-               for meter in self.meters
-               if meter[0] == '!'):
-            return False
-
-        if any(fnmatch.fnmatch(meter_name, meter)
-               for meter in self.meters
-               if meter[0] != '!'):
-            return True
-
-        return default
+        supported = self._supported.get(meter_name)
+        if supported is None:
+            # Support wildcard like storage.* and !disk.*
+            # Start with negation, we consider that the order is deny, allow
+            if self._match(meter_name, self._excluded):
+                supported = False
+            elif self._match(meter_name, self._included):
+                supported = True
+            else:
+                supported = self._default
+            self._supported[meter_name] = supported
+        return supported
 
     def flush(self, ctxt):
         """Flush data after all samples have been injected to pipeline."""
 
-        LOG.audit(_("Flush pipeline %s"), self)
+        LOG.debug(_("Flush pipeline %s"), self)
         for (i, transformer) in enumerate(self.transformers):
             try:
                 self._publish_samples(i + 1, ctxt,
@@ -296,6 +387,16 @@ class Pipeline(object):
     def get_interval(self):
         return self.interval
 
+    def close(self):
+        """Let the publishers publish what they still buffer."""
+        for p in self.publishers:
+            try:
+                p.close()
+            except Exception:
+                LOG.exception(_("Pipeline %(pipeline)s: Unable to close "
+                                "publisher %(pub)s") % ({'pipeline': self,
+                                                         'pub': p}))
+
 
 class PipelineManager(object):
     """Pipeline Manager
@@ -355,13 +456,22 @@ class PipelineManager(object):
         """
         self.pipelines = [Pipeline(pipedef, transformer_manager)
                           for pipedef in cfg]
+        self.routes = utils.LRUCache(METER_CACHE_SIZE)
+
+    def get_counters(self):
+        """Return the sample counters of each pipeline."""
+        return [p.get_counters() for p in self.pipelines]
 
     def publisher(self, context):
         """Build a new Publisher for these manager pipelines.
 
         :param context: The context.
         """
-        return PublishContext(context, self.pipelines)
+        return PublishContext(context, self.pipelines, self.routes)
+
+    def close(self):
+        for p in self.pipelines:
+            p.close()
 
 
 def setup_pipeline(transformer_manager):
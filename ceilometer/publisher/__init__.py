@@ -47,3 +47,6 @@ class PublisherBase(object):
     @abc.abstractmethod
     def publish_samples(self, context, samples):
         "Publish samples into final conduit."
+
+    def close(self):
+        "Publish what is still buffered and release the resources."
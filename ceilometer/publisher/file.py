@@ -20,9 +20,13 @@ import logging
 import logging.handlers
 import urlparse
 
+from oslo.config import cfg
+
+from ceilometer import archive
 from ceilometer.openstack.common.gettextutils import _  # noqa
 from ceilometer.openstack.common import log
 from ceilometer import publisher
+from ceilometer.publisher import utils
 
 LOG = log.getLogger(__name__)
 
@@ -51,17 +55,41 @@ class FilePublisher(publisher.PublisherBase):
     or backup_count is missing, FileHandler will be used to save the metering
     data. If max_bytes and backup_count are present, RotatingFileHandler will
     be used to save the metering data.
+
+    With a format option, the signed metering messages are written through
+    a buffer as line-delimited JSON or length-prefixed msgpack records,
+    which ceilometer-replay-archive can hand back to the dispatchers:
+
+        file:///var/test?format=msgpack&max_age=3600&backup_count=24&compress=1
+
+    The file is then rotated once it holds max_bytes or is max_age seconds
+    old, and the rotated files are gzipped if compress is 1.
     """
 
     def __init__(self, parsed_url):
         super(FilePublisher, self).__init__(parsed_url)
 
         self.publisher_logger = None
+        self.archive = None
         path = parsed_url.path
         if not path or path.lower() == 'file':
             LOG.error(_('The path for the file publisher is required'))
             return
 
+        params = urlparse.parse_qs(parsed_url.query)
+        if params.get('format'):
+            try:
+                self.archive = archive.ArchiveWriter(
+                    path,
+                    format=params['format'][-1],
+                    max_bytes=int(params.get('max_bytes', [0])[-1]),
+                    max_age=int(params.get('max_age', [0])[-1]),
+                    backup_count=int(params.get('backup_count', [0])[-1]),
+                    compress=bool(int(params.get('compress', [0])[-1])))
+            except ValueError as e:
+                LOG.error(_('Invalid file publisher options: %s'), e)
+            return
+
         rfh = None
         max_bytes = 0
         backup_count = 0
@@ -93,6 +121,15 @@ class FilePublisher(publisher.PublisherBase):
         :param context: Execution context from the service or RPC call
         :param samples: Samples from pipeline after transformation
         """
-        if self.publisher_logger:
+        if self.archive:
+            self.archive.write(
+                utils.meter_message_from_counter(
+                    sample, cfg.CONF.publisher.metering_secret)
+                for sample in samples)
+        elif self.publisher_logger:
             for sample in samples:
                 self.publisher_logger.info(sample.as_dict())
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
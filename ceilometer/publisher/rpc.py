@@ -19,10 +19,11 @@
 """
 
 
-import itertools
-import operator
+import collections
+import time
 import urlparse
 
+import eventlet
 from oslo.config import cfg
 
 from ceilometer.openstack.common.gettextutils import _  # noqa
@@ -93,6 +94,10 @@ class RPCPublisher(publisher.PublisherBase):
         # is provided more than once
         self.per_meter_topic = bool(int(
             options.get('per_meter_topic', [0])[-1]))
+        # With per_meter_topic, the samples can be sent on the meter
+        # topics only, when nothing consumes the metering topic
+        self.aggregate_topic = bool(int(
+            options.get('aggregate_topic', [1])[-1]))
 
         self.target = options.get('target', ['record_metering_data'])[0]
 
@@ -100,7 +105,23 @@ class RPCPublisher(publisher.PublisherBase):
         self.max_queue_length = int(options.get(
             'max_queue_length', [1024])[-1])
 
-        self.local_queue = []
+        # Cast from a sender greenthread rather than from the caller's
+        self.asynchronous = bool(int(options.get('async', [0])[-1]))
+        # Upper bound of the samples the sender merges in one cast
+        self.max_cast_samples = int(options.get(
+            'max_cast_samples', [1000])[-1])
+        # Seconds to wait for the queued messages to be sent on close
+        self.close_timeout = float(options.get('close_timeout', [5])[-1])
+
+        self.local_queue = collections.deque()
+        # The merged messages the sender is casting
+        self.in_flight = collections.deque()
+        self.sender = None
+        self.stats = {'samples': 0,
+                      'casts': 0,
+                      'dropped': 0,
+                      'last_latency': 0.0,
+                      'max_latency': 0.0}
 
         if self.policy in ['queue', 'drop']:
             LOG.info(_('Publishing policy set to %s, \
@@ -130,30 +151,47 @@ class RPCPublisher(publisher.PublisherBase):
         ]
 
         topic = cfg.CONF.publisher_rpc.metering_topic
-        msg = {
-            'method': self.target,
-            'version': '1.0',
-            'args': {'data': meters},
-        }
-        LOG.audit(_('Publishing %(m)d samples on %(t)s') % (
-                  {'m': len(msg['args']['data']), 't': topic}))
-        self.local_queue.append((context, topic, msg))
+        now = time.time()
+        if self.aggregate_topic or not self.per_meter_topic:
+            msg = {
+                'method': self.target,
+                'version': '1.0',
+                'args': {'data': meters},
+            }
+            LOG.audit(_('Publishing %(m)d samples on %(t)s') % (
+                      {'m': len(msg['args']['data']), 't': topic}))
+            self.local_queue.append((context, topic, msg, now))
 
         if self.per_meter_topic:
-            for meter_name, meter_list in itertools.groupby(
-                    sorted(meters, key=operator.itemgetter('counter_name')),
-                    operator.itemgetter('counter_name')):
+            # The meter topics share the signed messages of the
+            # metering topic, grouped in one pass.
+            groups = collections.defaultdict(list)
+            for meter in meters:
+                groups[meter['counter_name']].append(meter)
+            for meter_name in sorted(groups):
                 msg = {
                     'method': self.target,
                     'version': '1.0',
-                    'args': {'data': list(meter_list)},
+                    'args': {'data': groups[meter_name]},
                 }
                 topic_name = topic + '.' + meter_name
                 LOG.audit(_('Publishing %(m)d samples on %(n)s') % (
                           {'m': len(msg['args']['data']), 'n': topic_name}))
-                self.local_queue.append((context, topic_name, msg))
+                self.local_queue.append((context, topic_name, msg, now))
 
-        self.flush()
+        if self.asynchronous:
+            # The queue is bounded whatever the policy, since nothing
+            # blocks the callers anymore.
+            self._check_queue_length()
+            if self.sender is None or self.sender.dead:
+                self.sender = eventlet.spawn(self._send_queued)
+        else:
+            self.flush()
+
+    @property
+    def depth(self):
+        """Number of messages waiting to be sent."""
+        return len(self.local_queue)
 
     def flush(self):
         #note(sileht):
@@ -163,22 +201,98 @@ class RPCPublisher(publisher.PublisherBase):
         # self.local_queue after in case of a other call have already added
         # something in the self.local_queue
         queue = self.local_queue
-        self.local_queue = []
-        self.local_queue = self._process_queue(queue, self.policy) + \
-            self.local_queue
+        self.local_queue = collections.deque()
+        self.local_queue.extendleft(
+            reversed(self._process_queue(queue, self.policy)))
         if self.policy == 'queue':
             self._check_queue_length()
 
+    def close(self):
+        """Try to send the queued messages before the service stops, for
+        close_timeout seconds at most.
+        """
+        with eventlet.Timeout(self.close_timeout, False):
+            if self.sender is not None and not self.sender.dead:
+                self.sender.wait()
+            self._send_queued()
+        if self.sender is not None:
+            self.sender.kill()
+        samples = sum(len(m['args']['data'])
+                      for c, t, m, q in list(self.in_flight) +
+                      list(self.local_queue))
+        if samples:
+            self.stats['dropped'] += samples
+            LOG.warn(_("Unable to publish %d queued samples on stop, "
+                       "dropping them"), samples)
+        self.in_flight = collections.deque()
+        self.local_queue = collections.deque()
+
+    @staticmethod
+    def _coalesce(queue, max_samples=0):
+        """Merge the queued messages into one message per topic, or more
+        when they add up to more than max_samples samples (if > 0).
+
+        A merged message is queued at the time of the oldest of them.
+        Return a list of the merged messages, each with the list of the
+        queued messages it was merged from.
+        """
+        casts = {}
+        merged_casts = []
+        for item in queue:
+            context, topic, msg, queued_at = item
+            data = msg['args']['data']
+            cast = casts.get(topic)
+            if (cast is not None and
+                    (max_samples <= 0 or
+                     len(cast[0][2]['args']['data']) + len(data) <=
+                     max_samples)):
+                cast[0][2]['args']['data'].extend(data)
+                cast[1].append(item)
+            else:
+                merged = dict(msg, args={'data': list(data)})
+                casts[topic] = ((context, topic, merged, queued_at), [item])
+                merged_casts.append(casts[topic])
+        return merged_casts
+
+    def _send_queued(self):
+        """Send the queued messages until the queue is empty."""
+        while self.local_queue:
+            queue = self.local_queue
+            self.local_queue = collections.deque()
+            merged_casts = self._coalesce(queue, self.max_cast_samples)
+            self.in_flight = collections.deque(
+                cast for cast, items in merged_casts)
+            try:
+                remaining = self._process_queue(self.in_flight, self.policy)
+            except (Exception, SystemExit):
+                # There is no caller to raise to, the default policy
+                # loses the messages like it would have in the caller.
+                LOG.exception(_("Failed to publish samples"))
+                self.in_flight = collections.deque()
+                return
+            self.in_flight = collections.deque()
+            if remaining:
+                # Queue back the unsent messages as they were, to be
+                # retried when the next samples are published
+                unsent = set(id(item)
+                             for cast, items in merged_casts[-len(remaining):]
+                             for item in items)
+                self.local_queue.extendleft(reversed(
+                    [item for item in queue if id(item) in unsent]))
+                self._check_queue_length()
+                return
+
     def _check_queue_length(self):
         queue_length = len(self.local_queue)
         if queue_length > self.max_queue_length > 0:
             count = queue_length - self.max_queue_length
-            self.local_queue = self.local_queue[count:]
+            for i in range(count):
+                context, topic, msg, queued_at = self.local_queue.popleft()
+                self.stats['dropped'] += len(msg['args']['data'])
             LOG.warn(_("Publisher max local_queue length is exceeded, "
                      "dropping %d oldest samples") % count)
 
-    @staticmethod
-    def _process_queue(queue, policy):
+    def _process_queue(self, queue, policy):
         #note(sileht):
         # the behavior of rpc.cast call depends of rabbit_max_retries
         # if rabbit_max_retries <= 0:
@@ -194,11 +308,12 @@ class RPCPublisher(publisher.PublisherBase):
         # nothing special is done if rabbit_max_retries <= 0
         # and exception is reraised if rabbit_max_retries > 0
         while queue:
-            context, topic, msg = queue[0]
+            context, topic, msg, queued_at = queue[0]
             try:
                 rpc.cast(context, topic, msg)
             except (SystemExit, rpc.common.RPCException):
-                samples = sum([len(m['args']['data']) for n, n, m in queue])
+                samples = sum([len(m['args']['data'])
+                               for n, n, m, n in queue])
                 if policy == 'queue':
                     LOG.warn(_("Failed to publish %d samples, queue them"),
                              samples)
@@ -206,9 +321,17 @@ class RPCPublisher(publisher.PublisherBase):
                 elif policy == 'drop':
                     LOG.warn(_("Failed to publish %d samples, dropping them"),
                              samples)
+                    self.stats['dropped'] += samples
                     return []
                 # default, occur only if rabbit_max_retries > 0
+                self.stats['dropped'] += samples
                 raise
             else:
-                queue.pop(0)
+                queue.popleft()
+                latency = time.time() - queued_at
+                self.stats['samples'] += len(msg['args']['data'])
+                self.stats['casts'] += 1
+                self.stats['last_latency'] = latency
+                self.stats['max_latency'] = max(self.stats['max_latency'],
+                                                latency)
         return []
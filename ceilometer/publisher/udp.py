@@ -20,6 +20,7 @@
 """
 
 import socket
+import urlparse
 
 import msgpack
 from oslo.config import cfg
@@ -35,14 +36,46 @@ cfg.CONF.import_opt('udp_port', 'ceilometer.collector',
 
 LOG = log.getLogger(__name__)
 
+# Largest UDP payload sent over Ethernet without IP fragmentation
+DEFAULT_MTU = 1472
+
+# Size of the msgpack header of an array of up to 65535 samples
+_ARRAY_HEADER_SIZE = 3
+
 
 class UDPPublisher(publisher.PublisherBase):
     def __init__(self, parsed_url):
         self.host, self.port = network_utils.parse_host_port(
             parsed_url.netloc,
             default_port=cfg.CONF.collector.udp_port)
+        options = urlparse.parse_qs(parsed_url.query)
+        # Samples are packed together in datagrams of up to mtu bytes,
+        # a sample larger than that is sent alone.
+        self.mtu = int(options.get('mtu', [DEFAULT_MTU])[-1])
         self.socket = socket.socket(socket.AF_INET,
                                     socket.SOCK_DGRAM)
+        self.packer = msgpack.Packer()
+
+    def _datagrams(self, samples):
+        """Pack the metering messages of samples into datagrams.
+
+        Each datagram holds either one message or a msgpack array of
+        messages no larger than the MTU.
+        """
+        secret = cfg.CONF.publisher.metering_secret
+        batch = []
+        size = _ARRAY_HEADER_SIZE
+        for sample in samples:
+            msg = utils.meter_message_from_counter(sample, secret)
+            packed = self.packer.pack(msg)
+            if batch and size + len(packed) > self.mtu:
+                yield batch
+                batch = []
+                size = _ARRAY_HEADER_SIZE
+            batch.append(packed)
+            size += len(packed)
+        if batch:
+            yield batch
 
     def publish_samples(self, context, samples):
         """Send a metering message for publishing
@@ -51,18 +84,18 @@ class UDPPublisher(publisher.PublisherBase):
         :param samples: Samples from pipeline after transformation
         """
 
-        for sample in samples:
-            msg = utils.meter_message_from_counter(
-                sample,
-                cfg.CONF.publisher.metering_secret)
-            host = self.host
-            port = self.port
-            LOG.debug(_("Publishing sample %(msg)s over UDP to "
-                        "%(host)s:%(port)d") % {'msg': msg, 'host': host,
-                                                'port': port})
+        for batch in self._datagrams(samples):
+            if len(batch) == 1:
+                data = batch[0]
+            else:
+                data = self.packer.pack_array_header(len(batch)) + ''.join(
+                    batch)
+            LOG.debug(_("Publishing %(count)d samples in %(size)d bytes "
+                        "over UDP to %(host)s:%(port)d"),
+                      {'count': len(batch), 'size': len(data),
+                       'host': self.host, 'port': self.port})
             try:
-                self.socket.sendto(msgpack.dumps(msg),
-                                   (self.host, self.port))
+                self.socket.sendto(data, (self.host, self.port))
             except Exception as e:
-                LOG.warn(_("Unable to send sample over UDP"))
+                LOG.warn(_("Unable to send %d samples over UDP"), len(batch))
                 LOG.exception(e)
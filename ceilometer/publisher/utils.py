@@ -22,6 +22,7 @@
 import hashlib
 import hmac
 
+import msgpack
 from oslo.config import cfg
 
 from ceilometer import utils
@@ -36,8 +37,19 @@ METER_PUBLISH_OPTS = [
                                 cfg.DeprecatedOpt("metering_secret",
                                                   "publisher_rpc")]
                ),
+    cfg.IntOpt('signature_version',
+               default=1,
+               help='Version of the signature computed for metering '
+               'messages: 1 signs every key and value of the message '
+               'separately, 2 signs its canonical serialisation at '
+               'once. Both versions are accepted when verifying, only '
+               'switch to 2 once all the collectors are upgraded'),
 ]
 
+# Version 2 signatures are prefixed so they can be told apart from the
+# version 1 ones, which are plain hexadecimal digests.
+SIGNATURE_V2_PREFIX = 'v2:'
+
 
 def register_opts(config):
     """Register the options for publishing metering messages.
@@ -48,9 +60,7 @@ def register_opts(config):
 register_opts(cfg.CONF)
 
 
-def compute_signature(message, secret):
-    """Return the signature for a message dictionary.
-    """
+def _compute_signature_v1(message, secret):
     digest_maker = hmac.new(secret, '', hashlib.sha256)
     for name, value in utils.recursive_keypairs(message):
         if name == 'message_signature':
@@ -62,12 +72,58 @@ def compute_signature(message, secret):
     return digest_maker.hexdigest()
 
 
+_CONTAINERS = (dict, list, tuple)
+
+
+def _sorted(value):
+    """Return a copy of a container with the dictionaries replaced by
+    lists of (key, value) pairs sorted by key.
+    """
+    if isinstance(value, dict):
+        items = [(k, _sorted(v) if isinstance(v, _CONTAINERS) else v)
+                 for k, v in value.iteritems()]
+        items.sort()
+        return items
+    return [_sorted(v) if isinstance(v, _CONTAINERS) else v for v in value]
+
+
+def _canonical_message(message):
+    """Serialise a message the same way whatever its transport did to it.
+
+    Keys are sorted, tuples are packed as lists and str or unicode
+    values as the same UTF-8 bytes, so the result doesn't change after a
+    JSON or msgpack round trip.
+    """
+    if 'message_signature' in message:
+        message = dict(message)
+        del message['message_signature']
+    return msgpack.dumps(_sorted(message), default=unicode)
+
+
+def compute_signature(message, secret, version=None):
+    """Return the signature for a message dictionary.
+
+    :param version: the signature version, defaults to the configured one.
+    """
+    if version is None:
+        version = cfg.CONF.publisher.signature_version
+    if version == 1:
+        return _compute_signature_v1(message, secret)
+    return SIGNATURE_V2_PREFIX + hmac.new(secret,
+                                          _canonical_message(message),
+                                          hashlib.sha256).hexdigest()
+
+
 def verify_signature(message, secret):
     """Check the signature in the message against the value computed
     from the rest of the contents.
     """
     old_sig = message.get('message_signature')
-    new_sig = compute_signature(message, secret)
+    if old_sig and old_sig.startswith(SIGNATURE_V2_PREFIX):
+        version = 2
+    else:
+        version = 1
+    new_sig = compute_signature(message, secret, version)
     return new_sig == old_sig
 
 
@@ -77,17 +133,6 @@ def meter_message_from_counter(sample, secret):
     Returns a dictionary containing a metering message
     for a notification message and a Sample instance.
     """
-    msg = {'source': sample.source,
-           'counter_name': sample.name,
-           'counter_type': sample.type,
-           'counter_unit': sample.unit,
-           'counter_volume': sample.volume,
-           'user_id': sample.user_id,
-           'project_id': sample.project_id,
-           'resource_id': sample.resource_id,
-           'timestamp': sample.timestamp,
-           'resource_metadata': sample.resource_metadata,
-           'message_id': sample.id,
-           }
+    msg = sample.to_message()
     msg['message_signature'] = compute_signature(msg, secret)
     return msg
@@ -57,8 +57,15 @@ cfg.CONF.register_opts(OPTS)
 # Resource metadata: various metadata
 class Sample(object):
 
+    # Samples are created by the hundred thousand by the agents, so they
+    # don't carry a __dict__ of their own.
+    __slots__ = ('name', 'type', 'unit', 'volume', 'user_id', 'project_id',
+                 'resource_id', 'timestamp', 'resource_metadata', 'source',
+                 '_id')
+
     def __init__(self, name, type, unit, volume, user_id, project_id,
-                 resource_id, timestamp, resource_metadata, source=None):
+                 resource_id, timestamp, resource_metadata, source=None,
+                 id=None):
         self.name = name
         self.type = type
         self.unit = unit
@@ -69,10 +76,52 @@ class Sample(object):
         self.timestamp = timestamp
         self.resource_metadata = resource_metadata
         self.source = source or cfg.CONF.sample_source
-        self.id = str(uuid.uuid1())
+        self._id = id
+
+    @property
+    def id(self):
+        """The sample identifier, generated the first time it is needed.
+
+        Samples dropped by the pipelines before being published never
+        pay for the UUID generation.
+        """
+        if self._id is None:
+            self._id = str(uuid.uuid1())
+        return self._id
+
+    @id.setter
+    def id(self, value):
+        self._id = value
 
     def as_dict(self):
-        return copy.copy(self.__dict__)
+        return {'name': self.name,
+                'type': self.type,
+                'unit': self.unit,
+                'volume': self.volume,
+                'user_id': self.user_id,
+                'project_id': self.project_id,
+                'resource_id': self.resource_id,
+                'timestamp': self.timestamp,
+                'resource_metadata': self.resource_metadata,
+                'source': self.source,
+                'id': self.id}
+
+    def to_message(self):
+        """Return the metering message for this sample, without signature.
+
+        The dictionary is built directly with the wire format field names.
+        """
+        return {'source': self.source,
+                'counter_name': self.name,
+                'counter_type': self.type,
+                'counter_unit': self.unit,
+                'counter_volume': self.volume,
+                'user_id': self.user_id,
+                'project_id': self.project_id,
+                'resource_id': self.resource_id,
+                'timestamp': self.timestamp,
+                'resource_metadata': self.resource_metadata,
+                'message_id': self.id}
 
     @classmethod
     def from_notification(cls, name, type, volume, unit,
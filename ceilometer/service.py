@@ -95,18 +95,41 @@ class DispatchedService(object):
 
     DISPATCHER_NAMESPACE = 'ceilometer.dispatcher'
 
-    def __init__(self, *args, **kwargs):
-        super(DispatchedService, self).__init__(*args, **kwargs)
-        LOG.debug(_('loading dispatchers from %s'),
-                  self.DISPATCHER_NAMESPACE)
-        self.dispatcher_manager = named.NamedExtensionManager(
-            namespace=self.DISPATCHER_NAMESPACE,
-            names=cfg.CONF.dispatcher,
-            invoke_on_load=True,
-            invoke_args=[cfg.CONF])
-        if not list(self.dispatcher_manager):
-            LOG.warning(_('Failed to load any dispatchers for %s'),
-                        self.DISPATCHER_NAMESPACE)
+    _dispatcher_manager = None
+
+    @property
+    def dispatcher_manager(self):
+        """The dispatchers, loaded the first time they are needed.
+
+        A service launched in several worker processes loads them once
+        forked, so every worker has its own storage connection.
+        """
+        if self._dispatcher_manager is None:
+            LOG.debug(_('loading dispatchers from %s'),
+                      self.DISPATCHER_NAMESPACE)
+            self._dispatcher_manager = named.NamedExtensionManager(
+                namespace=self.DISPATCHER_NAMESPACE,
+                names=cfg.CONF.dispatcher,
+                invoke_on_load=True,
+                invoke_args=[cfg.CONF])
+            if not list(self._dispatcher_manager):
+                LOG.warning(_('Failed to load any dispatchers for %s'),
+                            self.DISPATCHER_NAMESPACE)
+        return self._dispatcher_manager
+
+    @dispatcher_manager.setter
+    def dispatcher_manager(self, value):
+        self._dispatcher_manager = value
+
+    def close_dispatchers(self):
+        """Let the loaded dispatchers record what they still buffer."""
+        if self._dispatcher_manager is None:
+            return
+        for ext in self._dispatcher_manager:
+            try:
+                ext.obj.close()
+            except Exception:
+                LOG.exception(_('Unable to close dispatcher %s'), ext.name)
 
 
 def prepare_service(argv=None):
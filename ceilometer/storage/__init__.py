@@ -50,6 +50,12 @@ STORAGE_OPTS = [
                default=-1,
                help="""number of seconds that samples are kept
 in the database for (<= 0 means forever)"""),
+    cfg.BoolOpt('rollups',
+                default=False,
+                help="""keep statistics of the samples per minute, hour
+and day, and use them for statistics by period when possible (only
+supported by the SQLAlchemy driver, ceilometer-dbsync must be run after
+enabling it to compute the statistics of the samples already recorded)"""),
 ]
 
 cfg.CONF.register_opts(STORAGE_OPTS, group='database')
@@ -24,8 +24,11 @@ import math
 import six
 
 from ceilometer.openstack.common.gettextutils import _  # noqa
+from ceilometer.openstack.common import log
 from ceilometer.openstack.common import timeutils
 
+LOG = log.getLogger(__name__)
+
 
 def iter_period(start, end, period):
     """Split a time from start to end in periods of a number of seconds. This
@@ -135,6 +138,22 @@ class Connection(object):
         """
         raise NotImplementedError(_('Projects not implemented'))
 
+    def record_metering_data_batch(self, samples):
+        """Write a list of samples to the backend storage system.
+
+        Drivers able to store several samples in fewer round-trips should
+        override this; the default records them one at a time, so a
+        sample that fails to be recorded doesn't prevent the others to be.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        for data in samples:
+            try:
+                self.record_metering_data(data)
+            except Exception as err:
+                LOG.exception(_('Failed to record metering data: %s'), err)
+
     @staticmethod
     def clear_expired_metering_data(ttl):
         """Clear expired data from the backend storage system according to the
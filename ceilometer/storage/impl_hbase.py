@@ -58,7 +58,8 @@ class HBaseStorage(base.StorageEngine):
       - the metadata for resources
       - { _id: uuid of resource,
           metadata: metadata dictionaries
-          timestamp: datetime of last update
+          first_timestamp: datetime of the first sample
+          last_timestamp: datetime of the last sample
           user_id: uuid
           project_id: uuid
           meter: [ array of {counter_name: string, counter_type: string} ]
@@ -196,26 +197,36 @@ class Connection(base.Connection):
             project_table.put(data['project_id'], project)
 
         rts = reverse_timestamp(data['timestamp'])
+        # Convert timestamp to string as json.dumps won't
+        ts = timeutils.strtime(data['timestamp'])
 
         resource = resource_table.row(data['resource_id'])
 
         new_meter = _format_meter_reference(
             data['counter_name'], data['counter_type'], data['counter_unit'])
-        new_resource = {'f:resource_id': data['resource_id'],
-                        'f:project_id': data['project_id'],
-                        'f:user_id': data['user_id'],
-                        'f:source': data["source"],
-                        # store meters with prefix "m_"
-                        'f:m_%s' % new_meter: "1"
-                        }
-        new_resource.update(resource_metadata)
+        new_resource = dict(resource)
+        # store meters with prefix "m_"
+        new_resource['f:m_%s' % new_meter] = "1"
+
+        # Keep the timestamps of the first and last samples of the resource,
+        # and the owner and metadata of the last one. The timestamp strings
+        # sort in chronological order.
+        first_ts = resource.get('f:first_timestamp')
+        if first_ts is None or ts < first_ts:
+            new_resource['f:first_timestamp'] = ts
+        last_ts = resource.get('f:last_timestamp')
+        if last_ts is None or ts >= last_ts:
+            new_resource = dict((k, v) for k, v in new_resource.iteritems()
+                                if not k.startswith('f:r_'))
+            new_resource.update({'f:resource_id': data['resource_id'],
+                                 'f:project_id': data['project_id'],
+                                 'f:user_id': data['user_id'],
+                                 'f:source': data["source"],
+                                 'f:last_timestamp': ts})
+            new_resource.update(resource_metadata)
 
         # Update if resource has new information
         if new_resource != resource:
-            meters = _load_hbase_list(resource, 'm')
-            if new_meter not in meters:
-                new_resource['f:m_%s' % new_meter] = "1"
-
             resource_table.put(data['resource_id'], new_resource)
 
         # Rowkey consists of reversed timestamp, meter and an md5 of
@@ -228,9 +239,6 @@ class Connection(base.Connection):
         # alphabetically.
         row = "%s_%d_%s" % (data['counter_name'], rts, m.hexdigest())
 
-        # Convert timestamp to string as json.dumps won't
-        ts = timeutils.strtime(data['timestamp'])
-
         record = {'f:timestamp': ts,
                   'f:counter_name': data['counter_name'],
                   'f:counter_type': data['counter_type'],
@@ -300,20 +308,62 @@ class Connection(base.Connection):
         if pagination:
             raise NotImplementedError(_('Pagination not implemented'))
 
-        def make_resource(data, first_ts, last_ts):
-            """Transform HBase fields to Resource model."""
-            # convert HBase metadata e.g. f:r_display_name to display_name
-            data['f:metadata'] = _metadata_from_document(data)
+        # The resource rows know the bounds of their samples and the
+        # metadata of the latest one, so unless we have to look at the
+        # samples themselves, they are all we need to read.
+        if not (user or project or source or metaquery
+                or start_timestamp or end_timestamp):
+            resource_table = self.conn.table(self.RESOURCE_TABLE)
+            if resource:
+                rows = [(resource, resource_table.row(resource))]
+            else:
+                rows = resource_table.scan()
+            for resource_id, data in rows:
+                if 'f:last_timestamp' in data:
+                    yield self._make_resource(
+                        data,
+                        timeutils.parse_strtime(data['f:first_timestamp']),
+                        timeutils.parse_strtime(data['f:last_timestamp']))
+                elif data:
+                    # Recorded before the bounds were kept on write
+                    for r in self._get_resources_from_meters(
+                            resource=resource_id):
+                        yield r
+            return
+
+        for r in self._get_resources_from_meters(
+                user=user, project=project, source=source,
+                start_timestamp=start_timestamp,
+                start_timestamp_op=start_timestamp_op,
+                end_timestamp=end_timestamp,
+                end_timestamp_op=end_timestamp_op,
+                metaquery=metaquery, resource=resource):
+            yield r
 
-            return models.Resource(
-                resource_id=data['f:resource_id'],
-                first_sample_timestamp=first_ts,
-                last_sample_timestamp=last_ts,
-                project_id=data['f:project_id'],
-                source=data['f:source'],
-                user_id=data['f:user_id'],
-                metadata=data['f:metadata'],
-            )
+    @staticmethod
+    def _make_resource(data, first_ts, last_ts):
+        """Transform HBase fields to Resource model."""
+        # convert HBase metadata e.g. f:r_display_name to display_name
+        data['f:metadata'] = _metadata_from_document(data)
+
+        return models.Resource(
+            resource_id=data['f:resource_id'],
+            first_sample_timestamp=first_ts,
+            last_sample_timestamp=last_ts,
+            project_id=data['f:project_id'],
+            source=data['f:source'],
+            user_id=data['f:user_id'],
+            metadata=data['f:metadata'],
+        )
+
+    def _get_resources_from_meters(self, user=None, project=None,
+                                   source=None, start_timestamp=None,
+                                   start_timestamp_op=None,
+                                   end_timestamp=None, end_timestamp_op=None,
+                                   metaquery={}, resource=None):
+        """Return an iterable of models.Resource instances built from the
+        samples matching the filters.
+        """
         meter_table = self.conn.table(self.METER_TABLE)
 
         q, start_row, stop_row = make_query(user=user,
@@ -346,13 +396,13 @@ class Connection(base.Connection):
             if metaquery:
                 for k, v in metaquery.iteritems():
                     if latest_data['f:r_' + k.split('.', 1)[1]] == v:
-                        yield make_resource(
+                        yield self._make_resource(
                             latest_data,
                             min_ts,
                             max_ts
                         )
             else:
-                yield make_resource(
+                yield self._make_resource(
                     latest_data,
                     min_ts,
                     max_ts
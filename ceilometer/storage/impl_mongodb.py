@@ -22,19 +22,21 @@
 
 import calendar
 import copy
+import datetime
 import json
 import operator
-import uuid
 import weakref
 
 import bson.code
 import bson.objectid
+import bson.son
 import pymongo
 
 from oslo.config import cfg
 
 from ceilometer.openstack.common.gettextutils import _  # noqa
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
 from ceilometer import storage
 from ceilometer.storage import base
 from ceilometer.storage import models
@@ -66,6 +68,8 @@ class MongoDBStorage(base.StorageEngine):
               metadata: metadata dictionaries
               user_id: uuid
               project_id: uuid
+              first_sample_timestamp: datetime
+              last_sample_timestamp: datetime
               meter: [ array of {counter_name: string, counter_type: string,
                                  counter_unit: string} ]
             }
@@ -215,15 +219,6 @@ class Connection(base.Connection):
         }
     """
 
-    PARAMS_MAP_STATS = {'key_val': '\'statistics\'',
-                        'groupby_val': 'null',
-                        'period_start_val': 'this.timestamp',
-                        'period_end_val': 'this.timestamp'}
-
-    MAP_STATS = bson.code.Code("function () {" +
-                               EMIT_STATS_COMMON % PARAMS_MAP_STATS +
-                               "}")
-
     PARAMS_MAP_STATS_PERIOD = {
         'key_val': 'period_start',
         'groupby_val': 'null',
@@ -237,17 +232,6 @@ class Connection(base.Connection):
         EMIT_STATS_COMMON % PARAMS_MAP_STATS_PERIOD +
         "}")
 
-    PARAMS_MAP_STATS_GROUPBY = {'key_val': 'groupby_key',
-                                'groupby_val': 'groupby',
-                                'period_start_val': 'this.timestamp',
-                                'period_end_val': 'this.timestamp'}
-
-    MAP_STATS_GROUPBY = bson.code.Code(
-        "function () {" +
-        MAP_STATS_GROUPBY_VAR +
-        EMIT_STATS_COMMON % PARAMS_MAP_STATS_GROUPBY +
-        "}")
-
     PARAMS_MAP_STATS_PERIOD_GROUPBY = {
         'key_val': 'groupby_key',
         'groupby_val': 'groupby',
@@ -303,38 +287,9 @@ class Connection(base.Connection):
     SORT_OPERATION_MAPPING = {'desc': (pymongo.DESCENDING, '$lt'),
                               'asc': (pymongo.ASCENDING, '$gt')}
 
-    MAP_RESOURCES = bson.code.Code("""
-    function () {
-        emit(this.resource_id,
-             {user_id: this.user_id,
-              project_id: this.project_id,
-              source: this.source,
-              first_timestamp: this.timestamp,
-              last_timestamp: this.timestamp,
-              metadata: this.resource_metadata})
-    }""")
-
-    REDUCE_RESOURCES = bson.code.Code("""
-    function (key, values) {
-        var merge = {user_id: values[0].user_id,
-                     project_id: values[0].project_id,
-                     source: values[0].source,
-                     first_timestamp: values[0].first_timestamp,
-                     last_timestamp: values[0].last_timestamp,
-                     metadata: values[0].metadata}
-        values.forEach(function(value) {
-            if (merge.first_timestamp - value.first_timestamp > 0) {
-                merge.first_timestamp = value.first_timestamp;
-                merge.user_id = value.user_id;
-                merge.project_id = value.project_id;
-                merge.source = value.source;
-            } else if (merge.last_timestamp - value.last_timestamp <= 0) {
-                merge.last_timestamp = value.last_timestamp;
-                merge.metadata = value.metadata;
-            }
-        });
-        return merge;
-      }""")
+    # Fields of the aggregated resources matching the sort keys
+    RESOURCE_FIELDS = {'resource_id': '_id',
+                       'timestamp': 'last_timestamp'}
 
     def __init__(self, conf):
         url = conf.database.connection
@@ -345,8 +300,9 @@ class Connection(base.Connection):
         # requires a new storage connection.
         self.conn = self.CONNECTION_POOL.connect(url)
 
-        # Require MongoDB 2.2 to use TTL
-        if self.conn.server_info()['versionArray'] < [2, 2]:
+        # Require MongoDB 2.2 to use TTL and the aggregation framework
+        self.server_version = self.conn.server_info()['versionArray']
+        if self.server_version < [2, 2]:
             raise storage.StorageBadVersion("Need at least MongoDB 2.2")
 
         connection_options = pymongo.uri_parser.parse_uri(url)
@@ -355,12 +311,16 @@ class Connection(base.Connection):
             self.db.authenticate(connection_options['username'],
                                  connection_options['password'])
 
-        # NOTE(jd) Upgrading is just about creating index, so let's do this
+        # NOTE(jd) Upgrading is mostly about creating index, so let's do this
         # on connection to be sure at least the TTL is correcly updated if
-        # needed.
-        self.upgrade()
+        # needed. The data migrations are left to upgrade().
+        self._ensure_indexes()
 
     def upgrade(self):
+        self._ensure_indexes()
+        self._fill_resource_sample_timestamps()
+
+    def _ensure_indexes(self):
         # Establish indexes
         #
         # We need variations for user_id vs. project_id because of the
@@ -407,6 +367,35 @@ class Connection(base.Connection):
             name='meter_ttl'
         )
 
+    def _fill_resource_sample_timestamps(self):
+        """Fill in the sample timestamp bounds and the owner of the first
+        sample of the resources recorded before they were kept up to date
+        on write.
+        """
+        missing = self.db.resource.find(
+            {'last_sample_timestamp': {'$exists': False}}).distinct('_id')
+        if not missing:
+            return
+        bounds = self._aggregate_samples([
+            {'$match': {'resource_id': {'$in': missing}}},
+            {'$sort': {'timestamp': 1}},
+            {'$group': {'_id': '$resource_id',
+                        'user_id': {'$first': '$user_id'},
+                        'project_id': {'$first': '$project_id'},
+                        'source': {'$first': '$source'},
+                        'first_timestamp': {'$first': '$timestamp'},
+                        'last_timestamp': {'$last': '$timestamp'}}},
+        ])
+        for b in bounds:
+            self.db.resource.update(
+                {'_id': b['_id'],
+                 'last_sample_timestamp': {'$exists': False}},
+                {'$set': {'user_id': b['user_id'],
+                          'project_id': b['project_id'],
+                          'source': b['source'],
+                          'first_sample_timestamp': b['first_timestamp'],
+                          'last_sample_timestamp': b['last_timestamp']}})
+
     def clear(self):
         self.conn.drop_database(self.db)
         # Connection will be reopened automatically if needed
@@ -434,21 +423,40 @@ class Connection(base.Connection):
             upsert=True,
         )
 
-        # Record the updated resource metadata
+        # Record the updated resource metadata, unless we already have a
+        # more recent sample of the resource, and the owner of the resource,
+        # unless we already have an older sample of it
+        meter = {'counter_name': data['counter_name'],
+                 'counter_type': data['counter_type'],
+                 'counter_unit': data['counter_unit'],
+                 }
+        try:
+            self.db.resource.update(
+                {'_id': data['resource_id'],
+                 'last_sample_timestamp': {'$not': {'$gt': data['timestamp']}},
+                 },
+                {'$set': {'metadata': data['resource_metadata'],
+                          'last_sample_timestamp': data['timestamp'],
+                          },
+                 '$addToSet': {'meter': meter},
+                 },
+                upsert=True,
+            )
+        except pymongo.errors.DuplicateKeyError:
+            self.db.resource.update(
+                {'_id': data['resource_id']},
+                {'$addToSet': {'meter': meter}},
+            )
         self.db.resource.update(
-            {'_id': data['resource_id']},
+            {'_id': data['resource_id'],
+             'first_sample_timestamp': {'$not': {'$lte': data['timestamp']}},
+             },
             {'$set': {'project_id': data['project_id'],
                       'user_id': data['user_id'],
-                      'metadata': data['resource_metadata'],
                       'source': data['source'],
+                      'first_sample_timestamp': data['timestamp'],
                       },
-             '$addToSet': {'meter': {'counter_name': data['counter_name'],
-                                     'counter_type': data['counter_type'],
-                                     'counter_unit': data['counter_unit'],
-                                     },
-                           },
              },
-            upsert=True,
         )
 
         # Record the raw data for the meter. Use a copy so we do not
@@ -479,6 +487,22 @@ class Connection(base.Connection):
         self.db.project.remove({'_id': {'$nin': results['projects']}})
         self.db.resource.remove({'_id': {'$nin': results['resources']}})
 
+        # The oldest samples of the remaining resources may be gone
+        end = timeutils.utcnow() - datetime.timedelta(seconds=ttl)
+        for r in self.db.resource.find(
+                {'first_sample_timestamp': {'$lt': end}}, fields=['_id']):
+            first = self.db.meter.find_one(
+                {'resource_id': r['_id']},
+                fields=['timestamp', 'user_id', 'project_id', 'source'],
+                sort=[('timestamp', pymongo.ASCENDING)])
+            if first:
+                self.db.resource.update(
+                    {'_id': r['_id']},
+                    {'$set': {'user_id': first['user_id'],
+                              'project_id': first['project_id'],
+                              'source': first['source'],
+                              'first_sample_timestamp': first['timestamp']}})
+
     @staticmethod
     def _get_marker(db_collection, marker_pairs):
         """Return the mark document according to the attribute-value pairs.
@@ -563,6 +587,22 @@ class Connection(base.Connection):
 
         return sort_instructions, operation
 
+    @staticmethod
+    def _build_marker_query(marker, fields, op):
+        """Return a query matching what is sorted after a marker.
+
+        :param marker: the last item of the previous page.
+        :param fields: the fields the items are sorted on.
+        :param op: the paging operator returned by _build_sort_instructions.
+        """
+        criteria = []
+        for i, field in enumerate(fields):
+            criterion = dict((previous, marker[previous])
+                             for previous in fields[:i])
+            criterion[field] = {op: marker[field]}
+            criteria.append(criterion)
+        return {'$or': criteria}
+
     @classmethod
     def paginate_query(cls, q, db_collection, limit=None, marker=None,
                        sort_keys=[], sort_dir='desc'):
@@ -636,9 +676,6 @@ class Connection(base.Connection):
         :param resource: Optional resource filter.
         :param pagination: Optional pagination query.
         """
-        if pagination:
-            raise NotImplementedError(_('Pagination not implemented'))
-
         q = {}
         if user is not None:
             q['user_id'] = user
@@ -666,32 +703,110 @@ class Connection(base.Connection):
             if ts_range:
                 q['timestamp'] = ts_range
 
-        sort_keys = base._handle_sort_key('resource')
-        sort_instructions = self._build_sort_instructions(sort_keys)[0]
-
-        # use a unique collection name for the results collection,
-        # as result post-sorting (as oppposed to reduce pre-sorting)
-        # is not possible on an inline M-R
-        out = 'resource_list_%s' % uuid.uuid4()
-        self.db.meter.map_reduce(self.MAP_RESOURCES,
-                                 self.REDUCE_RESOURCES,
-                                 out=out,
-                                 sort={'resource_id': 1},
-                                 query=q)
-
-        try:
-            for r in self.db[out].find(sort=sort_instructions):
-                resource = r['value']
+        # The resource documents know the bounds of their samples, the
+        # owner of the first one and the metadata of the latest one, so
+        # unless we have to look at the samples themselves, they are all
+        # we need to read. This requires the resources recorded before
+        # that to have been filled in by upgrade(), i.e. ceilometer-dbsync.
+        if not (user or project or source or metaquery or pagination
+                or start_timestamp or end_timestamp
+                or self.db.resource.find_one(
+                    {'last_sample_timestamp': {'$exists': False}})):
+            q = {}
+            if resource is not None:
+                q['_id'] = resource
+            sort_instructions = self._build_sort_instructions(
+                ['user_id', 'project_id', 'last_sample_timestamp'])[0]
+            for r in self.db.resource.find(q, sort=sort_instructions):
                 yield models.Resource(
                     resource_id=r['_id'],
-                    user_id=resource['user_id'],
-                    project_id=resource['project_id'],
-                    first_sample_timestamp=resource['first_timestamp'],
-                    last_sample_timestamp=resource['last_timestamp'],
-                    source=resource['source'],
-                    metadata=resource['metadata'])
-        finally:
-            self.db[out].drop()
+                    user_id=r['user_id'],
+                    project_id=r['project_id'],
+                    first_sample_timestamp=r['first_sample_timestamp'],
+                    last_sample_timestamp=r['last_sample_timestamp'],
+                    source=r['source'],
+                    metadata=r['metadata'])
+            return
+
+        if pagination:
+            # Like the other paginated queries, every key is sorted in the
+            # primary direction, see _build_paginate_query()
+            sort_keys = list(pagination.sort_keys)
+            if 'resource_id' not in sort_keys:
+                sort_keys.append('resource_id')
+            sort_dir = pagination.primary_sort_dir
+            limit = pagination.limit
+            marker = pagination.marker_value
+        else:
+            sort_keys = base._handle_sort_key('resource')
+            sort_dir = 'desc'
+            limit = marker = None
+        sort_instructions, op = self._build_sort_instructions(
+            [self.RESOURCE_FIELDS.get(key, key) for key in sort_keys],
+            sort_dir)
+
+        if marker is not None:
+            marker = list(self._aggregate_resources(
+                dict(q, resource_id=marker)))
+            if not marker:
+                raise base.NoResultFound
+            after_marker = [{'$match': self._build_marker_query(
+                marker[0], [field for field, _d in sort_instructions], op)}]
+        else:
+            after_marker = None
+
+        for r in self._aggregate_resources(q, after_marker,
+                                           sort_instructions, limit):
+            yield models.Resource(
+                resource_id=r['_id'],
+                user_id=r['user_id'],
+                project_id=r['project_id'],
+                first_sample_timestamp=r['first_timestamp'],
+                last_sample_timestamp=r['last_timestamp'],
+                source=r['source'],
+                metadata=r['metadata'])
+
+    def _aggregate_resources(self, q, extra_stages=None,
+                             sort_instructions=None, limit=None):
+        """Return the resources of the samples matching q, with the owner
+        and source of their first sample and the metadata of their latest
+        one.
+
+        :param extra_stages: aggregation stages run on the resources
+                             before they are sorted and limited.
+        """
+        pipeline = [
+            {'$match': q},
+            # Sorting before grouping makes $first and $last pick the
+            # oldest and the latest sample of each resource
+            {'$sort': bson.son.SON([('timestamp', pymongo.ASCENDING),
+                                    ('_id', pymongo.ASCENDING)])},
+            {'$group': {'_id': '$resource_id',
+                        'user_id': {'$first': '$user_id'},
+                        'project_id': {'$first': '$project_id'},
+                        'source': {'$first': '$source'},
+                        'first_timestamp': {'$first': '$timestamp'},
+                        'last_timestamp': {'$last': '$timestamp'},
+                        'metadata': {'$last': '$resource_metadata'}}},
+        ] + (extra_stages or [])
+        if sort_instructions:
+            pipeline.append({'$sort': bson.son.SON(sort_instructions)})
+        if limit:
+            pipeline.append({'$limit': limit})
+        return self._aggregate_samples(pipeline)
+
+    def _aggregate_samples(self, pipeline):
+        """Run an aggregation pipeline on the samples and return an
+        iterable of its results.
+        """
+        # Since MongoDB 2.6 the results can be read through a cursor rather
+        # than a single reply document limited to 16MB, and the stages can
+        # use temporary files past their memory limit
+        if (self.server_version >= [2, 6]
+                and pymongo.version_tuple >= (2, 7)):
+            return self.db.meter.aggregate(pipeline, cursor={},
+                                           allowDiskUse=True)
+        return self.db.meter.aggregate(pipeline)['result']
 
     def get_meters(self, user=None, project=None, resource=None, source=None,
                    metaquery={}, pagination=None):
@@ -771,6 +886,7 @@ class Connection(base.Connection):
 
         q = make_query_from_filter(sample_filter)
 
+        period_start = None
         if period:
             if sample_filter.start:
                 period_start = sample_filter.start
@@ -778,20 +894,75 @@ class Connection(base.Connection):
                 period_start = self.db.meter.find(
                     limit=1, sort=[('timestamp',
                                     pymongo.ASCENDING)])[0]['timestamp']
-            period_start = int(calendar.timegm(period_start.utctimetuple()))
-            params_period = {'period': period,
-                             'period_first': period_start,
-                             'groupby_fields': json.dumps(groupby)}
-            if groupby:
-                map_stats = self.MAP_STATS_PERIOD_GROUPBY % params_period
-            else:
-                map_stats = self.MAP_STATS_PERIOD % params_period
+
+        # Computing the period of a sample in the aggregation pipeline
+        # requires subtracting dates, which MongoDB only supports since 2.6,
+        # so older servers still go through map-reduce.
+        if period and self.server_version < [2, 6]:
+            results = self._map_reduce_statistics(q, period, period_start,
+                                                  groupby)
         else:
-            if groupby:
-                params_groupby = {'groupby_fields': json.dumps(groupby)}
-                map_stats = self.MAP_STATS_GROUPBY % params_groupby
+            results = self._aggregate_statistics(q, period, period_start,
+                                                 groupby)
+
+        # FIXME(terriyu) Fix get_meter_statistics() so we don't use sorted()
+        # to return the results
+        return sorted(results, key=operator.attrgetter('period_start'))
+
+    def _aggregate_statistics(self, q, period, period_start, groupby):
+        group_id = dict((field, '$' + field) for field in groupby or [])
+        if period:
+            offset = {'$subtract': ['$timestamp', period_start]}
+            group_id['period_offset'] = {
+                '$subtract': [offset, {'$mod': [offset, period * 1000]}]}
+
+        # The $match stage goes first so the query can use the indexes
+        results = self._aggregate_samples([
+            {'$match': q},
+            {'$group': {'_id': group_id or None,
+                        'unit': {'$first': '$counter_unit'},
+                        'min': {'$min': '$counter_volume'},
+                        'max': {'$max': '$counter_volume'},
+                        'sum': {'$sum': '$counter_volume'},
+                        'count': {'$sum': 1},
+                        'duration_start': {'$min': '$timestamp'},
+                        'duration_end': {'$max': '$timestamp'}}},
+        ])
+
+        for r in results:
+            if period:
+                start = period_start + datetime.timedelta(
+                    milliseconds=r['_id']['period_offset'])
+                end = start + datetime.timedelta(seconds=period)
             else:
-                map_stats = self.MAP_STATS
+                start = r['duration_start']
+                end = r['duration_end']
+            yield models.Statistics(
+                unit=r['unit'],
+                min=r['min'],
+                max=r['max'],
+                avg=float(r['sum']) / r['count'],
+                sum=r['sum'],
+                count=r['count'],
+                period=period or 0,
+                period_start=start,
+                period_end=end,
+                duration=timeutils.delta_seconds(r['duration_start'],
+                                                 r['duration_end']),
+                duration_start=r['duration_start'],
+                duration_end=r['duration_end'],
+                groupby=(dict((field, r['_id'][field]) for field in groupby)
+                         if groupby else None))
+
+    def _map_reduce_statistics(self, q, period, period_start, groupby):
+        period_start = int(calendar.timegm(period_start.utctimetuple()))
+        params_period = {'period': period,
+                         'period_first': period_start,
+                         'groupby_fields': json.dumps(groupby)}
+        if groupby:
+            map_stats = self.MAP_STATS_PERIOD_GROUPBY % params_period
+        else:
+            map_stats = self.MAP_STATS_PERIOD % params_period
 
         results = self.db.meter.map_reduce(
             map_stats,
@@ -800,12 +971,7 @@ class Connection(base.Connection):
             finalize=self.FINALIZE_STATS,
             query=q,
         )
-
-        # FIXME(terriyu) Fix get_meter_statistics() so we don't use sorted()
-        # to return the results
-        return sorted(
-            (models.Statistics(**(r['value'])) for r in results['results']),
-            key=operator.attrgetter('period_start'))
+        return (models.Statistics(**(r['value'])) for r in results['results'])
 
     @staticmethod
     def _decode_matching_metadata(matching_metadata):
@@ -18,17 +18,34 @@
 """SQLAlchemy storage backend."""
 
 from __future__ import absolute_import
+import calendar
 import datetime
 import eventlet
+import hashlib
+import json
+import math
 import operator
 import os
+import time
 import types
 
+from oslo.config import cfg
 from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import case
+from sqlalchemy import cast
 from sqlalchemy import desc
+from sqlalchemy import extract
 from sqlalchemy import func
+from sqlalchemy import Integer
+from sqlalchemy import literal
+from sqlalchemy import null
+from sqlalchemy import Numeric
+from sqlalchemy import or_
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm import joinedload
 from sqlalchemy import pool
+from sqlalchemy import type_coerce
 
 from ceilometer.openstack.common.db import exception as dbexc
 import ceilometer.openstack.common.db.sqlalchemy.session as sqlalchemy_session
@@ -43,6 +60,19 @@ from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
+# Granularities of the meter rollups, in seconds
+ROLLUP_GRANULARITIES = (60, 3600, 86400)
+
+# Columns identifying a rollup bucket, hashed into its bucket_key
+ROLLUP_KEY_COLUMNS = ('granularity', 'bucket_start', 'counter_name',
+                      'counter_unit', 'user_id', 'project_id',
+                      'resource_id', 'source_id')
+
+# Attributes of a sample filter the rollups can be filtered on
+ROLLUP_FILTER_ATTRIBUTES = ('user', 'project', 'resource', 'meter', 'source',
+                            'start', 'start_timestamp_op',
+                            'end', 'end_timestamp_op', 'metaquery')
+
 
 class SQLAlchemyStorage(base.StorageEngine):
     """Put the data into a SQLAlchemy database.
@@ -76,6 +106,8 @@ class SQLAlchemyStorage(base.StorageEngine):
               resource_metadata: metadata dictionaries
               project_id: project uuid      (->project.id)
               user_id: user uuid            (->user.id)
+              first_sample_timestamp: datetime
+              last_sample_timestamp: datetime
               }
         - sourceassoc
           - the relationships
@@ -85,6 +117,27 @@ class SQLAlchemyStorage(base.StorageEngine):
               user_id: user uuid            (->user.id)
               source_id: source id          (->source.id)
               }
+        - meter_rollup
+          - the statistics of the samples per minute, hour and day,
+            when the rollups option is enabled
+          - { id: rollup id
+              bucket_key: sha1 of the columns identifying the bucket
+              granularity: bucket length in seconds
+              bucket_start: datetime
+              counter_name: counter name
+              counter_unit: counter unit
+              user_id: user uuid
+              project_id: project uuid
+              resource_id: resource uuid
+              source_id: source id
+              count, sum, min, max: statistics of the counter volumes
+              first_timestamp, last_timestamp: datetime
+              }
+        - meter_rollup_state
+          - a row when the meter rollups cover all the samples
+          - { id: 1
+              built_at: datetime
+              }
     """
 
     @staticmethod
@@ -127,6 +180,23 @@ def apply_metaquery_filter(session, query, metaquery):
     return query
 
 
+def _rollup_bucket(timestamp, granularity):
+    """Return the start of the rollup bucket a timestamp belongs to."""
+    offset = calendar.timegm(timestamp.utctimetuple()) % granularity
+    return timestamp.replace(microsecond=0) - datetime.timedelta(
+        seconds=offset)
+
+
+def _rollup_key(key):
+    """Return the bucket_key of a rollup bucket.
+
+    :param key: the values of the ROLLUP_KEY_COLUMNS of the bucket
+    """
+    key = list(key)
+    key[1] = calendar.timegm(key[1].utctimetuple())
+    return hashlib.sha1(json.dumps(key)).hexdigest()
+
+
 def make_query_from_filter(session, query, sample_filter, require_meter=True):
     """Return a query dictionary based on the settings in the filter.
 
@@ -170,6 +240,9 @@ def make_query_from_filter(session, query, sample_filter, require_meter=True):
 class Connection(base.Connection):
     """SqlAlchemy connection."""
 
+    # Whether this process already marked the rollups as incomplete
+    _rollups_invalidated = False
+
     def __init__(self, conf):
         url = conf.database.connection
         if url == 'sqlite://':
@@ -187,6 +260,89 @@ class Connection(base.Connection):
     def upgrade(self):
         session = sqlalchemy_session.get_session()
         migration.db_sync(session.get_bind())
+        if cfg.CONF.database.rollups:
+            self._build_rollups(session)
+
+    @classmethod
+    def _build_rollups(cls, session):
+        """Compute the rollups of the samples already recorded.
+
+        This is done unless the rollups are known to be complete, e.g. the
+        first time the database is upgraded with the rollups option enabled
+        or after samples were recorded with the option disabled.
+        """
+        if session.query(models.MeterRollupState.id).first() is not None:
+            return
+        with session.begin():
+            session.query(models.MeterRollup).delete(
+                synchronize_session=False)
+            cls._compute_rollups(session)
+            session.add(models.MeterRollupState(id=1,
+                                                built_at=timeutils.utcnow()))
+        cls._rollups_invalidated = False
+
+    @classmethod
+    def _compute_rollups(cls, session):
+        """Insert the rollups of all the samples recorded."""
+        dialect = session.bind.dialect.name
+        epoch = datetime.datetime(1970, 1, 1)
+        source_id = models.sourceassoc.c.source_id
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = cls._period_bucket(dialect, epoch, granularity)
+            if bucket is None:
+                break
+            group = [bucket,
+                     models.Meter.counter_name,
+                     models.Meter.counter_unit,
+                     models.Meter.user_id,
+                     models.Meter.project_id,
+                     models.Meter.resource_id,
+                     source_id]
+            query = session.query(*(group + [
+                func.count(models.Meter.counter_volume),
+                func.sum(models.Meter.counter_volume),
+                func.min(models.Meter.counter_volume),
+                func.max(models.Meter.counter_volume),
+                func.min(models.Meter.timestamp),
+                func.max(models.Meter.timestamp),
+            ])).filter(
+                models.Meter.id == models.sourceassoc.c.meter_id,
+            ).group_by(*group)
+            rows = []
+            for r in query.all():
+                key = ((granularity,
+                        epoch + datetime.timedelta(
+                            seconds=granularity * int(r[0])))
+                       + tuple(r[1:7]))
+                row = dict(zip(ROLLUP_KEY_COLUMNS, key))
+                row.update(bucket_key=_rollup_key(key),
+                           count=r[7],
+                           sum=r[8],
+                           min=r[9],
+                           max=r[10],
+                           first_timestamp=r[11],
+                           last_timestamp=r[12])
+                rows.append(row)
+            if rows:
+                session.execute(models.MeterRollup.__table__.insert(),
+                                rows)
+        else:
+            return
+
+        # We can't compute the buckets in SQL on this dialect, so go
+        # through the samples themselves.
+        query = session.query(models.Meter, source_id).filter(
+            models.Meter.id == models.sourceassoc.c.meter_id)
+        cls._update_rollups(session, [{
+            'counter_name': m.counter_name,
+            'counter_unit': m.counter_unit,
+            'counter_volume': m.counter_volume,
+            'user_id': m.user_id,
+            'project_id': m.project_id,
+            'resource_id': m.resource_id,
+            'source': source,
+            'timestamp': m.timestamp,
+        } for m, source in query.all()])
 
     def clear(self):
         session = sqlalchemy_session.get_session()
@@ -229,14 +385,20 @@ class Connection(base.Connection):
             setattr(obj, k, kwargs[k])
         return obj
 
-    def record_metering_data(self, data):
+    def _spawn(self, func, data):
         if self.pool:
             if self.pool.waiting() > 0:
                 LOG.warn(_("Sqlalchemy connection pool is full, "
                            "perhaps pool_size should be increased"))
-            self.pool.spawn(self._real_record_metering_data, data)
+            self.pool.spawn(func, data)
         else:
-            self._real_record_metering_data(data)
+            func(data)
+
+    def record_metering_data(self, data):
+        self._spawn(self._real_record_metering_data, data)
+
+    def record_metering_data_batch(self, samples):
+        self._spawn(self._real_record_metering_data_batch, samples)
 
     @classmethod
     def _real_record_metering_data(cls, data):
@@ -256,9 +418,7 @@ class Connection(base.Connection):
             project = cls._create_or_update(session, models.Project,
                                             data['project_id'], source)
             resource = cls._create_or_update(session, models.Resource,
-                                             data['resource_id'], source,
-                                             user=user, project=project,
-                                             resource_metadata=rmetadata)
+                                             data['resource_id'], source)
 
             # Record the raw data for the meter.
             meter = models.Meter(counter_type=data['counter_type'],
@@ -277,6 +437,21 @@ class Connection(base.Connection):
             meter.message_id = data['message_id']
             session.flush()
 
+            if resource:
+                cls._update_resources(session, [{
+                    '_id': resource.id,
+                    '_first': data['timestamp'],
+                    '_last': data['timestamp'],
+                    '_user_id': user and user.id,
+                    '_project_id': project and project.id,
+                    '_resource_metadata': rmetadata,
+                }])
+
+            if cfg.CONF.database.rollups:
+                cls._update_rollups(session, [data])
+            else:
+                cls._invalidate_rollups(session)
+
             if rmetadata:
                 if isinstance(rmetadata, dict):
                     for key, v in utils.dict_to_keyval(rmetadata):
@@ -290,6 +465,337 @@ class Connection(base.Connection):
                                                meta_key=key,
                                                value=v))
 
+    @staticmethod
+    def _update_resources(session, bounds):
+        """Extend the sample timestamp bounds of resources, and record the
+        owner and metadata of their latest sample.
+
+        The conditions are evaluated by the database so parallel writers
+        can't move the bounds backward.
+
+        :param bounds: a list of dictionaries with the resource _id, the
+                       _first and _last timestamps of its new samples and the
+                       _user_id, _project_id and _resource_metadata of the
+                       last one
+        """
+        table = models.Resource.__table__
+        first = bindparam('_first', type_=models.PreciseTimestamp())
+        last = bindparam('_last', type_=models.PreciseTimestamp())
+        session.execute(
+            table.update().where(and_(
+                table.c.id == bindparam('_id'),
+                or_(table.c.first_sample_timestamp == null(),
+                    table.c.first_sample_timestamp > first))).values(
+                        first_sample_timestamp=first),
+            bounds)
+        session.execute(
+            table.update().where(and_(
+                table.c.id == bindparam('_id'),
+                or_(table.c.last_sample_timestamp == null(),
+                    table.c.last_sample_timestamp <= last))).values(
+                        last_sample_timestamp=last,
+                        user_id=bindparam('_user_id'),
+                        project_id=bindparam('_project_id'),
+                        resource_metadata=bindparam(
+                            '_resource_metadata',
+                            type_=models.JSONEncodedDict())),
+            bounds)
+
+    @classmethod
+    def _invalidate_rollups(cls, session):
+        """Mark the rollups as incomplete, as samples are recorded without
+        being added to them, so they get rebuilt on the next upgrade.
+        """
+        if not cls._rollups_invalidated:
+            session.query(models.MeterRollupState).delete(
+                synchronize_session=False)
+            cls._rollups_invalidated = True
+
+    @staticmethod
+    def _add_to_rollup(session, key, r):
+        """Add aggregated samples to the statistics of an existing rollup
+        bucket, return the number of rows updated.
+        """
+        table = models.MeterRollup.__table__
+        first = literal(r['first_timestamp'], models.PreciseTimestamp())
+        last = literal(r['last_timestamp'], models.PreciseTimestamp())
+        result = session.execute(table.update().where(
+            table.c.bucket_key == _rollup_key(key)
+        ).values(
+            count=table.c.count + r['count'],
+            sum=table.c.sum + r['sum'],
+            min=case([(table.c.min > r['min'], r['min'])],
+                     else_=table.c.min),
+            max=case([(table.c.max < r['max'], r['max'])],
+                     else_=table.c.max),
+            first_timestamp=case([(table.c.first_timestamp > first, first)],
+                                 else_=table.c.first_timestamp),
+            last_timestamp=case([(table.c.last_timestamp < last, last)],
+                                else_=table.c.last_timestamp),
+        ))
+        return result.rowcount
+
+    @classmethod
+    def _update_rollups(cls, session, samples):
+        """Add samples to the statistics of the rollup buckets they belong
+        to, creating the buckets that do not exist yet.
+
+        The samples are first aggregated in memory so each bucket is
+        written once; the statistics are updated by the database so
+        parallel writers don't lose each other's samples.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        def _id(value):
+            return str(value) if value else None
+
+        rollups = {}
+        for data in samples:
+            volume = data['counter_volume']
+            timestamp = data['timestamp']
+            for granularity in ROLLUP_GRANULARITIES:
+                key = (granularity,
+                       _rollup_bucket(timestamp, granularity),
+                       data['counter_name'],
+                       data['counter_unit'],
+                       _id(data['user_id']),
+                       _id(data['project_id']),
+                       _id(data['resource_id']),
+                       _id(data['source']))
+                r = rollups.get(key)
+                if r is None:
+                    rollups[key] = {'count': 1,
+                                    'sum': volume,
+                                    'min': volume,
+                                    'max': volume,
+                                    'first_timestamp': timestamp,
+                                    'last_timestamp': timestamp}
+                else:
+                    r['count'] += 1
+                    r['sum'] += volume
+                    r['min'] = min(r['min'], volume)
+                    r['max'] = max(r['max'], volume)
+                    r['first_timestamp'] = min(r['first_timestamp'],
+                                               timestamp)
+                    r['last_timestamp'] = max(r['last_timestamp'],
+                                              timestamp)
+
+        new = [(key, r) for key, r in rollups.iteritems()
+               if not cls._add_to_rollup(session, key, r)]
+        if not new:
+            return
+
+        # A parallel writer may create the same buckets after we looked
+        # for them; the unique constraint on the bucket key makes the
+        # insert fail then, in a savepoint so we can add to them instead
+        # (sqlite has no savepoints but doesn't write in parallel either)
+        def _row(key, r):
+            return dict(r, bucket_key=_rollup_key(key),
+                        **dict(zip(ROLLUP_KEY_COLUMNS, key)))
+
+        table = models.MeterRollup.__table__
+        nested = session.connection().dialect.name != 'sqlite'
+        try:
+            with session.begin(nested=nested, subtransactions=not nested):
+                session.execute(table.insert(),
+                                [_row(key, r) for key, r in new])
+        except dbexc.DBDuplicateEntry:
+            for key, r in new:
+                try:
+                    with session.begin(nested=nested,
+                                       subtransactions=not nested):
+                        session.execute(table.insert(), _row(key, r))
+                except dbexc.DBDuplicateEntry:
+                    cls._add_to_rollup(session, key, r)
+
+    @staticmethod
+    def _insert_missing(session, model_class, ids):
+        """Insert a bare row for each of the ids not yet in the table."""
+        ids = set(_id for _id in ids if _id)
+        if not ids:
+            return
+        existing = set(x[0] for x in session.query(model_class.id).filter(
+            model_class.id.in_(ids)))
+        missing = ids - existing
+        if missing:
+            session.execute(model_class.__table__.insert(),
+                            [{'id': _id} for _id in missing])
+
+    @staticmethod
+    def _insert_missing_sourceassoc(session, column, pairs):
+        """Associate each (id, source_id) pair in pairs if not done yet.
+
+        :param column: the sourceassoc column the ids belong to, like
+                       'user_id' or 'resource_id'
+        """
+        if not pairs:
+            return
+        id_column = models.sourceassoc.c[column]
+        source_column = models.sourceassoc.c.source_id
+        query = session.query(id_column, source_column).filter(
+            id_column.in_(set(p[0] for p in pairs)),
+            source_column.in_(set(p[1] for p in pairs)))
+        missing = set(pairs) - set(tuple(x) for x in query)
+        if missing:
+            session.execute(models.sourceassoc.insert(),
+                            [{column: _id, 'source_id': source_id}
+                             for _id, source_id in missing])
+
+    @classmethod
+    def _real_record_metering_data_batch(cls, samples):
+        """Write a list of samples to the backend storage system.
+
+        Users, projects, resources and sources are deduplicated in memory
+        and created with one statement per table, metadata rows are
+        inserted with executemany and the whole batch is committed once.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        if not samples:
+            return
+        session = sqlalchemy_session.get_session()
+        start = time.time()
+        try:
+            with session.begin():
+                cls._write_batch(session, samples)
+            LOG.debug(_("Recorded %(count)d samples in %(time).3fs"),
+                      {'count': len(samples), 'time': time.time() - start})
+        except dbexc.DBDuplicateEntry:
+            # NOTE: a parallel call created some of the users, projects
+            # or resources of this batch after we looked them up; the
+            # transaction has been rolled back, so fall back to the per
+            # sample path that knows how to deal with that.
+            LOG.debug(_("Concurrent insert detected, recording %d samples "
+                        "one by one"), len(samples))
+            cls._record_one_by_one(samples)
+        except Exception as err:
+            # NOTE: don't let a bad sample discard the rest of the batch.
+            LOG.warning(_("Failed to record %(count)d samples at once, "
+                          "recording them one by one: %(err)s"),
+                        {'count': len(samples), 'err': err})
+            cls._record_one_by_one(samples)
+
+    @classmethod
+    def _record_one_by_one(cls, samples):
+        for data in samples:
+            try:
+                cls._real_record_metering_data(data)
+            except Exception as err:
+                LOG.exception(_('Failed to record metering data: %s'), err)
+
+    @classmethod
+    def _write_batch(cls, session, samples):
+        def _id(value):
+            return str(value) if value else None
+
+        # Keep the timestamp bounds of each resource in the batch, and the
+        # owner and metadata of its latest sample; on a tie, the last one
+        # wins as it would if they were recorded one after another.
+        resources = {}
+        user_assoc, project_assoc, resource_assoc = set(), set(), set()
+        for data in samples:
+            source_id = _id(data['source'])
+            user_id = _id(data['user_id'])
+            project_id = _id(data['project_id'])
+            resource_id = _id(data['resource_id'])
+            if user_id:
+                user_assoc.add((user_id, source_id))
+            if project_id:
+                project_assoc.add((project_id, source_id))
+            if resource_id:
+                resource_assoc.add((resource_id, source_id))
+                timestamp = data['timestamp']
+                bounds = resources.setdefault(resource_id, {
+                    '_id': resource_id,
+                    '_first': timestamp,
+                    '_last': timestamp,
+                })
+                bounds['_first'] = min(bounds['_first'], timestamp)
+                if timestamp >= bounds['_last']:
+                    bounds.update(_last=timestamp,
+                                  _user_id=user_id,
+                                  _project_id=project_id,
+                                  _resource_metadata=data[
+                                      'resource_metadata'])
+
+        cls._insert_missing(session, models.Source,
+                            (_id(d['source']) for d in samples))
+        cls._insert_missing(session, models.User,
+                            (u for u, s in user_assoc))
+        cls._insert_missing(session, models.Project,
+                            (p for p, s in project_assoc))
+
+        resource_table = models.Resource.__table__
+        existing = set()
+        if resources:
+            existing = set(x[0] for x in session.query(
+                models.Resource.id).filter(
+                    models.Resource.id.in_(resources.keys())))
+        new = [{'id': r,
+                'user_id': b['_user_id'],
+                'project_id': b['_project_id'],
+                'resource_metadata': b['_resource_metadata'],
+                'first_sample_timestamp': b['_first'],
+                'last_sample_timestamp': b['_last']}
+               for r, b in resources.iteritems() if r not in existing]
+        if new:
+            session.execute(resource_table.insert(), new)
+        if existing:
+            cls._update_resources(session,
+                                  [resources[r] for r in existing])
+
+        cls._insert_missing_sourceassoc(session, 'user_id', user_assoc)
+        cls._insert_missing_sourceassoc(session, 'project_id', project_assoc)
+        cls._insert_missing_sourceassoc(session, 'resource_id',
+                                        resource_assoc)
+
+        # NOTE: the meter ids are needed for the association and metadata
+        # rows and there is no portable way to get them back from a
+        # multi-row insert, so meters are inserted one by one, but without
+        # going through the ORM.
+        meter_assoc = []
+        meta_rows = {}
+        for data in samples:
+            rmetadata = data['resource_metadata']
+            result = session.execute(models.Meter.__table__.insert(), {
+                'counter_type': data['counter_type'],
+                'counter_unit': data['counter_unit'],
+                'counter_name': data['counter_name'],
+                'counter_volume': data['counter_volume'],
+                'user_id': _id(data['user_id']),
+                'project_id': _id(data['project_id']),
+                'resource_id': _id(data['resource_id']),
+                'timestamp': data['timestamp'],
+                'resource_metadata': rmetadata,
+                'message_signature': data['message_signature'],
+                'message_id': data['message_id'],
+            })
+            meter_id = result.inserted_primary_key[0]
+            meter_assoc.append({'meter_id': meter_id,
+                                'source_id': _id(data['source'])})
+
+            if rmetadata and isinstance(rmetadata, dict):
+                for key, v in utils.dict_to_keyval(rmetadata):
+                    try:
+                        _model = META_TYPE_MAP[type(v)]
+                    except KeyError:
+                        LOG.warn(_("Unknown metadata type. Key (%s) will "
+                                   "not be queryable."), key)
+                    else:
+                        meta_rows.setdefault(_model, []).append(
+                            {'id': meter_id, 'meta_key': key, 'value': v})
+
+        session.execute(models.sourceassoc.insert(), meter_assoc)
+        for _model, rows in meta_rows.iteritems():
+            session.execute(_model.__table__.insert(), rows)
+
+        if cfg.CONF.database.rollups:
+            cls._update_rollups(session, samples)
+        else:
+            cls._invalidate_rollups(session)
+
     @staticmethod
     def clear_expired_metering_data(ttl):
         """Clear expired data from the backend storage system according to the
@@ -307,6 +813,13 @@ class Connection(base.Connection):
             for meter_obj in meter_query.all():
                 session.delete(meter_obj)
 
+            for granularity in ROLLUP_GRANULARITIES:
+                session.query(models.MeterRollup).filter(
+                    models.MeterRollup.granularity == granularity,
+                    models.MeterRollup.bucket_start <=
+                    end - datetime.timedelta(seconds=granularity)).delete(
+                        synchronize_session=False)
+
             query = session.query(models.User).filter(
                 ~models.User.id.in_(session.query(models.Meter.user_id)
                                     .group_by(models.Meter.user_id)),
@@ -342,6 +855,16 @@ class Connection(base.Connection):
             for res_obj in query.all():
                 session.delete(res_obj)
 
+            # The oldest samples of the remaining resources may be gone
+            first_ts = session.query(
+                func.min(models.Meter.timestamp)).filter(
+                    models.Meter.resource_id == models.Resource.id).correlate(
+                        models.Resource)
+            session.query(models.Resource).filter(
+                models.Resource.first_sample_timestamp < end).update(
+                    {'first_sample_timestamp': first_ts.as_scalar()},
+                    synchronize_session=False)
+
     @staticmethod
     def get_users(source=None):
         """Return an iterable of user id strings.
@@ -391,11 +914,35 @@ class Connection(base.Connection):
         if pagination:
             raise NotImplementedError(_('Pagination not implemented'))
 
+        session = sqlalchemy_session.get_session()
+
+        # The resource rows know the bounds of their samples and the
+        # metadata of the latest one, so unless we have to look at the
+        # samples themselves, they are all we need to read.
+        if not (user or project or metaquery
+                or start_timestamp or end_timestamp):
+            query = session.query(models.Resource).options(
+                joinedload(models.Resource.sources)).filter(
+                    models.Resource.last_sample_timestamp != null())
+            if resource:
+                query = query.filter(models.Resource.id == resource)
+            if source:
+                query = query.filter(models.Resource.sources.any(id=source))
+            for r in query.all():
+                yield api_models.Resource(
+                    resource_id=r.id,
+                    project_id=r.project_id,
+                    first_sample_timestamp=r.first_sample_timestamp,
+                    last_sample_timestamp=r.last_sample_timestamp,
+                    source=source or r.sources[0].id,
+                    user_id=r.user_id,
+                    metadata=r.resource_metadata,
+                )
+            return
+
         # (thomasm) We need to get the max timestamp first, since that's the
         # most accurate. We also need to filter down in the subquery to
         # constrain what we have to JOIN on later.
-        session = sqlalchemy_session.get_session()
-
         ts_subquery = session.query(
             models.Meter.resource_id,
             func.max(models.Meter.timestamp).label("max_ts"),
@@ -547,23 +1094,43 @@ class Connection(base.Connection):
             return
 
         session = sqlalchemy_session.get_session()
-        query = session.query(models.Meter)
+        query = session.query(
+            models.Meter.counter_name,
+            models.Meter.counter_type,
+            models.Meter.counter_unit,
+            models.Meter.counter_volume,
+            models.Meter.user_id,
+            models.Meter.project_id,
+            models.Meter.resource_id,
+            models.Meter.timestamp,
+            models.Meter.resource_metadata,
+            models.Meter.message_id,
+            models.Meter.message_signature,
+            # Meter.sources contains one and only one source in the
+            # current implementation, fetch it along with the sample.
+            models.sourceassoc.c.source_id,
+        )
         query = make_query_from_filter(session, query, sample_filter,
                                        require_meter=False)
+        query = query.filter(
+            models.Meter.id == models.sourceassoc.c.meter_id).order_by(
+                desc(models.Meter.timestamp))
         if limit:
             query = query.limit(limit)
-        samples = query.from_self()\
-            .order_by(desc(models.Meter.timestamp)).all()
 
-        for s in samples:
+        # Execute the underlying statement so no ORM object is built, and
+        # ask for a server side cursor so the rows are fetched as they are
+        # consumed rather than all at once, on the dialects supporting it.
+        result = session.execute(
+            query.statement.execution_options(stream_results=True))
+        for s in result:
             # Remove the id generated by the database when
             # the sample was inserted. It is an implementation
             # detail that should not leak outside of the driver.
             yield api_models.Sample(
                 # Replace 'sources' with 'source' to meet the caller's
-                # expectation, Meter.sources contains one and only one
-                # source in the current implementation.
-                source=s.sources[0].id,
+                # expectation.
+                source=s.source_id,
                 counter_name=s.counter_name,
                 counter_type=s.counter_type,
                 counter_unit=s.counter_unit,
@@ -578,7 +1145,7 @@ class Connection(base.Connection):
             )
 
     @staticmethod
-    def _make_stats_query(sample_filter, groupby):
+    def _make_stats_query(sample_filter, groupby, bucket=None):
         select = [
             models.Meter.counter_unit.label('unit'),
             func.min(models.Meter.timestamp).label('tsmin'),
@@ -596,13 +1163,46 @@ class Connection(base.Connection):
             group_attributes = [getattr(models.Meter, g) for g in groupby]
             select.extend(group_attributes)
 
+        if bucket is not None:
+            select.append(bucket.label('bucket'))
+
         query = session.query(*select)
 
         if groupby:
             query = query.group_by(*group_attributes)
+        if bucket is not None:
+            query = query.group_by(bucket).order_by(bucket)
 
         return make_query_from_filter(session, query, sample_filter)
 
+    @staticmethod
+    def _period_bucket(dialect, start, period):
+        """Return an expression of the period number a sample belongs to.
+
+        This is floor((timestamp - start) / period), written for each
+        dialect since there is no portable way to manipulate timestamps
+        in SQL. None is returned if the dialect is not supported.
+        """
+        if dialect == 'mysql':
+            # PreciseTimestamp are stored as DECIMAL unixtime on MySQL
+            return func.floor(
+                (type_coerce(models.Meter.timestamp, Numeric(20, 6))
+                 - utils.dt_to_decimal(start)) / period)
+        elif dialect == 'postgresql':
+            return func.floor(
+                extract('epoch', models.Meter.timestamp - start) / period)
+        elif dialect == 'sqlite':
+            # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' strings
+            # on SQLite, use integer microseconds to get exact boundaries;
+            # integer division is floor() as timestamp >= start.
+            seconds = cast(func.strftime('%s', models.Meter.timestamp),
+                           Integer)
+            micro = cast(func.substr(models.Meter.timestamp, 21, 6),
+                         Integer)
+            return (((seconds - calendar.timegm(start.utctimetuple()))
+                     * 1000000 + micro - start.microsecond)
+                    / (period * 1000000))
+
     @staticmethod
     def _stats_result_to_model(result, period, period_start,
                                period_end, groupby):
@@ -626,6 +1226,106 @@ class Connection(base.Connection):
                      if groupby else None)
         )
 
+    @staticmethod
+    def _rollup_granularity(sample_filter, period, start, end):
+        """Return the coarsest rollup granularity the statistics by period
+        of a sample filter can be computed from, or None if they can't.
+
+        This requires the period to be a multiple of the granularity, the
+        time range to start and end on bucket boundaries and the filter to
+        only match on what the rollups keep, e.g. not on a message_id.
+        """
+        if (not cfg.CONF.database.rollups
+                or any(value for attr, value in vars(sample_filter).items()
+                       if attr not in ROLLUP_FILTER_ATTRIBUTES)
+                or sample_filter.metaquery
+                or sample_filter.start_timestamp_op == 'gt'
+                or (sample_filter.end
+                    and sample_filter.end_timestamp_op == 'le')):
+            return None
+        for granularity in reversed(ROLLUP_GRANULARITIES):
+            if (period % granularity == 0
+                    and _rollup_bucket(start, granularity) == start
+                    and (not sample_filter.end
+                         or _rollup_bucket(end, granularity) == end)):
+                return granularity
+
+    @staticmethod
+    def _rollups_complete():
+        """Return whether the rollups cover all the samples recorded."""
+        session = sqlalchemy_session.get_session()
+        return session.query(models.MeterRollupState.id).first() is not None
+
+    @staticmethod
+    def _get_rollup_statistics(sample_filter, period, groupby, granularity,
+                               start, end):
+        periods = int(math.ceil(timeutils.delta_seconds(start, end)
+                                / float(period)))
+        limit = start + datetime.timedelta(seconds=period * periods)
+        if sample_filter.end:
+            limit = min(limit, end)
+        group_attributes = [getattr(models.MeterRollup, g)
+                            for g in groupby or []]
+
+        session = sqlalchemy_session.get_session()
+        query = session.query(
+            models.MeterRollup.bucket_start,
+            func.max(models.MeterRollup.counter_unit),
+            func.sum(models.MeterRollup.count),
+            func.sum(models.MeterRollup.sum),
+            func.min(models.MeterRollup.min),
+            func.max(models.MeterRollup.max),
+            func.min(models.MeterRollup.first_timestamp),
+            func.max(models.MeterRollup.last_timestamp),
+            *group_attributes
+        ).filter(
+            models.MeterRollup.granularity == granularity,
+            models.MeterRollup.counter_name == sample_filter.meter,
+            models.MeterRollup.bucket_start >= start,
+            models.MeterRollup.bucket_start < limit,
+        ).group_by(models.MeterRollup.bucket_start, *group_attributes)
+        for attr in ('user', 'project', 'resource', 'source'):
+            value = getattr(sample_filter, attr)
+            if value:
+                query = query.filter(
+                    getattr(models.MeterRollup, attr + '_id') == value)
+
+        # Fold the buckets into periods
+        stats = {}
+        for r in query.all():
+            index = int(timeutils.delta_seconds(start, r[0]) // period)
+            key = (index,) + tuple(r[8:])
+            s = stats.get(key)
+            if s is None:
+                stats[key] = list(r[1:8])
+            else:
+                s[1] += r[2]
+                s[2] += r[3]
+                s[3] = min(s[3], r[4])
+                s[4] = max(s[4], r[5])
+                s[5] = min(s[5], r[6])
+                s[6] = max(s[6], r[7])
+
+        for key in sorted(stats):
+            unit, count, total, vmin, vmax, tsmin, tsmax = stats[key]
+            period_start = start + datetime.timedelta(
+                seconds=period * key[0])
+            yield api_models.Statistics(
+                unit=unit,
+                count=int(count),
+                min=vmin,
+                max=vmax,
+                avg=total / count,
+                sum=total,
+                duration_start=tsmin,
+                duration_end=tsmax,
+                duration=timeutils.delta_seconds(tsmin, tsmax),
+                period=period,
+                period_start=period_start,
+                period_end=period_start + datetime.timedelta(seconds=period),
+                groupby=(dict(zip(groupby, key[1:])) if groupby else None)
+            )
+
     def get_meter_statistics(self, sample_filter, period=None, groupby=None):
         """Return an iterable of api_models.Statistics instances containing
         meter statistics described by the query parameters.
@@ -650,16 +1350,51 @@ class Connection(base.Connection):
         if not sample_filter.start or not sample_filter.end:
             res = self._make_stats_query(sample_filter, None).first()
 
+        start = sample_filter.start or res.tsmin
+        end = sample_filter.end or res.tsmax
+        if start is None or end is None:
+            return
+
+        granularity = self._rollup_granularity(sample_filter, period,
+                                               start, end)
+        if granularity and self._rollups_complete():
+            for stat in self._get_rollup_statistics(sample_filter, period,
+                                                    groupby, granularity,
+                                                    start, end):
+                yield stat
+            return
+
+        dialect = sqlalchemy_session.get_session().bind.dialect.name
+        bucket = self._period_bucket(dialect, start, period)
+        if bucket is not None:
+            # Only consider the periods iter_period() would return
+            periods = int(math.ceil(timeutils.delta_seconds(start, end)
+                                    / float(period)))
+            query = self._make_stats_query(sample_filter, groupby, bucket)
+            query = query.filter(
+                models.Meter.timestamp <
+                start + datetime.timedelta(seconds=period * periods))
+            for r in query.all():
+                if r.count:
+                    period_start = start + datetime.timedelta(
+                        seconds=period * int(r.bucket))
+                    yield self._stats_result_to_model(
+                        result=r,
+                        period=period,
+                        period_start=period_start,
+                        period_end=period_start + datetime.timedelta(
+                            seconds=period),
+                        groupby=groupby
+                    )
+            return
+
         query = self._make_stats_query(sample_filter, groupby)
         # HACK(jd) This is an awful method to compute stats by period, but
         # since we're trying to be SQL agnostic we have to write portable
         # code, so here it is, admire! We're going to do one request to get
-        # stats by period. We would like to use GROUP BY, but there's no
-        # portable way to manipulate timestamp in SQL, so we can't.
-        for period_start, period_end in base.iter_period(
-                sample_filter.start or res.tsmin,
-                sample_filter.end or res.tsmax,
-                period):
+        # stats by period. This is only used for the dialects
+        # _period_bucket() does not know how to GROUP BY period for.
+        for period_start, period_end in base.iter_period(start, end, period):
             q = query.filter(models.Meter.timestamp >= period_start)
             q = q.filter(models.Meter.timestamp < period_end)
             for r in q.all():
@@ -0,0 +1,48 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlalchemy as sa
+
+from ceilometer.storage.sqlalchemy import models
+
+
+def upgrade(migrate_engine):
+    meta = sa.MetaData(bind=migrate_engine)
+    resource = sa.Table('resource', meta, autoload=True)
+    meter = sa.Table('meter', meta, autoload=True)
+    first = sa.Column('first_sample_timestamp', models.PreciseTimestamp())
+    resource.create_column(first)
+    last = sa.Column('last_sample_timestamp', models.PreciseTimestamp())
+    resource.create_column(last)
+
+    # Populate the new columns from the samples already recorded
+    query = sa.select([meter.c.resource_id,
+                       sa.func.min(meter.c.timestamp),
+                       sa.func.max(meter.c.timestamp)]).group_by(
+                           meter.c.resource_id)
+    for resource_id, first_ts, last_ts in query.execute():
+        resource.update().\
+            where(resource.c.id == resource_id).\
+            values(first_sample_timestamp=first_ts,
+                   last_sample_timestamp=last_ts).\
+            execute()
+
+
+def downgrade(migrate_engine):
+    meta = sa.MetaData(bind=migrate_engine)
+    resource = sa.Table('resource', meta, autoload=True)
+    first = sa.Column('first_sample_timestamp', models.PreciseTimestamp())
+    resource.drop_column(first)
+    last = sa.Column('last_sample_timestamp', models.PreciseTimestamp())
+    resource.drop_column(last)
@@ -222,6 +222,45 @@ class Meter(Base):
                              cascade="all, delete-orphan")
 
 
+class MeterRollup(Base):
+    """Pre-aggregated statistics of the samples of a meter over a bucket
+    of time of a given granularity, in seconds.
+    """
+
+    __tablename__ = 'meter_rollup'
+    __table_args__ = (
+        Index('ix_meter_rollup_bucket',
+              'granularity', 'counter_name', 'bucket_start'),
+        UniqueConstraint('bucket_key', name='uniq_meter_rollup0bucket_key'),
+    )
+    id = Column(Integer, primary_key=True)
+    # sha1 of the columns identifying the bucket, as those are too large
+    # to be indexed together by MySQL
+    bucket_key = Column(String(40))
+    granularity = Column(Integer)
+    bucket_start = Column(PreciseTimestamp())
+    counter_name = Column(String(255))
+    counter_unit = Column(String(255))
+    user_id = Column(String(255))
+    project_id = Column(String(255))
+    resource_id = Column(String(255))
+    source_id = Column(String(255))
+    count = Column(Integer)
+    sum = Column(Float(53))
+    min = Column(Float(53))
+    max = Column(Float(53))
+    first_timestamp = Column(PreciseTimestamp())
+    last_timestamp = Column(PreciseTimestamp())
+
+
+class MeterRollupState(Base):
+    """Marker recording that the meter rollups cover all the samples."""
+
+    __tablename__ = 'meter_rollup_state'
+    id = Column(Integer, primary_key=True)
+    built_at = Column(PreciseTimestamp())
+
+
 class User(Base):
     __tablename__ = 'user'
     id = Column(String(255), primary_key=True)
@@ -250,6 +289,8 @@ class Resource(Base):
     resource_metadata = Column(JSONEncodedDict())
     user_id = Column(String(255), ForeignKey('user.id'))
     project_id = Column(String(255), ForeignKey('project.id'))
+    first_sample_timestamp = Column(PreciseTimestamp())
+    last_sample_timestamp = Column(PreciseTimestamp())
     meters = relationship("Meter", backref='resource')
 
 
@@ -21,6 +21,7 @@
 import json
 import os
 
+import eventlet.wsgi
 import mock
 import wsme
 
@@ -73,6 +74,42 @@ class TestApp(base.BaseTestCase):
         self.assertTrue(api_app.auth_uri.startswith('barttp'))
         os.unlink(tmpfile)
 
+    @mock.patch('ceilometer.openstack.common.service.launch')
+    @mock.patch('eventlet.listen')
+    @mock.patch('ceilometer.service.prepare_service')
+    def test_start_workers(self, prepare_service, listen, launch):
+        self.CONF([], project='ceilometer')
+        self.CONF.set_override('workers', 4, group='api')
+        app.start()
+        listen.assert_called_once_with(('0.0.0.0', 8777))
+        service, = launch.call_args[0]
+        self.assertIsInstance(service, app.APIService)
+        self.assertEqual(service.sock, listen.return_value)
+        self.assertEqual(launch.call_args[1], {'workers': 4})
+        launch.return_value.wait.assert_called_once_with()
+
+    @mock.patch('ceilometer.openstack.common.service.launch')
+    @mock.patch('eventlet.listen')
+    @mock.patch('ceilometer.service.prepare_service')
+    def test_start_single_process(self, prepare_service, listen, launch):
+        self.CONF([], project='ceilometer')
+        app.start()
+        self.assertEqual(launch.call_args[1], {'workers': None})
+
+    @mock.patch.object(app, 'VersionSelectorApplication')
+    def test_api_service_builds_app_on_start(self, selector):
+        sock = mock.Mock()
+        service = app.APIService(sock)
+        self.assertFalse(selector.called)
+        with mock.patch.object(service.tg, 'add_thread') as add_thread:
+            service.start()
+        selector.assert_called_once_with()
+        add_thread.assert_called_once_with(eventlet.wsgi.server,
+                                           sock.dup.return_value,
+                                           selector.return_value,
+                                           custom_pool=service.pool,
+                                           log=mock.ANY)
+
 
 class TestPecanApp(FunctionalTest):
     database_connection = tests_db.MongoDBFakeConnectionUrl()
@@ -21,6 +21,7 @@
 
 import base64
 import datetime
+import json
 import logging
 import testscenarios
 
@@ -150,6 +151,30 @@ class TestListMeters(FunctionalTest,
         data = self.get_json('/samples')
         self.assertEqual(5, len(data))
 
+    def test_list_meters_ndjson(self):
+        response = self.app.get(self.PATH_PREFIX + '/meters',
+                                headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        data = [json.loads(line) for line in response.body.splitlines()]
+        self.assertEqual(data, self.get_json('/meters'))
+
+    def test_list_samples_ndjson(self):
+        response = self.app.get(self.PATH_PREFIX + '/samples',
+                                headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        data = [json.loads(line) for line in response.body.splitlines()]
+        self.assertEqual(data, self.get_json('/samples'))
+
+    def test_list_samples_ndjson_error(self):
+        response = self.app.get(self.PATH_PREFIX + '/samples',
+                                params={'limit': -1},
+                                headers={'Accept': 'application/x-ndjson'},
+                                expect_errors=True)
+        self.assertEqual(response.status_int, 400)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertIn('Limit must be positive',
+                      response.json['error_message']['faultstring'])
+
     def test_list_meters_with_dict_metadata(self):
         data = self.get_json('/meters/meter.mine',
                              q=[{'field':
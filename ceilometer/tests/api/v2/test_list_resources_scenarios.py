@@ -128,6 +128,12 @@ class TestListResources(FunctionalTest,
             timestamp = timestamps.get(res['resource_id'])
             self._verify_sample_timestamps(res, timestamp, timestamp)
 
+        response = self.app.get(self.PATH_PREFIX + '/resources',
+                                headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        lines = response.body.splitlines()
+        self.assertEqual([json.loads(line) for line in lines], data)
+
     def test_instance_multiple_samples(self):
         timestamps = [
             datetime.datetime(2012, 7, 2, 10, 41),
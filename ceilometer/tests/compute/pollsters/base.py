@@ -20,9 +20,39 @@
 
 import mock
 
+from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.openstack.common import test
 
 
+class FakeInspector(virt_inspector.Inspector):
+    """Inspector returning the InstanceStats it is given."""
+
+    def __init__(self, all_stats=()):
+        self.all_stats = dict((stats.instance.name, stats)
+                              for stats in all_stats)
+
+    def _get_stats(self, instance_name):
+        try:
+            return self.all_stats[instance_name]
+        except KeyError:
+            raise virt_inspector.InstanceNotFoundException(instance_name)
+
+    def inspect_instances(self):
+        return [stats.instance for stats in self.all_stats.values()]
+
+    def inspect_cpus(self, instance_name):
+        return self._get_stats(instance_name).cpu
+
+    def inspect_vnics(self, instance_name):
+        return iter(self._get_stats(instance_name).vnics)
+
+    def inspect_disks(self, instance_name):
+        return iter(self._get_stats(instance_name).disks)
+
+    def inspect_all(self):
+        return self.all_stats.values()
+
+
 class TestPollsterBase(test.BaseTestCase):
 
     def setUp(self):
@@ -25,6 +25,7 @@ import six
 
 from ceilometer.compute import manager
 from ceilometer.compute.pollsters import cpu
+from ceilometer.compute.pollsters import util
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.tests.compute.pollsters import base
 
@@ -78,4 +79,24 @@ class TestCPUPollster(base.TestPollsterBase):
         samples = list(pollster.get_samples(mgr, cache, self.instance))
         self.assertEqual(len(samples), 1)
         self.assertEqual(samples[0].volume, 10 ** 6)
-        self.assertEqual(len(cache), 0)
+        # Only the metadata of the instance is cached, not its CPU time
+        self.assertEqual(cache.keys(), [util.CACHE_KEY_METADATA])
+
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_samples_from_instance_stats(self):
+        stats = virt_inspector.InstanceStats(
+            instance=virt_inspector.Instance(name=self.instance.name,
+                                             UUID='uuid'),
+            cpu=virt_inspector.CPUStats(time=5 * (10 ** 6), number=4),
+            vnics=[],
+            disks=[])
+
+        mgr = manager.AgentManager()
+        pollster = cpu.CPUPollster()
+
+        cache = {util.CACHE_KEY_INSTANCE_STATS: {self.instance.name: stats}}
+        samples = list(pollster.get_samples(mgr, cache, self.instance))
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].volume, 5 * (10 ** 6))
+        self.assertEqual(samples[0].resource_metadata.get('cpu_number'), 4)
+        self.assertFalse(self.inspector.inspect_cpus.called)
@@ -22,6 +22,7 @@ import mock
 
 from ceilometer.compute import manager
 from ceilometer.compute.pollsters import disk
+from ceilometer.compute.pollsters import util
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.tests.compute.pollsters import base
 
@@ -58,6 +59,23 @@ class TestDiskPollsters(base.TestPollsterBase):
         self.assertEqual(match[0].volume, expected_volume)
         self.assertEqual(match[0].type, 'cumulative')
 
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_samples_from_instance_stats(self):
+        stats = virt_inspector.InstanceStats(
+            instance=virt_inspector.Instance(name=self.instance.name,
+                                             UUID='uuid'),
+            cpu=None,
+            vnics=[],
+            disks=self.DISKS * 2)
+
+        mgr = manager.AgentManager()
+        pollster = disk.ReadBytesPollster()
+        cache = {util.CACHE_KEY_INSTANCE_STATS: {self.instance.name: stats}}
+        samples = list(pollster.get_samples(mgr, cache, self.instance))
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].volume, 2L)
+        self.assertFalse(self.inspector.inspect_disks.called)
+
     def test_disk_read_requests(self):
         self._check_get_samples(disk.ReadRequestsPollster,
                                 'disk.read.requests', 2L)
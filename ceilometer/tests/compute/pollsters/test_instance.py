@@ -21,7 +21,10 @@
 import mock
 
 from ceilometer.compute import manager
+from ceilometer.compute.pollsters import cpu
 from ceilometer.compute.pollsters import instance as pollsters_instance
+from ceilometer.compute.pollsters import util
+from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.tests.compute.pollsters import base
 
 
@@ -50,3 +53,28 @@ class TestInstancePollster(base.TestPollsterBase):
         samples = list(pollster.get_samples(mgr, {}, self.instance))
         self.assertEqual(len(samples), 1)
         self.assertEqual(samples[0].name, 'instance:m1.small')
+
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_samples_metadata_shared(self):
+        self.inspector.inspect_cpus = mock.Mock(
+            return_value=virt_inspector.CPUStats(time=10 ** 6, number=2))
+        mgr = manager.AgentManager()
+        cache = {}
+        with mock.patch.object(util, '_get_metadata_from_object',
+                               wraps=util._get_metadata_from_object) as md:
+            samples = [s
+                       for pollster in (
+                           pollsters_instance.InstancePollster(),
+                           pollsters_instance.InstanceFlavorPollster(),
+                           cpu.CPUPollster())
+                       for s in pollster.get_samples(mgr, cache,
+                                                     self.instance)]
+        self.assertEqual(md.call_count, 1)
+        self.assertEqual(len(samples), 3)
+        self.assertIs(samples[0].resource_metadata,
+                      samples[1].resource_metadata)
+        self.assertIs(samples[0].resource_metadata,
+                      cache[util.CACHE_KEY_METADATA][self.instance.id])
+        # The additional metadata goes to a copy
+        self.assertEqual(samples[2].resource_metadata['cpu_number'], 2)
+        self.assertNotIn('cpu_number', samples[0].resource_metadata)
@@ -22,6 +22,7 @@ import mock
 
 from ceilometer.compute import manager
 from ceilometer.compute.pollsters import net
+from ceilometer.compute.pollsters import util
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.tests.compute.pollsters import base
 
@@ -61,12 +62,12 @@ class TestNetPollster(base.TestPollsterBase):
         stats2 = virt_inspector.InterfaceStats(rx_bytes=9L, rx_packets=10L,
                                                tx_bytes=11L, tx_packets=12L)
 
-        vnics = [
+        self.vnics = [
             (self.vnic0, stats0),
             (self.vnic1, stats1),
             (self.vnic2, stats2),
         ]
-        self.inspector.inspect_vnics = mock.Mock(return_value=vnics)
+        self.inspector.inspect_vnics = mock.Mock(return_value=self.vnics)
 
     @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
     def _check_get_samples(self, factory, expected):
@@ -133,6 +134,23 @@ class TestNetPollster(base.TestPollsterBase):
              ],
         )
 
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_samples_from_instance_stats(self):
+        stats = virt_inspector.InstanceStats(
+            instance=virt_inspector.Instance(name=self.instance.name,
+                                             UUID='uuid'),
+            cpu=None,
+            vnics=self.vnics[:1],
+            disks=[])
+
+        mgr = manager.AgentManager()
+        pollster = net.IncomingBytesPollster()
+        cache = {util.CACHE_KEY_INSTANCE_STATS: {self.instance.name: stats}}
+        samples = list(pollster.get_samples(mgr, cache, self.instance))
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].volume, 1L)
+        self.assertFalse(self.inspector.inspect_vnics.called)
+
 
 class TestNetPollsterCache(base.TestPollsterBase):
 
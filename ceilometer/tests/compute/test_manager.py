@@ -17,13 +17,17 @@
 # under the License.
 """Tests for ceilometer/agent/manager.py
 """
+import eventlet
 import mock
 
 from ceilometer.compute import manager
+from ceilometer.compute.pollsters import util
+from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer import nova_client
 from ceilometer.openstack.common.fixture import mockpatch
 from ceilometer.openstack.common import test
 from ceilometer.tests import agentbase
+from ceilometer.tests.compute.pollsters import base
 
 
 class TestManager(test.BaseTestCase):
@@ -56,15 +60,15 @@ class TestRunTasks(agentbase.BaseAgentManagerTestCase):
         # instance_get_all_by_host() so when the manager gets the list
         # of instances to poll we can control the results.
         self.instance = self._fake_instance('faux', 'active')
-        stillborn_instance = self._fake_instance('stillborn', 'error')
+        self.stillborn_instance = self._fake_instance('stillborn', 'error')
 
         def instance_get_all_by_host(*args):
-            return [self.instance, stillborn_instance]
+            return [self.instance, self.stillborn_instance]
 
         self.useFixture(mockpatch.PatchObject(
             nova_client.Client,
             'instance_get_all_by_host',
-            side_effect=lambda *x: [self.instance, stillborn_instance]))
+            side_effect=lambda *x: [self.instance, self.stillborn_instance]))
 
     def test_setup_polling_tasks(self):
         super(TestRunTasks, self).test_setup_polling_tasks()
@@ -82,3 +86,132 @@ class TestRunTasks(agentbase.BaseAgentManagerTestCase):
             mgr = manager.AgentManager()
             polling_task = manager.PollingTask(mgr)
             polling_task.poll_and_publish()
+
+    def _polling_task(self):
+        self.setup_pipeline()
+        return self.mgr.setup_polling_tasks()[60]
+
+    def test_polling_workers(self):
+        self.CONF.set_override('polling_workers', 3, group='compute')
+        polling_task = self._polling_task()
+        self.assertEqual(polling_task.pool.size, 3)
+
+    def test_instances_polled_concurrently(self):
+        polling_task = self._polling_task()
+        polling = []
+        concurrency = []
+
+        def get_samples(manager, cache, instance):
+            polling.append(instance)
+            concurrency.append(len(polling))
+            eventlet.sleep(0)
+            polling.remove(instance)
+            return [self.Pollster.test_data]
+
+        instances = [self._fake_instance('i-%d' % i, 'active')
+                     for i in range(5)]
+        for pollster in polling_task.pollsters:
+            pollster.obj.get_samples = get_samples
+        polling_task.poll_and_publish_instances(instances)
+        self.assertEqual(max(concurrency), 5)
+        pub = self.mgr.pipeline_manager.pipelines[0].publishers[0]
+        self.assertEqual(len(pub.samples), 5)
+
+    def test_instance_cache_shared_by_pollsters(self):
+        self.pipeline_cfg[0]['counters'] = ['test', 'testanother']
+        polling_task = self._polling_task()
+        caches = []
+
+        def get_samples(manager, cache, instance):
+            caches.append(cache)
+            return []
+
+        for pollster in polling_task.pollsters:
+            pollster.obj.get_samples = get_samples
+        polling_task.poll_and_publish_instances([self.instance])
+        self.assertEqual(len(caches), 2)
+        self.assertIs(caches[0], caches[1])
+
+    def test_overrun_skips_cycle(self):
+        polling_task = self._polling_task()
+        with mock.patch.object(manager, 'time') as time:
+            time.time.side_effect = [0, 150, 150, 210, 211]
+            polling_task.poll_and_publish()
+            self.assertEqual(polling_task.stats['overruns'], 1)
+            self.assertEqual(polling_task.stats['last_duration'], 150)
+            self.assertEqual(polling_task.resume_at, 180)
+            polling_task.poll_and_publish()
+            self.assertEqual(polling_task.stats['skipped'], 1)
+            polling_task.poll_and_publish()
+        self.assertEqual(polling_task.stats['cycles'], 2)
+        self.assertEqual(polling_task.stats['overruns'], 1)
+        self.assertEqual(polling_task.stats['last_duration'], 1)
+
+    def _get_caches(self, inspector):
+        self.mgr._inspector = inspector
+        polling_task = self._polling_task()
+        caches = []
+
+        def get_samples(manager, cache, instance):
+            caches.append(cache)
+            return []
+
+        for pollster in polling_task.pollsters:
+            pollster.obj.get_samples = get_samples
+        polling_task.poll_and_publish_instances([self.instance])
+        return caches
+
+    def test_instances_inspected_at_once(self):
+        stats = virt_inspector.InstanceStats(
+            instance=virt_inspector.Instance(name='instance-00000001',
+                                             UUID='uuid'),
+            cpu=virt_inspector.CPUStats(number=1, time=1),
+            vnics=[],
+            disks=[])
+        caches = self._get_caches(base.FakeInspector([stats]))
+        self.assertEqual(len(caches), 1)
+        self.assertEqual(util.get_instance_stats(caches[0],
+                                                 'instance-00000001'),
+                         stats)
+
+    def test_instances_inspected_one_by_one(self):
+        caches = self._get_caches(virt_inspector.Inspector())
+        self.assertEqual(len(caches), 1)
+        self.assertNotIn(util.CACHE_KEY_INSTANCE_STATS, caches[0])
+
+    def test_instances_inspection_error(self):
+        inspector = base.FakeInspector()
+        inspector.inspect_all = mock.Mock(side_effect=Exception('boom'))
+        caches = self._get_caches(inspector)
+        self.assertEqual(len(caches), 1)
+        self.assertNotIn(util.CACHE_KEY_INSTANCE_STATS, caches[0])
+
+    def _discover_instances(self, names, now=0):
+        self.mgr._inspector = base.FakeInspector(
+            virt_inspector.InstanceStats(
+                instance=virt_inspector.Instance(name=name, UUID=name),
+                cpu=None, vnics=[], disks=[])
+            for name in names)
+        with mock.patch.object(manager, 'time') as time:
+            time.time.return_value = now
+            return self.mgr.discover_instances()
+
+    def test_local_instance_discovery(self):
+        self.CONF.set_override('local_instance_discovery', True,
+                               group='compute')
+        list_instances = self.mgr.nv.instance_get_all_by_host
+        instances = self._discover_instances(['a', 'b'])
+        self.assertEqual(instances, [self.instance, self.stillborn_instance])
+        self.assertEqual(self._discover_instances(['b', 'a'], 599),
+                         instances)
+        self.assertEqual(list_instances.call_count, 1)
+        self._discover_instances(['a'], 599)
+        self.assertEqual(list_instances.call_count, 2)
+        self._discover_instances(['a'], 1199)
+        self.assertEqual(list_instances.call_count, 3)
+
+    def test_nova_instance_discovery(self):
+        list_instances = self.mgr.nv.instance_get_all_by_host
+        self._discover_instances(['a'])
+        self._discover_instances(['a'])
+        self.assertEqual(list_instances.call_count, 2)
@@ -122,3 +122,31 @@ class TestHyperVInspection(test.BaseTestCase):
 
         self.assertEqual(fake_read_mb * 1024, inspected_stats.read_bytes)
         self.assertEqual(fake_write_mb * 1024, inspected_stats.write_bytes)
+
+    def test_inspect_all(self):
+        self._inspector._utils.get_host_cpu_info.return_value = (1000, 2)
+        self._inspector._utils.get_all_vm_metrics.return_value = [(
+            'fake_element_name',
+            'fake_uuid',
+            (2000, 2, 4000),
+            [{'rx_bytes': 1000,
+              'tx_bytes': 2000,
+              'element_name': 'fake_vnic_name',
+              'address': 'fake_address'}],
+            [{'read_mb': 1000,
+              'write_mb': 2000,
+              'instance_id': 'fake_instance_id',
+              'host_resource': 'fake_host_resource'}])]
+
+        all_stats = list(self._inspector.inspect_all())
+
+        self.assertEqual(1, len(all_stats))
+        instance, cpu, vnics, disks = all_stats[0]
+        self.assertEqual('fake_element_name', instance.name)
+        self.assertEqual('fake_uuid', instance.UUID)
+        self.assertEqual(2, cpu.number)
+        self.assertEqual(4000 * 1000, cpu.time)
+        self.assertEqual('fake_vnic_name', vnics[0][0].name)
+        self.assertEqual(2000, vnics[0][1].tx_bytes)
+        self.assertEqual(1000 * 1024, disks[0][1].read_bytes)
+        self.assertFalse(self._inspector._utils.get_cpu_metrics.called)
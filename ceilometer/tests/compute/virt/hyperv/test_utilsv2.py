@@ -148,6 +148,31 @@ class TestUtilsV2(test.BaseTestCase):
         self.assertEqual(fake_instance_id, disk_metrics[0]['instance_id'])
         self.assertEqual(fake_host_resource, disk_metrics[0]['host_resource'])
 
+    def test_get_all_vm_metrics(self):
+        mock_vm = mock.MagicMock()
+        mock_vm.ElementName = "fake_vm_element_name"
+        mock_vm.Name = "fake_vm_name"
+        self._utils._conn.Msvm_ComputerSystem.return_value = [mock_vm,
+                                                              mock_vm]
+        self._utils._get_metric_def = mock.MagicMock()
+        self._utils._get_cpu_metrics = mock.MagicMock(
+            return_value=(2000, 2, 1000))
+        self._utils._get_vnic_metrics = mock.MagicMock(
+            return_value=iter([{'rx_bytes': 1000}]))
+        self._utils._get_disk_metrics = mock.MagicMock(
+            return_value=iter([]))
+
+        all_metrics = list(self._utils.get_all_vm_metrics())
+
+        self.assertEqual(2, len(all_metrics))
+        self.assertEqual(("fake_vm_element_name", "fake_vm_name",
+                          (2000, 2, 1000), [{'rx_bytes': 1000}], []),
+                         all_metrics[0])
+        self._utils._conn.Msvm_ComputerSystem.assert_called_once_with(
+            Caption="Virtual Machine")
+        # The metric definitions are not queried again for each VM
+        self.assertEqual(5, self._utils._get_metric_def.call_count)
+
     def test_lookup_vm(self):
         fake_vm_element_name = "fake_vm_element_name"
         fake_vm = "fake_vm"
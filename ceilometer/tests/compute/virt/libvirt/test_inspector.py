@@ -26,6 +26,7 @@ import mock
 
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.compute.virt.libvirt import inspector as libvirt_inspector
+from ceilometer.openstack.common.fixture import config
 from ceilometer.openstack.common import test
 
 
@@ -221,6 +222,155 @@ class TestLibvirtInspection(test.BaseTestCase):
                 self.assertEqual(info0.write_bytes, 4L)
 
 
+class FakeLibvirtError(Exception):
+
+    def __init__(self, code):
+        super(FakeLibvirtError, self).__init__(code)
+        self.code = code
+
+    def get_error_code(self):
+        return self.code
+
+
+class TestLibvirtDevicesAndBulkStats(test.BaseTestCase):
+
+    dom_xml = """
+        <domain type='kvm'>
+            <devices>
+                <disk type='file' device='disk'>
+                    <target dev='vda' bus='virtio'/>
+                </disk>
+                <interface type='bridge'>
+                    <mac address='fa:16:3e:71:ec:6d'/>
+                    <target dev='vnet0'/>
+                </interface>
+            </devices>
+        </domain>
+    """
+
+    def setUp(self):
+        super(TestLibvirtDevicesAndBulkStats, self).setUp()
+        self.CONF = self.useFixture(config.Config()).conf
+        self.inspector = libvirt_inspector.LibvirtInspector()
+        self.inspector.connection = mock.Mock()
+        self.domain = mock.Mock()
+        self.domain.ID.return_value = 1
+        self.domain.name.return_value = 'instance-00000001'
+        self.domain.UUIDString.return_value = 'uuid'
+        self.domain.XMLDesc.return_value = self.dom_xml
+        self.domain.blockStats.return_value = (1L, 2L, 3L, 4L, -1)
+        self.inspector.connection.lookupByName.return_value = self.domain
+        self.libvirt = mock.Mock()
+        self.libvirt.libvirtError = FakeLibvirtError
+        self.libvirt.VIR_DOMAIN_STATS_CPU_TOTAL = 1
+        self.libvirt.VIR_DOMAIN_STATS_VCPU = 8
+        self.libvirt.VIR_DOMAIN_STATS_INTERFACE = 16
+        self.libvirt.VIR_DOMAIN_STATS_BLOCK = 32
+        self.libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE = 1
+        patch = mock.patch.object(libvirt_inspector, 'libvirt', self.libvirt)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _inspect_disks(self):
+        return list(self.inspector.inspect_disks('instance-00000001'))
+
+    def test_devices_cached(self):
+        self._inspect_disks()
+        disks = self._inspect_disks()
+        self.assertEqual(self.domain.XMLDesc.call_count, 1)
+        self.assertEqual(self.domain.blockStats.call_count, 2)
+        self.assertEqual(disks[0][0].device, 'vda')
+
+    def test_devices_parsed_again_on_restart(self):
+        self._inspect_disks()
+        self.domain.ID.return_value = 2
+        self._inspect_disks()
+        self.assertEqual(self.domain.XMLDesc.call_count, 2)
+
+    def test_devices_cache_expiry(self):
+        self.CONF.set_override('libvirt_device_cache_ttl', 0)
+        self._inspect_disks()
+        self._inspect_disks()
+        self.assertEqual(self.domain.XMLDesc.call_count, 2)
+
+    def test_connection_liveness(self):
+        self.inspector.connection.isAlive.return_value = 0
+        self.libvirt.openReadOnly.return_value = mock.Mock()
+        with mock.patch('eventlet.tpool.proxy_call') as proxy_call:
+            self.inspector._get_connection()
+        self.assertTrue(proxy_call.called)
+        self.assertFalse(self.inspector.connection.getCapabilities.called)
+
+    def test_inspect_all_bulk(self):
+        hypervisor = mock.Mock()
+        hypervisor.ID.return_value = 0
+        stats = {'cpu.time': 999999L,
+                 'vcpu.current': 2,
+                 'net.count': 1,
+                 'net.0.name': 'vnet0',
+                 'net.0.rx.bytes': 1L,
+                 'net.0.rx.pkts': 2L,
+                 'net.0.tx.bytes': 3L,
+                 'net.0.tx.pkts': 4L,
+                 'block.count': 1,
+                 'block.0.name': 'vda',
+                 'block.0.rd.reqs': 5L,
+                 'block.0.rd.bytes': 6L,
+                 'block.0.wr.reqs': 7L,
+                 'block.0.wr.bytes': 8L}
+        get_all = self.inspector.connection.getAllDomainStats
+        get_all.return_value = [(hypervisor, {}), (self.domain, stats)]
+        all_stats = list(self.inspector.inspect_all())
+        get_all.assert_called_once_with(57, 1)
+        self.assertEqual(len(all_stats), 1)
+        instance, cpu, vnics, disks = all_stats[0]
+        self.assertEqual(instance.name, 'instance-00000001')
+        self.assertEqual(instance.UUID, 'uuid')
+        self.assertEqual(cpu.number, 2)
+        self.assertEqual(cpu.time, 999999L)
+        self.assertEqual(len(vnics), 1)
+        self.assertEqual(vnics[0][0].mac, 'fa:16:3e:71:ec:6d')
+        self.assertEqual(vnics[0][1].rx_packets, 2L)
+        self.assertEqual(vnics[0][1].tx_bytes, 3L)
+        self.assertEqual(len(disks), 1)
+        self.assertEqual(disks[0][0].device, 'vda')
+        self.assertEqual(disks[0][1].read_requests, 5L)
+        self.assertEqual(disks[0][1].write_bytes, 8L)
+        self.assertFalse(self.domain.blockStats.called)
+        self.assertFalse(self.domain.interfaceStats.called)
+
+    def test_inspect_all_unsupported(self):
+        self.libvirt.VIR_ERR_NO_SUPPORT = 3
+        get_all = self.inspector.connection.getAllDomainStats
+        get_all.side_effect = FakeLibvirtError(3)
+        self.assertRaises(NotImplementedError, self.inspector.inspect_all)
+        self.assertRaises(NotImplementedError, self.inspector.inspect_all)
+        self.assertEqual(get_all.call_count, 1)
+        self.assertFalse(self.inspector.bulk_stats_supported)
+
+    def test_inspect_all_error(self):
+        self.libvirt.VIR_ERR_NO_SUPPORT = 3
+        get_all = self.inspector.connection.getAllDomainStats
+        get_all.side_effect = FakeLibvirtError(1)
+        self.assertRaises(FakeLibvirtError, self.inspector.inspect_all)
+        self.assertTrue(self.inspector.bulk_stats_supported)
+
+
+class TestLibvirtConnection(test.BaseTestCase):
+
+    def test_connection_proxied_to_native_threads(self):
+        inspector = libvirt_inspector.LibvirtInspector()
+        fake_libvirt = mock.Mock()
+        with contextlib.nested(
+                mock.patch.object(libvirt_inspector, 'libvirt', fake_libvirt),
+                mock.patch('eventlet.tpool.proxy_call')) as (_, proxy_call):
+            connection = inspector._get_connection()
+        proxy_call.assert_called_once_with(
+            (fake_libvirt.virDomain, fake_libvirt.virConnect),
+            fake_libvirt.openReadOnly, inspector.uri)
+        self.assertIs(connection, proxy_call.return_value)
+
+
 class TestLibvirtInspectionWithError(test.BaseTestCase):
 
     def setUp(self):
@@ -44,10 +44,63 @@ class TestDispatcherDB(test.BaseTestCase):
         )
 
         with mock.patch.object(self.dispatcher.storage_conn,
-                               'record_metering_data') as record_metering_data:
+                               'record_metering_data_batch') as record_batch:
             self.dispatcher.record_metering_data(msg)
 
-        record_metering_data.assert_called_once_with(msg)
+        record_batch.assert_called_once_with([msg])
+
+    def test_valid_messages_in_one_batch(self):
+        msgs = []
+        for i in range(3):
+            msg = {'counter_name': 'test',
+                   'resource_id': '%s-%d' % (self.id(), i),
+                   'counter_volume': i,
+                   }
+            msg['message_signature'] = utils.compute_signature(
+                msg,
+                self.CONF.publisher.metering_secret,
+            )
+            msgs.append(msg)
+        msgs[1]['message_signature'] = 'invalid-signature'
+
+        with mock.patch.object(self.dispatcher.storage_conn,
+                               'record_metering_data_batch') as record_batch:
+            self.dispatcher.record_metering_data(msgs)
+
+        record_batch.assert_called_once_with([msgs[0], msgs[2]])
+
+    def test_batch_failure_records_one_by_one(self):
+        msgs = []
+        for i in range(3):
+            msg = {'counter_name': 'test',
+                   'resource_id': '%s-%d' % (self.id(), i),
+                   'counter_volume': i,
+                   }
+            msg['message_signature'] = utils.compute_signature(
+                msg,
+                self.CONF.publisher.metering_secret,
+            )
+            msgs.append(msg)
+
+        class ErrorConnection:
+
+            def __init__(self):
+                self.recorded = []
+
+            def record_metering_data(self, data):
+                if data['counter_volume'] == 1:
+                    raise ValueError('bad sample')
+                self.recorded.append(data)
+
+            def record_metering_data_batch(self, samples):
+                raise ValueError('bad batch')
+
+        self.dispatcher.storage_conn = ErrorConnection()
+
+        self.dispatcher.record_metering_data(msgs)
+
+        self.assertEqual(self.dispatcher.storage_conn.recorded,
+                         [msgs[0], msgs[2]])
 
     def test_invalid_message(self):
         msg = {'counter_name': 'test',
@@ -63,6 +116,9 @@ class TestDispatcherDB(test.BaseTestCase):
             def record_metering_data(self, data):
                 self.called = True
 
+            def record_metering_data_batch(self, samples):
+                self.called = True
+
         self.dispatcher.storage_conn = ErrorConnection()
 
         self.dispatcher.record_metering_data(msg)
@@ -85,10 +141,13 @@ class TestDispatcherDB(test.BaseTestCase):
         expected['timestamp'] = datetime.datetime(2012, 7, 2, 13, 53, 40)
 
         with mock.patch.object(self.dispatcher.storage_conn,
-                               'record_metering_data') as record_metering_data:
+                               'record_metering_data_batch') as record_batch:
             self.dispatcher.record_metering_data(msg)
 
-        record_metering_data.assert_called_once_with(expected)
+        record_batch.assert_called_once_with([expected])
+        self.assertEqual(msg['timestamp'], '2012-07-02T13:53:40Z')
+        self.assertTrue(utils.verify_signature(
+            msg, self.CONF.publisher.metering_secret))
 
     def test_timestamp_tzinfo_conversion(self):
         msg = {'counter_name': 'test',
@@ -106,7 +165,7 @@ class TestDispatcherDB(test.BaseTestCase):
                                                   31, 50, 262000)
 
         with mock.patch.object(self.dispatcher.storage_conn,
-                               'record_metering_data') as record_metering_data:
+                               'record_metering_data_batch') as record_batch:
             self.dispatcher.record_metering_data(msg)
 
-        record_metering_data.assert_called_once_with(expected)
+        record_batch.assert_called_once_with([expected])
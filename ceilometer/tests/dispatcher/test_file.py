@@ -19,6 +19,7 @@ import logging.handlers
 import os
 import tempfile
 
+from ceilometer import archive
 from ceilometer.dispatcher import file
 from ceilometer.openstack.common.fixture import config
 from ceilometer.openstack.common import test
@@ -101,3 +102,44 @@ class TestDispatcherFile(test.BaseTestCase):
 
         # The log should be None
         self.assertIsNone(dispatcher.log)
+
+    def test_file_dispatcher_archive(self):
+        tf = tempfile.NamedTemporaryFile('r')
+        filename = tf.name
+        tf.close()
+
+        self.CONF.dispatcher_file.file_path = filename
+        self.CONF.dispatcher_file.format = 'json'
+        dispatcher = file.FileDispatcher(self.CONF)
+        self.assertIsNone(dispatcher.log)
+
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        dispatcher.record_metering_data(msg)
+        dispatcher.record_metering_data([msg, msg])
+        dispatcher.close()
+
+        self.assertEqual(list(archive.read_archive(filename)), [msg] * 3)
+
+    def test_file_dispatcher_archive_per_worker(self):
+        tf = tempfile.NamedTemporaryFile('r')
+        filename = tf.name
+        tf.close()
+
+        self.CONF.set_override('workers', 4, group='collector')
+        self.CONF.dispatcher_file.file_path = filename
+        self.CONF.dispatcher_file.format = 'json'
+        dispatcher = file.FileDispatcher(self.CONF)
+
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': 1,
+               }
+        dispatcher.record_metering_data(msg)
+        dispatcher.close()
+
+        self.assertFalse(os.path.exists(filename))
+        self.assertEqual(list(archive.read_archive(
+            '%s.%d' % (filename, os.getpid()))), [msg])
@@ -24,9 +24,11 @@ import logging.handlers
 import os
 import tempfile
 
+from ceilometer import archive
 from ceilometer.openstack.common import network_utils as utils
 from ceilometer.openstack.common import test
 from ceilometer.publisher import file
+from ceilometer.publisher import utils as publisher_utils
 from ceilometer import sample
 
 
@@ -121,3 +123,31 @@ class TestFilePublisher(test.BaseTestCase):
                                   self.test_data)
 
         self.assertIsNone(publisher.publisher_logger)
+
+    def test_file_publisher_archive(self):
+        tempdir = tempfile.mkdtemp()
+        name = '%s/archive' % tempdir
+        parsed_url = utils.urlsplit('file://%s?format=msgpack' % name)
+        publisher = file.FilePublisher(parsed_url)
+        self.assertIsNone(publisher.publisher_logger)
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.close()
+
+        messages = list(archive.read_archive(name))
+        self.assertEqual([m['message_id'] for m in messages],
+                         [s.id for s in self.test_data])
+        for m in messages:
+            self.assertTrue(publisher_utils.verify_signature(
+                m, 'change this or be hacked'))
+
+    def test_file_publisher_archive_invalid(self):
+        tempdir = tempfile.mkdtemp()
+        parsed_url = utils.urlsplit(
+            'file://%s/archive_bad?format=msgpack&max_age=1h' % tempdir)
+        publisher = file.FilePublisher(parsed_url)
+        publisher.publish_samples(None,
+                                  self.test_data)
+
+        self.assertIsNone(publisher.archive)
+        self.assertIsNone(publisher.publisher_logger)
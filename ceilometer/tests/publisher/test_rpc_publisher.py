@@ -157,6 +157,20 @@ class TestPublish(test.BaseTestCase):
         self.assertIn(
             self.CONF.publisher_rpc.metering_topic + '.' + 'test3', topics)
 
+    def test_published_with_per_meter_topic_only(self):
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?per_meter_topic=1'
+                                   '&aggregate_topic=0'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        topic = self.CONF.publisher_rpc.metering_topic
+        self.assertEqual([t for t, rpc_call in self.published],
+                         [topic + '.test', topic + '.test2',
+                          topic + '.test3'])
+        self.assertEqual(sum(len(rpc_call['args']['data'])
+                             for t, rpc_call in self.published),
+                         len(self.test_data))
+
     def test_published_concurrency(self):
         """This test the concurrent access to the local queue
         of the rpc publisher
@@ -307,3 +321,135 @@ class TestPublish(test.BaseTestCase):
             publisher.local_queue[1023][2]['args']['data'][0]['source'],
             'test-1999'
         )
+
+    def test_published_stats(self):
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        self.assertEqual(publisher.stats['samples'], len(self.test_data))
+        self.assertEqual(publisher.stats['casts'], 1)
+        self.assertEqual(publisher.stats['dropped'], 0)
+        self.assertTrue(publisher.stats['max_latency'] >= 0)
+
+    def test_published_async(self):
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        self.assertEqual(len(self.published), 0)
+        self.assertEqual(publisher.depth, 1)
+        publisher.sender.wait()
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(publisher.depth, 0)
+        self.assertEqual(publisher.stats['samples'], len(self.test_data))
+
+    def test_published_async_coalesced(self):
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&per_meter_topic=1'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.publish_samples(None,
+                                  self.test_data)
+        self.assertEqual(publisher.depth, 8)
+        publisher.sender.wait()
+        self.assertEqual(len(self.published), 4)
+        topic, msg = self.published[0]
+        self.assertEqual(topic, self.CONF.publisher_rpc.metering_topic)
+        self.assertEqual(len(msg['args']['data']), 2 * len(self.test_data))
+        self.assertEqual(publisher.stats['casts'], 4)
+
+    def test_published_async_coalesced_max_cast_samples(self):
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&max_cast_samples=%d'
+                                   % (2 * len(self.test_data))))
+        for i in range(3):
+            publisher.publish_samples(None,
+                                      self.test_data)
+        publisher.sender.wait()
+        self.assertEqual([len(msg['args']['data'])
+                          for topic, msg in self.published],
+                         [2 * len(self.test_data), len(self.test_data)])
+        self.assertEqual(publisher.stats['samples'], 3 * len(self.test_data))
+
+    def test_published_async_with_policy_drop_and_rpc_down(self):
+        self.rpc_unreachable = True
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&policy=drop'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.sender.wait()
+        self.assertEqual(len(self.published), 0)
+        self.assertEqual(publisher.depth, 0)
+        self.assertEqual(publisher.stats['dropped'], len(self.test_data))
+
+    def test_published_async_with_policy_default_and_rpc_down(self):
+        self.rpc_unreachable = True
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.sender.wait()
+        self.assertEqual(len(self.published), 0)
+        self.assertEqual(publisher.depth, 0)
+        self.assertEqual(publisher.stats['dropped'], len(self.test_data))
+
+    def test_published_async_with_policy_queue_and_rpc_down_up(self):
+        self.rpc_unreachable = True
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&policy=queue'
+                                   '&max_queue_length=2'))
+        for i in range(3):
+            publisher.publish_samples(None,
+                                      self.test_data)
+            publisher.sender.wait()
+        self.assertEqual(len(self.published), 0)
+        self.assertEqual(publisher.depth, 2)
+        self.assertEqual(publisher.stats['dropped'], len(self.test_data))
+
+        self.rpc_unreachable = False
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.sender.wait()
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(len(self.published[0][1]['args']['data']),
+                         2 * len(self.test_data))
+        self.assertEqual(publisher.depth, 0)
+        self.assertEqual(publisher.stats['dropped'], 2 * len(self.test_data))
+
+    def test_close_sends_queued(self):
+        self.rpc_unreachable = True
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&policy=queue'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.sender.wait()
+        self.assertEqual(publisher.depth, 1)
+
+        self.rpc_unreachable = False
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.close()
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(len(self.published[0][1]['args']['data']),
+                         2 * len(self.test_data))
+        self.assertEqual(publisher.depth, 0)
+
+    def test_close_gives_up_after_timeout(self):
+        def faux_cast_hang(context, topic, msg):
+            eventlet.sleep(60)
+
+        self.useFixture(fixtures.MonkeyPatch(
+            "ceilometer.openstack.common.rpc.cast",
+            faux_cast_hang))
+        publisher = rpc.RPCPublisher(
+            network_utils.urlsplit('rpc://?async=1&close_timeout=0.1'))
+        publisher.publish_samples(None,
+                                  self.test_data)
+        eventlet.sleep(0)
+        publisher.publish_samples(None,
+                                  self.test_data)
+        publisher.close()
+        self.assertTrue(publisher.sender.dead)
+        self.assertEqual(publisher.depth, 0)
+        self.assertEqual(publisher.stats['dropped'], 2 * len(self.test_data))
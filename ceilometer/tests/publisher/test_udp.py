@@ -114,22 +114,24 @@ class TestUDPPublisher(test.BaseTestCase):
         self.CONF = self.useFixture(config.Config()).conf
         self.CONF.publisher.metering_secret = 'not-so-secret'
 
-    def test_published(self):
+    def _publish(self, url):
         self.data_sent = []
         with mock.patch('socket.socket',
                         self._make_fake_socket(self.data_sent)):
             publisher = udp.UDPPublisher(
-                network_utils.urlsplit('udp://somehost'))
+                network_utils.urlsplit(url))
         publisher.publish_samples(None,
                                   self.test_data)
 
-        self.assertEqual(len(self.data_sent), 5)
-
         sent_counters = []
 
         for data, dest in self.data_sent:
-            counter = msgpack.loads(data)
-            sent_counters.append(counter)
+            counters = msgpack.loads(data)
+            if isinstance(counters, list):
+                self.assertTrue(len(data) <= publisher.mtu)
+            else:
+                counters = [counters]
+            sent_counters.extend(counters)
 
             # Check destination
             self.assertEqual(dest, ('somehost',
@@ -143,6 +145,22 @@ class TestUDPPublisher(test.BaseTestCase):
                                  "not-so-secret")
                               for d in self.test_data]))
 
+    def test_published(self):
+        self._publish('udp://somehost?mtu=65000')
+        self.assertEqual(len(self.data_sent), 1)
+        self.assertIsInstance(msgpack.loads(self.data_sent[0][0]), list)
+
+    def test_published_mtu(self):
+        size = max(len(msgpack.dumps(utils.meter_message_from_counter(
+            d, "not-so-secret"))) for d in self.test_data)
+        self._publish('udp://somehost?mtu=%d' % (size * 2 + 3))
+        self.assertEqual(len(self.data_sent), 3)
+
+    def test_published_larger_than_mtu(self):
+        self._publish('udp://somehost?mtu=10')
+        self.assertEqual(len(self.data_sent), 5)
+        self.assertIsInstance(msgpack.loads(self.data_sent[0][0]), dict)
+
     @staticmethod
     def _raise_ioerror(*args):
         raise IOError
@@ -20,6 +20,9 @@
 """Tests for ceilometer/publisher/utils.py
 """
 
+import msgpack
+
+from ceilometer.openstack.common.fixture import config
 from ceilometer.openstack.common import jsonutils
 from ceilometer.openstack.common import test
 from ceilometer.publisher import utils
@@ -101,3 +104,57 @@ class TestSignature(test.BaseTestCase):
             'not-so-secret')
         jsondata = jsonutils.loads(jsonutils.dumps(data))
         self.assertTrue(utils.verify_signature(jsondata, 'not-so-secret'))
+
+    def test_compute_signature_v2(self):
+        data = {'a': 'A', 'b': 'B'}
+        sig = utils.compute_signature(data, 'not-so-secret', 2)
+        self.assertTrue(sig.startswith(utils.SIGNATURE_V2_PREFIX))
+        self.assertNotEqual(sig,
+                            utils.compute_signature(data, 'not-so-secret', 1))
+
+    def test_compute_signature_default_version(self):
+        data = {'a': 'A', 'b': 'B'}
+        self.assertEqual(utils.compute_signature(data, 'not-so-secret'),
+                         utils.compute_signature(data, 'not-so-secret', 1))
+
+    def test_compute_signature_configured_version(self):
+        self.useFixture(config.Config()).config(signature_version=2,
+                                                group='publisher')
+        data = {'a': 'A', 'b': 'B'}
+        self.assertEqual(utils.compute_signature(data, 'not-so-secret'),
+                         utils.compute_signature(data, 'not-so-secret', 2))
+
+    def test_verify_signature_v1(self):
+        data = {'a': 'A',
+                'b': 'B',
+                'nested': {'a': 'A'},
+                }
+        data['message_signature'] = utils.compute_signature(
+            data,
+            'not-so-secret',
+            1)
+        self.assertTrue(utils.verify_signature(data, 'not-so-secret'))
+
+    def test_verify_signature_v2_incorrect(self):
+        data = {'a': 'A', 'b': 'B'}
+        data['message_signature'] = utils.compute_signature(
+            {'a': 'A', 'b': 'C'},
+            'not-so-secret',
+            2)
+        self.assertFalse(utils.verify_signature(data, 'not-so-secret'))
+
+    def test_verify_signature_v2_msgpack(self):
+        data = {'a': u'\xe9t\xe9',
+                'b': 1.5,
+                'nested': {'c': ('c',),
+                           'd': [{'y': 'Y', 'x': 'X'}],
+                           },
+                }
+        data['message_signature'] = utils.compute_signature(
+            data,
+            'not-so-secret',
+            2)
+        packed = msgpack.loads(msgpack.dumps(data))
+        self.assertTrue(utils.verify_signature(packed, 'not-so-secret'))
+        jsondata = jsonutils.loads(jsonutils.dumps(data))
+        self.assertTrue(utils.verify_signature(jsondata, 'not-so-secret'))
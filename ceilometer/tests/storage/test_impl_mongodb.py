@@ -27,6 +27,7 @@
 import copy
 import datetime
 from mock import patch
+import pymongo
 
 from ceilometer.publisher import utils
 from ceilometer import sample
@@ -53,6 +54,14 @@ class MongoDBConnection(MongoDBEngineTestBase):
         conn = impl_mongodb.Connection(self.CONF)
         self.assertTrue(conn.conn)
 
+    def test_build_marker_query(self):
+        marker = {'k1': 'v1', 'k2': 'v2'}
+        ret = impl_mongodb.Connection._build_marker_query(marker,
+                                                          ['k1', 'k2'],
+                                                          '$gt')
+        self.assertEqual(ret, {'$or': [{'k1': {'$gt': 'v1'}},
+                                       {'k1': 'v1', 'k2': {'$gt': 'v2'}}]})
+
     def test_recurse_sort_keys(self):
         sort_keys = ['k1', 'k2', 'k3']
         marker = {'k1': 'v1', 'k2': 'v2', 'k3': 'v3'}
@@ -93,6 +102,78 @@ class MongoDBTestMarkerBase(test_storage_scenarios.DBTestBase,
             self.assertTrue(True)
 
 
+class ResourceAggregateTest(MongoDBEngineTestBase):
+    def setUp(self):
+        super(ResourceAggregateTest, self).setUp()
+        for i, (user, resource, hour) in enumerate([
+                ('user-1', 'resource-1', 10),
+                ('user-2', 'resource-1', 11),
+                ('user-2', 'resource-2', 12)]):
+            s = sample.Sample(
+                'instance',
+                sample.TYPE_GAUGE,
+                'instance',
+                1,
+                user,
+                'project-1',
+                resource,
+                timestamp=datetime.datetime(2013, 10, 18, hour),
+                resource_metadata={'n': i},
+                source='test',
+            )
+            self.conn.record_metering_data(utils.meter_message_from_counter(
+                s, self.CONF.publisher.metering_secret))
+
+    def test_get_resources_owner_of_first_sample(self):
+        resource = list(self.conn.get_resources(source='test',
+                                                resource='resource-1'))[0]
+        self.assertEqual(resource.user_id, 'user-1')
+        self.assertEqual(resource.metadata, {'n': 1})
+        self.assertEqual(resource.first_sample_timestamp,
+                         datetime.datetime(2013, 10, 18, 10))
+        self.assertEqual(resource.last_sample_timestamp,
+                         datetime.datetime(2013, 10, 18, 11))
+
+    def test_get_resources_unfiltered_owner_of_first_sample(self):
+        resource = list(self.conn.get_resources(resource='resource-1'))[0]
+        self.assertEqual(resource.user_id, 'user-1')
+        self.assertEqual(resource.metadata, {'n': 1})
+
+    def test_get_resources_without_sample_timestamps(self):
+        # Resources recorded before the upgrade are read from the samples
+        self.conn.db.resource.update(
+            {'_id': 'resource-2'},
+            {'$unset': {'first_sample_timestamp': 1,
+                        'last_sample_timestamp': 1}})
+        results = list(self.conn.get_resources())
+        self.assertEqual(sorted(r.resource_id for r in results),
+                         ['resource-1', 'resource-2'])
+
+    def test_aggregate_resources_sort_limit(self):
+        results = self.conn._aggregate_resources(
+            {}, sort_instructions=[('last_timestamp', pymongo.DESCENDING)],
+            limit=1)
+        self.assertEqual([r['_id'] for r in results], ['resource-2'])
+
+    def test_aggregate_resources_without_cursor(self):
+        self.conn.server_version = [2, 4]
+        results = self.conn._aggregate_resources(
+            {}, sort_instructions=[('last_timestamp', pymongo.DESCENDING)])
+        self.assertEqual([r['_id'] for r in results],
+                         ['resource-2', 'resource-1'])
+
+    def test_aggregate_resources_extra_stages(self):
+        results = self.conn._aggregate_resources(
+            {}, [{'$match': {'user_id': 'user-1'}}])
+        self.assertEqual([r['_id'] for r in results], ['resource-1'])
+
+    def test_get_resources_paginate_marker(self):
+        pagination = base.Pagination(primary_sort_dir='asc',
+                                     marker_value='resource-1')
+        results = list(self.conn.get_resources(pagination=pagination))
+        self.assertEqual([r.resource_id for r in results], ['resource-2'])
+
+
 class IndexTest(MongoDBEngineTestBase):
     def test_meter_ttl_index_absent(self):
         # create a fake index and check it is deleted
@@ -291,3 +372,13 @@ class AlarmTestPagination(test_storage_scenarios.AlarmTestBase,
                              'counter-name-foo')
         except base.MultipleResultsFound:
             self.assertTrue(True)
+
+
+class MapReduceStatisticsTest(test_storage_scenarios.StatisticsTest,
+                              MongoDBEngineTestBase):
+    # Run the statistics tests as if against a MongoDB server too old
+    # to compute periods with the aggregation framework.
+
+    def setUp(self):
+        super(MapReduceStatisticsTest, self).setUp()
+        self.conn.server_version = [2, 4]
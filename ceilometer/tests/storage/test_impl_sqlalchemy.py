@@ -25,11 +25,16 @@
 
 import datetime
 import repr
+import types
 
 from mock import patch
 
 import ceilometer.openstack.common.db.sqlalchemy.session as sqlalchemy_session
+from ceilometer.openstack.common.fixture import mockpatch
 from ceilometer.openstack.common import timeutils
+from ceilometer.publisher import utils
+from ceilometer import sample
+from ceilometer import storage
 from ceilometer.storage import models
 from ceilometer.storage.sqlalchemy import models as sql_models
 from ceilometer.tests import db as tests_db
@@ -216,3 +221,183 @@ class RelationshipTest(scenarios.DBTestBase):
                 session.query(sql_models.User.id)
                     .group_by(sql_models.User.id)
                     )).count(), 0)
+
+
+class StatisticsPeriodFallbackTest(scenarios.StatisticsTest):
+    # Run the statistics by period tests against the one query per
+    # period code path used for dialects we can't GROUP BY period on.
+    database_connection = 'sqlite://'
+
+    def setUp(self):
+        super(StatisticsPeriodFallbackTest, self).setUp()
+        self.useFixture(mockpatch.PatchObject(self.conn, '_period_bucket',
+                                              return_value=None))
+
+
+class StatisticsRollupTest(scenarios.StatisticsTest):
+    # Run the statistics tests with the rollups enabled, so the
+    # statistics by period over aligned time ranges are computed from them.
+    database_connection = 'sqlite://'
+
+    def prepare_data(self):
+        self.CONF.set_override('rollups', True, group='database')
+        self.conn.upgrade()
+        super(StatisticsRollupTest, self).prepare_data()
+
+    def test_rollups_are_used(self):
+        f = storage.SampleFilter(
+            meter='volume.size',
+            start='2012-09-25T10:28:00',
+        )
+        with patch.object(self.conn, '_period_bucket') as bucket:
+            results = list(self.conn.get_meter_statistics(f, period=7200))
+        self.assertFalse(bucket.called)
+        self.assertEqual(len(results), 2)
+        self.assertEqual([r.count for r in results], [4, 2])
+        self.assertEqual([r.sum for r in results], [28, 17])
+
+    def test_rollups_not_used_when_unaligned(self):
+        f = storage.SampleFilter(
+            meter='volume.size',
+            start='2012-09-25T10:28:30',
+        )
+        with patch.object(self.conn, '_get_rollup_statistics') as rollup:
+            list(self.conn.get_meter_statistics(f, period=7200))
+        self.assertFalse(rollup.called)
+
+    def test_rollups_not_used_for_message_id(self):
+        f = storage.SampleFilter(
+            meter='volume.size',
+            start='2012-09-25T10:28:00',
+        )
+        f.message_id = 'msg'
+        with patch.object(self.conn, '_get_rollup_statistics') as rollup:
+            list(self.conn.get_meter_statistics(f, period=7200))
+        self.assertFalse(rollup.called)
+
+    def test_rollups_not_used_when_incomplete(self):
+        session = sqlalchemy_session.get_session()
+        session.query(sql_models.MeterRollupState).delete()
+        f = storage.SampleFilter(
+            meter='volume.size',
+            start='2012-09-25T10:28:00',
+        )
+        with patch.object(self.conn, '_get_rollup_statistics') as rollup:
+            results = list(self.conn.get_meter_statistics(f, period=7200))
+        self.assertFalse(rollup.called)
+        self.assertEqual([r.count for r in results], [4, 2])
+
+    def _record_volume_sample(self):
+        msg = utils.meter_message_from_counter(
+            sample.Sample(
+                'volume.size',
+                'gauge',
+                'GiB',
+                10,
+                'user-id',
+                'project1',
+                'resource-id',
+                timestamp=datetime.datetime(2012, 9, 25, 10, 40),
+                resource_metadata={},
+                source='test',
+            ),
+            self.CONF.publisher.metering_secret,
+        )
+        self.conn.record_metering_data(msg)
+
+    def test_record_metering_data_adds_to_rollups(self):
+        f = storage.SampleFilter(
+            meter='volume.size',
+            resource='resource-id',
+            start='2012-09-25T10:00:00',
+            end='2012-09-25T11:00:00',
+        )
+        self._record_volume_sample()
+        session = sqlalchemy_session.get_session()
+        rollups = session.query(sql_models.MeterRollup).filter_by(
+            granularity=3600, resource_id='resource-id',
+            bucket_start=datetime.datetime(2012, 9, 25, 10)).all()
+        self.assertEqual([(r.count, r.sum, r.max) for r in rollups],
+                         [(2, 15, 10)])
+        results = list(self.conn.get_meter_statistics(f, period=3600))
+        self.assertEqual([(r.count, r.sum) for r in results], [(2, 15)])
+
+    def test_record_without_rollups_invalidates_them(self):
+        self.CONF.set_override('rollups', False, group='database')
+        self._record_volume_sample()
+        self.assertFalse(self.conn._rollups_complete())
+        self.CONF.set_override('rollups', True, group='database')
+        self.conn.upgrade()
+        self.assertTrue(self.conn._rollups_complete())
+        session = sqlalchemy_session.get_session()
+        rollups = session.query(sql_models.MeterRollup).filter_by(
+            granularity=3600, resource_id='resource-id',
+            bucket_start=datetime.datetime(2012, 9, 25, 10)).all()
+        self.assertEqual([(r.count, r.sum) for r in rollups], [(2, 15)])
+
+    def test_upgrade_builds_rollups(self):
+        session = sqlalchemy_session.get_session()
+        session.query(sql_models.MeterRollupState).delete()
+        session.query(sql_models.MeterRollup).delete()
+        self.conn.upgrade()
+        rollups = session.query(sql_models.MeterRollup).filter_by(
+            granularity=3600, resource_id='resource-id').order_by(
+                sql_models.MeterRollup.bucket_start).all()
+        self.assertEqual([(r.bucket_start, r.count, r.sum) for r in rollups],
+                         [(datetime.datetime(2012, 9, 25, 10), 1, 5),
+                          (datetime.datetime(2012, 9, 25, 11), 1, 6),
+                          (datetime.datetime(2012, 9, 25, 12), 1, 7)])
+
+
+class StatisticsGroupByRollupTest(scenarios.StatisticsGroupByTest):
+    database_connection = 'sqlite://'
+
+    def prepare_data(self):
+        self.CONF.set_override('rollups', True, group='database')
+        self.conn.upgrade()
+        super(StatisticsGroupByRollupTest, self).prepare_data()
+
+
+class GetSamplesTest(scenarios.DBTestBase):
+    database_connection = 'sqlite://'
+
+    def test_get_samples_limit_latest(self):
+        f = storage.SampleFilter()
+        results = list(self.conn.get_samples(f, limit=2))
+        self.assertEqual([r.timestamp for r in results],
+                         [datetime.datetime(2013, 5, 31, 23, 7),
+                          datetime.datetime(2012, 12, 1, 1, 25)])
+
+    def test_get_samples_is_a_stream(self):
+        f = storage.SampleFilter(source='test-2')
+        results = self.conn.get_samples(f)
+        self.assertIsInstance(results, types.GeneratorType)
+        self.assertEqual([r.source for r in results], ['test-2'])
+
+
+class RecordBatchTest(tests_db.TestBase):
+    database_connection = 'sqlite://'
+
+    def test_bad_sample_does_not_discard_batch(self):
+        msgs = []
+        for i in range(3):
+            msgs.append(utils.meter_message_from_counter(
+                sample.Sample(
+                    'instance',
+                    sample.TYPE_GAUGE,
+                    'instance',
+                    1,
+                    'user-id',
+                    'project-id',
+                    'resource-%d' % i,
+                    timestamp=datetime.datetime(2012, 7, 2, 10, 40),
+                    resource_metadata={},
+                    source='test',
+                ),
+                self.CONF.publisher.metering_secret,
+            ))
+        del msgs[1]['resource_metadata']
+        self.conn.record_metering_data_batch(msgs)
+        results = self.conn.get_samples(storage.SampleFilter())
+        self.assertEqual(sorted(r.resource_id for r in results),
+                         ['resource-0', 'resource-2'])
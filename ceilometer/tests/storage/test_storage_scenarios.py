@@ -392,6 +392,21 @@ class ResourceTestOrdering(DBTestBase,
         self.assertEqual(resource.resource_id, 'resource-id-2')
         self.assertEqual(resource.metadata['tag'], 'sample-8')
 
+    def test_get_resources_sample_timestamps(self):
+        resources = dict((r.resource_id, r)
+                         for r in self.conn.get_resources())
+        expected = {
+            'resource-id-1': ((2013, 8, 10, 10, 42), (2013, 8, 10, 10, 49)),
+            'resource-id-2': ((2013, 8, 10, 10, 42), (2013, 8, 10, 10, 48)),
+            'resource-id-3': ((2013, 8, 10, 10, 43), (2013, 8, 10, 10, 50)),
+        }
+        for resource_id, (first, last) in expected.iteritems():
+            resource = resources[resource_id]
+            self.assertEqual(resource.first_sample_timestamp,
+                             datetime.datetime(*first))
+            self.assertEqual(resource.last_sample_timestamp,
+                             datetime.datetime(*last))
+
 
 class MeterTest(DBTestBase,
                 tests_db.MixinTestsWithBackendScenarios):
@@ -642,6 +657,25 @@ class RawSampleTest(DBTestBase,
         results = list(self.conn.get_resources())
         self.assertEqual(len(results), 5)
 
+    def test_clear_metering_data_first_sample_timestamp(self):
+        # NOTE(jd) Override this test in MongoDB because our code doesn't clear
+        # the collections, this is handled by MongoDB TTL feature.
+        if self.CONF.database.connection.startswith('mongodb://'):
+            return
+
+        self.create_and_store_sample(
+            timestamp=datetime.datetime(2012, 7, 2, 10, 30),
+            user_id='user-id-2',
+            project_id='project-id-2',
+            resource_id='resource-id-2',
+            source='test')
+        timeutils.utcnow.override_time = datetime.datetime(2012, 7, 2, 10, 45)
+        self.conn.clear_expired_metering_data(3 * 60)
+        resource = list(self.conn.get_resources(resource='resource-id-2'))[0]
+        self.assertEqual(resource.first_sample_timestamp,
+                         datetime.datetime(2012, 7, 2, 10, 42))
+        self.assertEqual(resource.metadata['tag'], 'counter-2')
+
     def test_clear_metering_data_no_data_to_remove(self):
         # NOTE(jd) Override this test in MongoDB because our code doesn't clear
         # the collections, this is handled by MongoDB TTL feature.
@@ -1897,6 +1931,52 @@ class CounterDataTypeTest(DBTestBase,
         self.assertEqual(results[0].counter_volume, 1938495037.53697)
 
 
+class RecordBatchTest(DBTestBase,
+                      tests_db.MixinTestsWithBackendScenarios):
+
+    def prepare_data(self):
+        self.msgs = []
+        for i, (resource_id, source) in enumerate([('resource-a', 'test-1'),
+                                                   ('resource-b', 'test-1'),
+                                                   ('resource-a', 'test-2')]):
+            s = sample.Sample(
+                'instance', sample.TYPE_GAUGE, unit='', volume=i,
+                user_id='user-id', project_id='project-id',
+                resource_id=resource_id,
+                timestamp=datetime.datetime(2012, 7, 2, 10, 40 + i),
+                resource_metadata={'display_name': 'test-server',
+                                   'tag': 'batch-%d' % i},
+                source=source)
+            self.msgs.append(utils.meter_message_from_counter(
+                s, self.CONF.publisher.metering_secret))
+        self.conn.record_metering_data_batch(self.msgs)
+
+    def test_get_samples(self):
+        results = list(self.conn.get_samples(
+            storage.SampleFilter(meter='instance')))
+        self.assertEqual(len(results), 3)
+        self.assertEqual([r.counter_volume for r in results], [2, 1, 0])
+
+    def test_get_users_and_projects(self):
+        self.assertEqual(list(self.conn.get_users()), ['user-id'])
+        self.assertEqual(list(self.conn.get_projects()), ['project-id'])
+        self.assertEqual(list(self.conn.get_users(source='test-2')),
+                         ['user-id'])
+
+    def test_get_samples_by_metaquery(self):
+        q = {'metadata.tag': 'batch-1'}
+        results = list(self.conn.get_samples(
+            storage.SampleFilter(meter='instance', metaquery=q)))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].resource_id, 'resource-b')
+
+    def test_get_resources_most_recent_metadata(self):
+        resources = dict((r.resource_id, r)
+                         for r in self.conn.get_resources())
+        self.assertEqual(sorted(resources), ['resource-a', 'resource-b'])
+        self.assertEqual(resources['resource-a'].metadata['tag'], 'batch-2')
+
+
 class AlarmTestBase(DBTestBase):
     def add_some_alarms(self):
         alarms = [models.Alarm(alarm_id='r3d',
@@ -0,0 +1,156 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/archive.py
+"""
+import datetime
+import glob
+import os
+import tempfile
+
+import eventlet
+import mock
+
+from ceilometer import archive
+from ceilometer.openstack.common import test
+
+
+class TestArchive(test.BaseTestCase):
+
+    RECORDS = [{'counter_name': 'test',
+                'counter_volume': 1,
+                'resource_metadata': {'name': u'\xe9t\xe9'}},
+               {'counter_name': 'test2',
+                'counter_volume': 2.5,
+                'resource_metadata': {}}]
+
+    def setUp(self):
+        super(TestArchive, self).setUp()
+        self.path = os.path.join(tempfile.mkdtemp(), 'archive')
+
+    def _write(self, format, **kwargs):
+        writer = archive.ArchiveWriter(self.path, format, **kwargs)
+        writer.write(self.RECORDS)
+        writer.close()
+        return writer
+
+    def test_json(self):
+        self._write('json')
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(list(archive.read_archive(self.path)),
+                         self.RECORDS)
+
+    def test_msgpack(self):
+        self._write('msgpack')
+        records = list(archive.read_archive(self.path))
+        self.assertEqual(records[1], self.RECORDS[1])
+        self.assertEqual(records[0]['resource_metadata']['name'],
+                         u'\xe9t\xe9'.encode('utf-8'))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, archive.ArchiveWriter,
+                          self.path, 'xml')
+
+    def test_datetime(self):
+        writer = archive.ArchiveWriter(self.path, 'json')
+        writer.write([{'timestamp': datetime.datetime(2013, 10, 18, 12)}])
+        writer.close()
+        self.assertEqual(list(archive.read_archive(self.path)),
+                         [{'timestamp': '2013-10-18T12:00:00'}])
+
+    def test_append(self):
+        self._write('msgpack')
+        self._write('msgpack')
+        self.assertEqual(len(list(archive.read_archive(self.path))), 4)
+
+    def test_truncated(self):
+        for format in archive.FORMATS:
+            self._write(format)
+            with open(self.path, 'r+b') as f:
+                f.truncate(os.path.getsize(self.path) - 2)
+            self.assertEqual([r['counter_name']
+                              for r in archive.read_archive(self.path)],
+                             ['test'])
+            os.remove(self.path)
+
+    def test_buffered(self):
+        writer = archive.ArchiveWriter(self.path, 'json', flush_interval=60)
+        writer.write(self.RECORDS)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        writer.close()
+        self.assertTrue(os.path.getsize(self.path) > 0)
+
+    def test_flush_on_timer(self):
+        writer = archive.ArchiveWriter(self.path, 'json', flush_interval=0.01)
+        self.addCleanup(writer.close)
+        writer.write(self.RECORDS)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        eventlet.sleep(0.05)
+        self.assertEqual(list(archive.read_archive(self.path)),
+                         self.RECORDS)
+
+    def test_rotate_on_size(self):
+        writer = archive.ArchiveWriter(self.path, 'json', max_bytes=10,
+                                       backup_count=2)
+        for i in range(3):
+            writer.write(self.RECORDS)
+        writer.close()
+        rotated = sorted(glob.glob(self.path + '.*'))
+        self.assertEqual(len(rotated), 2)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(list(archive.read_archive(rotated[-1])),
+                         self.RECORDS)
+
+    def test_rotate_on_age(self):
+        writer = archive.ArchiveWriter(self.path, 'json', max_age=60)
+        writer.write(self.RECORDS)
+        self.assertEqual(glob.glob(self.path + '.*'), [])
+        writer.opened_at -= 60
+        writer.write(self.RECORDS)
+        writer.close()
+        rotated = glob.glob(self.path + '.*')
+        self.assertEqual(len(rotated), 1)
+        self.assertEqual(len(list(archive.read_archive(rotated[0]))), 4)
+
+    def test_rotate_on_age_when_idle(self):
+        writer = archive.ArchiveWriter(self.path, 'json', max_age=60)
+        writer.write(self.RECORDS)
+        writer.opened_at -= 60
+        writer.check()
+        writer.close()
+        rotated = glob.glob(self.path + '.*')
+        self.assertEqual(len(rotated), 1)
+        self.assertEqual(list(archive.read_archive(rotated[0])),
+                         self.RECORDS)
+
+    def test_rotate_compress(self):
+        writer = archive.ArchiveWriter(self.path, 'msgpack', max_bytes=10,
+                                       compress=True)
+        writer.write(self.RECORDS)
+        writer.close()
+        rotated = glob.glob(self.path + '.*')
+        self.assertEqual(len(rotated), 1)
+        self.assertTrue(rotated[0].endswith('.gz'))
+        self.assertEqual(len(list(archive.read_archive(rotated[0]))), 2)
+
+    def test_replay_archive(self):
+        self._write('json')
+        manager = mock.Mock()
+        count = archive.replay_archive(self.path, manager, batch_size=1)
+        self.assertEqual(count, 2)
+        self.assertEqual(manager.map_method.call_args_list,
+                         [mock.call('record_metering_data',
+                                    data=[self.RECORDS[0]]),
+                          mock.call('record_metering_data',
+                                    data=[self.RECORDS[1]])])
@@ -17,6 +17,7 @@
 # under the License.
 import socket
 
+import eventlet
 import mock
 from mock import patch
 import msgpack
@@ -25,6 +26,7 @@ from stevedore.tests import manager as test_manager
 
 from ceilometer import collector
 from ceilometer.openstack.common.fixture import config
+from ceilometer.openstack.common.fixture import mockpatch
 from ceilometer import sample
 from ceilometer.tests import base as tests_base
 
@@ -40,6 +42,11 @@ class TestCollector(tests_base.BaseTestCase):
         self.CONF = self.useFixture(config.Config()).conf
         self.CONF.set_override("connection", "log://", group='database')
         self.srv = collector.CollectorService('the-host', 'the-topic')
+        # Never let a started service block the tests in a real recvfrom,
+        # and don't leave its greenthreads behind
+        self.useFixture(mockpatch.Patch(
+            'socket.socket', return_value=self._make_stopping_socket()))
+        self.addCleanup(self.srv.stop)
         self.counter = sample.Sample(
             name='foobar',
             type='bad',
@@ -62,6 +69,15 @@ class TestCollector(tests_base.BaseTestCase):
         sock.recvfrom = recvfrom
         return sock
 
+    def _make_stopping_socket(self):
+        def recvfrom(size):
+            self.srv.udp_run = False
+            return (msgpack.dumps(self.counter), ('127.0.0.1', 12345))
+
+        sock = mock.Mock()
+        sock.recvfrom = recvfrom
+        return sock
+
     def _verify_udp_socket(self, udp_socket):
         conf = self.CONF.collector
         udp_socket.setsockopt.assert_called_once_with(socket.SOL_SOCKET,
@@ -84,6 +100,29 @@ class TestCollector(tests_base.BaseTestCase):
         mock_dispatcher.record_metering_data.assert_called_once_with(
             data=self.counter)
 
+    def test_record_metering_data_buffered(self):
+        mock_dispatcher = mock.MagicMock()
+        self.srv.dispatcher_manager = test_manager.TestExtensionManager(
+            [extension.Extension('test',
+                                 None,
+                                 None,
+                                 mock_dispatcher
+                                 ),
+             ])
+        self.srv.sample_buffer = collector.SampleBuffer(
+            self.srv.dispatcher_manager, 10, 0.01, 100)
+
+        self.srv.record_metering_data(None, [self.counter, self.counter])
+        self.srv.record_metering_data(None, self.counter)
+
+        self.assertEqual(self.srv.sample_buffer.depth, 3)
+        self.assertFalse(mock_dispatcher.record_metering_data.called)
+        self.srv.stop()
+        mock_dispatcher.record_metering_data.assert_called_once_with(
+            data=[self.counter] * 3)
+        self.assertEqual(self.srv.sample_buffer.depth, 0)
+        mock_dispatcher.close.assert_called_once_with()
+
     def test_udp_receive(self):
         mock_dispatcher = mock.MagicMock()
         self.srv.dispatcher_manager = test_manager.TestExtensionManager(
@@ -134,6 +173,24 @@ class TestCollector(tests_base.BaseTestCase):
         mock_dispatcher.record_metering_data.assert_called_once_with(
             self.counter)
 
+    def test_udp_receive_batch(self):
+        mock_dispatcher = mock.MagicMock()
+        self.srv.dispatcher_manager = test_manager.TestExtensionManager(
+            [extension.Extension('test',
+                                 None,
+                                 None,
+                                 mock_dispatcher
+                                 ),
+             ])
+        self.counter = [self.counter, self.counter]
+
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            self.srv.start_udp()
+
+        mock_dispatcher.record_metering_data.assert_called_once_with(
+            self.counter)
+
     @staticmethod
     def _raise_error():
         raise Exception
@@ -146,6 +203,92 @@ class TestCollector(tests_base.BaseTestCase):
 
         self._verify_udp_socket(udp_socket)
 
+    def test_udp_receive_bad_decoding_stats(self):
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            with patch('msgpack.loads', self._raise_error):
+                self.srv.start_udp()
+
+        self.assertEqual(self.srv.udp_stats, {'received': 1,
+                                              'decoded': 0,
+                                              'queued': 0,
+                                              'dropped': 1})
+
+    def test_udp_receive_queued(self):
+        mock_dispatcher = mock.MagicMock()
+        self.srv.dispatcher_manager = test_manager.TestExtensionManager(
+            [extension.Extension('test', None, None, mock_dispatcher)])
+        self.srv.udp_buffer = collector.SampleBuffer(
+            self.srv.dispatcher_manager, 1, 0.01, 100)
+
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            self.srv.start_udp()
+
+        self.assertEqual(self.srv.udp_buffer.depth, 1)
+        self.assertFalse(mock_dispatcher.record_metering_data.called)
+        self.assertEqual(self.srv.udp_stats, {'received': 1,
+                                              'decoded': 1,
+                                              'queued': 1,
+                                              'dropped': 0})
+
+    def test_udp_receive_queue_full(self):
+        self.srv.udp_buffer = collector.SampleBuffer(
+            mock.Mock(), 1, 0.01, 1)
+        self.srv.udp_buffer.add({'n': 1})
+        # Our fake socket stops the service, keep the queue full
+        self.srv.udp_buffer.stop = mock.Mock()
+
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            self.srv.start_udp()
+
+        self.assertEqual(self.srv.udp_buffer.depth, 1)
+        self.assertEqual(self.srv.udp_stats, {'received': 1,
+                                              'decoded': 1,
+                                              'queued': 0,
+                                              'dropped': 1})
+
+    def test_udp_stats_logged_on_stop(self):
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            self.srv.start_udp()
+
+        with patch.object(collector.LOG, 'info') as info:
+            self.srv.stop()
+        self.assertEqual(info.call_args[0][1], self.srv.udp_stats)
+
+    def test_udp_socket_workers(self):
+        self.CONF.set_override('workers', 4, group='collector')
+        self.CONF.set_override('udp_rcvbuf', 4194304, group='collector')
+        udp_socket = self._make_fake_socket()
+        with patch('socket.socket', return_value=udp_socket):
+            self.srv.start_udp()
+
+        self.assertEqual(udp_socket.setsockopt.call_args_list, [
+            mock.call(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1),
+            mock.call(socket.SOL_SOCKET, collector.SO_REUSEPORT, 1),
+            mock.call(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304),
+        ])
+
+    @patch('ceilometer.openstack.common.service.launch')
+    @patch('ceilometer.service.prepare_service')
+    def test_collector_workers(self, prepare_service, launch):
+        self.CONF.set_override('workers', 4, group='collector')
+        collector.collector()
+        service, = launch.call_args[0]
+        self.assertIsInstance(service, collector.CollectorService)
+        self.assertEqual(launch.call_args[1], {'workers': 4})
+
+    def test_udp_buffer_started(self):
+        self.CONF.set_override('rpc_backend', '')
+        with patch.object(self.srv.tg, 'add_thread') as add_thread:
+            self.srv.start()
+        self.assertIsNone(self.srv.sample_buffer)
+        self.assertEqual(self.srv.udp_buffer.batch_size, 1)
+        add_thread.assert_any_call(self.srv.udp_buffer.run)
+        add_thread.assert_any_call(self.srv.start_udp)
+
     @patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
     @patch('ceilometer.event.converter.setup_events', mock.MagicMock())
     def test_init_host(self):
@@ -178,3 +321,72 @@ class TestCollector(tests_base.BaseTestCase):
         self.srv.initialize_service_hook(mock.MagicMock())
         mock_worker.assert_called_once_with('mytopic', mock_dispatcher(),
                                             'ceilometer.collector.mytopic')
+
+
+class TestSampleBuffer(tests_base.BaseTestCase):
+    def setUp(self):
+        super(TestSampleBuffer, self).setUp()
+        self.mock_dispatcher = mock.MagicMock()
+        self.buffer = collector.SampleBuffer(
+            test_manager.TestExtensionManager(
+                [extension.Extension('test', None, None,
+                                     self.mock_dispatcher)]),
+            batch_size=2, batch_timeout=0.01, queue_size=3)
+
+    def test_flush_on_size(self):
+        self.buffer.add([{'n': 1}, {'n': 2}, {'n': 3}])
+        self.assertEqual(self.buffer._gather(), [{'n': 1}, {'n': 2}])
+        self.assertEqual(self.buffer.depth, 1)
+
+    def test_flush_on_timeout(self):
+        self.buffer.add({'n': 1})
+        self.assertEqual(self.buffer._gather(), [{'n': 1}])
+        self.assertEqual(self.buffer._gather(), [])
+
+    def test_flush_stats(self):
+        self.buffer.flush([{'n': 1}, {'n': 2}])
+        self.mock_dispatcher.record_metering_data.assert_called_once_with(
+            data=[{'n': 1}, {'n': 2}])
+        self.assertEqual(self.buffer.stats['samples'], 2)
+        self.assertEqual(self.buffer.stats['batches'], 1)
+
+    def test_flush_dispatcher_error(self):
+        self.mock_dispatcher.record_metering_data.side_effect = Exception
+        self.buffer.flush([{'n': 1}])
+        self.assertEqual(self.buffer.stats['batches'], 1)
+
+    def test_add_blocks_when_full(self):
+        self.buffer.add([{'n': 1}, {'n': 2}, {'n': 3}])
+        producer = eventlet.spawn(self.buffer.add, {'n': 4})
+        eventlet.sleep(0)
+        self.assertEqual(self.buffer.depth, 3)
+        self.assertEqual(self.buffer.stats['throttled'], 1)
+        self.assertEqual(self.buffer._gather(), [{'n': 1}, {'n': 2}])
+        producer.wait()
+        self.assertEqual(self.buffer.depth, 2)
+
+    def test_stop_drains_queue(self):
+        self.buffer.add([{'n': 1}, {'n': 2}, {'n': 3}])
+        self.buffer.stop()
+        self.assertEqual(self.buffer.depth, 0)
+        self.assertEqual(self.buffer.stats['samples'], 3)
+        self.assertEqual(self.buffer.stats['batches'], 2)
+
+    def test_stop_flushes_gathered_batch(self):
+        runner = eventlet.spawn(self.buffer.run)
+        self.buffer.add({'n': 1})
+        # run() now waits for a second sample to complete its batch
+        eventlet.sleep(0)
+        self.assertEqual(self.buffer.depth, 0)
+        self.buffer.stop()
+        self.mock_dispatcher.record_metering_data.assert_called_once_with(
+            data=[{'n': 1}])
+        self.assertTrue(runner.dead)
+
+    def test_add_without_blocking(self):
+        self.buffer.add([{'n': 1}, {'n': 2}])
+        self.assertRaises(collector.queue.Full,
+                          self.buffer.add, [{'n': 3}, {'n': 4}], block=False)
+        self.assertEqual(self.buffer.depth, 2)
+        self.buffer.add({'n': 3}, block=False)
+        self.assertEqual(self.buffer.depth, 3)
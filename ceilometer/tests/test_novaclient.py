@@ -22,6 +22,7 @@ from mock import patch
 import novaclient
 
 from ceilometer import nova_client
+from ceilometer.openstack.common.fixture import config
 from ceilometer.openstack.common.fixture import mockpatch
 from ceilometer.openstack.common import test
 
@@ -30,6 +31,7 @@ class TestNovaClient(test.BaseTestCase):
 
     def setUp(self):
         super(TestNovaClient, self).setUp()
+        self.CONF = self.useFixture(config.Config()).conf
         self.nv = nova_client.Client()
         self.useFixture(mockpatch.PatchObject(
             self.nv.nova_client.flavors, 'get',
@@ -212,3 +214,32 @@ class TestNovaClient(test.BaseTestCase):
         self.assertIsNone(instance.kernel_id)
         self.assertIsNone(instance.image)
         self.assertIsNone(instance.ramdisk_id)
+
+    def test_flavor_and_image_cached(self):
+        self.nv._with_flavor_and_image(self.fake_servers_list())
+        self.nv._with_flavor_and_image(self.fake_servers_list_unknown_image())
+        results = self.nv._with_flavor_and_image(
+            self.fake_servers_list_unknown_image())
+        self.assertEqual(results[0].image['name'], 'unknown-id-666')
+        self.assertEqual(results[0].flavor['name'], 'm1.tiny')
+        self.assertEqual(self.nv.nova_client.flavors.get.call_count, 1)
+        self.assertEqual(self.nv.nova_client.images.get.call_count, 2)
+
+    def test_flavor_and_image_cache_expiry(self):
+        with patch('time.time', return_value=1000):
+            self.nv._with_flavor_and_image(self.fake_servers_list())
+        with patch('time.time', return_value=1599):
+            self.nv._with_flavor_and_image(self.fake_servers_list())
+        self.assertEqual(self.nv.nova_client.flavors.get.call_count, 1)
+        with patch('time.time', return_value=1600):
+            results = self.nv._with_flavor_and_image(self.fake_servers_list())
+        self.assertEqual(self.nv.nova_client.flavors.get.call_count, 2)
+        self.assertEqual(self.nv.nova_client.images.get.call_count, 2)
+        self.assertEqual(results[0].flavor['name'], 'm1.tiny')
+
+    def test_flavor_and_image_not_cached(self):
+        self.CONF.set_override('nova_cache_ttl', 0)
+        self.nv._with_flavor_and_image(self.fake_servers_list())
+        self.nv._with_flavor_and_image(self.fake_servers_list())
+        self.assertEqual(self.nv.nova_client.flavors.get.call_count, 2)
+        self.assertEqual(self.nv.nova_client.images.get.call_count, 2)
@@ -19,6 +19,7 @@
 
 import datetime
 
+import mock
 from stevedore import extension
 
 from ceilometer.openstack.common.fixture import mockpatch
@@ -388,6 +389,40 @@ class TestPipeline(test.BaseTestCase):
         self.assertTrue(pipeline_manager.pipelines[0].
                         support_meter('instance'))
 
+    def test_wildcard_characters_counters(self):
+        counter_cfg = ['disk.?rite.*', 'network.[io]*', 'cpu']
+        self.pipeline_cfg[0]['counters'] = counter_cfg
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        pipe = pipeline_manager.pipelines[0]
+        self.assertTrue(pipe.support_meter('disk.write.bytes'))
+        self.assertFalse(pipe.support_meter('disk.read.bytes'))
+        self.assertTrue(pipe.support_meter('network.incoming.bytes'))
+        self.assertTrue(pipe.support_meter('network.outgoing.bytes'))
+        self.assertFalse(pipe.support_meter('network.x'))
+        self.assertTrue(pipe.support_meter('cpu'))
+        self.assertFalse(pipe.support_meter('cpu_util'))
+
+    def test_support_meter_variable(self):
+        self.pipeline_cfg[0]['counters'] = ['instance:*']
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        pipe = pipeline_manager.pipelines[0]
+        self.assertTrue(pipe.support_meter('instance:m1.tiny'))
+        self.assertFalse(pipe.support_meter('instance'))
+
+    def test_support_meter_cached(self):
+        self.pipeline_cfg[0]['counters'] = ['*', '!disk.*']
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        pipe = pipeline_manager.pipelines[0]
+        self.assertFalse(pipe.support_meter('disk.read.bytes'))
+        self.assertTrue(pipe.support_meter('cpu'))
+        match = self.useFixture(mockpatch.PatchObject(pipe, '_match')).mock
+        self.assertFalse(pipe.support_meter('disk.read.bytes'))
+        self.assertTrue(pipe.support_meter('cpu'))
+        self.assertFalse(match.called)
+
     def test_multiple_pipeline(self):
         self.pipeline_cfg.append({
             'name': 'second_pipeline',
@@ -440,6 +475,52 @@ class TestPipeline(test.BaseTestCase):
         self.assertTrue(getattr(self.TransformerClass.samples[1], "name")
                         == 'b')
 
+    def test_multiple_pipeline_routing(self):
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['b'],
+            'transformers': [],
+            'publishers': ['new'],
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        first, second = pipeline_manager.pipelines
+        samples = [self.test_counter,
+                   sample.Sample(
+                       name='b',
+                       type=self.test_counter.type,
+                       volume=self.test_counter.volume,
+                       unit=self.test_counter.unit,
+                       user_id=self.test_counter.user_id,
+                       project_id=self.test_counter.project_id,
+                       resource_id=self.test_counter.resource_id,
+                       timestamp=self.test_counter.timestamp,
+                       resource_metadata=self.test_counter.resource_metadata,
+                   ),
+                   self.test_counter]
+
+        with pipeline_manager.publisher(None) as p:
+            p(samples)
+        self.assertEqual(pipeline_manager.routes.get('a'), [first])
+        self.assertEqual(pipeline_manager.routes.get('b'), [second])
+
+        # The routes are reused by the following publishers
+        self.useFixture(mockpatch.PatchObject(first, 'support_meter'))
+        self.useFixture(mockpatch.PatchObject(second, 'support_meter'))
+        with pipeline_manager.publisher(None) as p:
+            p(samples)
+        self.assertFalse(first.support_meter.called)
+        self.assertFalse(second.support_meter.called)
+
+        publisher = first.publishers[0]
+        self.assertEqual(publisher.calls, 2)
+        self.assertEqual([s.name for s in publisher.samples],
+                         ['a_update'] * 4)
+        new_publisher = second.publishers[0]
+        self.assertEqual(new_publisher.calls, 2)
+        self.assertEqual([s.name for s in new_publisher.samples], ['b'] * 2)
+
     def test_multiple_pipeline_exception(self):
         self.pipeline_cfg.append({
             'name': "second_pipeline",
@@ -602,6 +683,65 @@ class TestPipeline(test.BaseTestCase):
         self.assertTrue(getattr(self.TransformerClassDrop.samples[0], 'name')
                         == 'a_update')
 
+    def test_counters(self):
+        self.pipeline_cfg[0]['transformers'] = [
+            {'name': 'update', 'parameters': {}},
+            {'name': 'drop', 'parameters': {}},
+        ]
+        self.pipeline_cfg.append({
+            'name': 'second_pipeline',
+            'interval': 5,
+            'counters': ['a'],
+            'transformers': [],
+            'publishers': ['test://', 'except://'],
+        })
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        with pipeline_manager.publisher(None) as p:
+            p([self.test_counter, self.test_counter])
+
+        self.assertEqual(pipeline_manager.get_counters(), [
+            {'name': 'test_pipeline',
+             'counters': {'in': 2, 'dropped': 2},
+             'transformers': [
+                 {'name': 'update', 'counters': {'in': 2, 'out': 2}},
+                 {'name': 'drop', 'counters': {'in': 2, 'dropped': 2}},
+             ]},
+            {'name': 'second_pipeline',
+             'counters': {'in': 2, 'out': 2, 'errors': 2},
+             'transformers': []},
+        ])
+
+    def test_counters_transformer_error(self):
+        self.pipeline_cfg[0]['transformers'] = [
+            {'name': 'update', 'parameters': {}},
+            {'name': 'except', 'parameters': {}},
+        ]
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        with pipeline_manager.publisher(None) as p:
+            p([self.test_counter])
+
+        self.assertEqual(pipeline_manager.get_counters(), [
+            {'name': 'test_pipeline',
+             'counters': {'in': 1},
+             'transformers': [
+                 {'name': 'update', 'counters': {'in': 1, 'out': 1}},
+                 {'name': 'except', 'counters': {'in': 1, 'errors': 1}},
+             ]},
+        ])
+
+    def test_no_debug_formatting(self):
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        self.useFixture(mockpatch.PatchObject(pipeline.LOG, 'isEnabledFor',
+                                              return_value=False))
+        debug = self.useFixture(mockpatch.PatchObject(pipeline.LOG,
+                                                      'debug')).mock
+        with pipeline_manager.publisher(None) as p:
+            p([self.test_counter])
+        debug.assert_called_once_with(mock.ANY, pipeline_manager.pipelines[0])
+
     def test_multiple_publisher(self):
         self.pipeline_cfg[0]['publishers'] = ['test://', 'new://']
         pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
@@ -631,6 +771,17 @@ class TestPipeline(test.BaseTestCase):
         self.assertEqual(getattr(new_publisher.samples[0], 'name'),
                          'a_update')
 
+    def test_close_publishers(self):
+        self.pipeline_cfg[0]['publishers'] = ['test://', 'new://']
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        publishers = pipeline_manager.pipelines[0].publishers
+        publishers[0].close = mock.Mock(side_effect=Exception)
+        publishers[1].close = mock.Mock()
+        pipeline_manager.close()
+        publishers[0].close.assert_called_once_with()
+        publishers[1].close.assert_called_once_with()
+
     def test_multiple_counter_pipeline(self):
         self.pipeline_cfg[0]['counters'] = ['a', 'b']
         pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
@@ -0,0 +1,84 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/sample.py
+"""
+import copy
+
+import mock
+
+from ceilometer.openstack.common import test
+from ceilometer.publisher import utils
+from ceilometer import sample
+
+
+class TestSample(test.BaseTestCase):
+
+    SAMPLE = sample.Sample(
+        name='test',
+        type=sample.TYPE_CUMULATIVE,
+        unit='',
+        volume=1,
+        user_id='test',
+        project_id='test',
+        resource_id='test_run_tasks',
+        timestamp='2012-05-08T20:23:48.028195',
+        resource_metadata={'name': 'TestPublish'},
+        source='test-source',
+    )
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.SAMPLE, '__dict__'))
+
+    def test_id_is_lazy(self):
+        with mock.patch('uuid.uuid1', return_value='a-uuid') as uuid1:
+            s = copy.copy(self.SAMPLE)
+            s.id = None
+            self.assertFalse(uuid1.called)
+            self.assertEqual(s.id, 'a-uuid')
+            self.assertEqual(s.id, 'a-uuid')
+        self.assertEqual(uuid1.call_count, 1)
+
+    def test_id_given(self):
+        s = sample.Sample('test', sample.TYPE_GAUGE, '', 1, 'user', 'project',
+                          'resource', None, {}, id='my-id')
+        self.assertEqual(s.id, 'my-id')
+
+    def test_as_dict(self):
+        d = self.SAMPLE.as_dict()
+        self.assertEqual(d['name'], 'test')
+        self.assertEqual(d['source'], 'test-source')
+        self.assertEqual(d['id'], self.SAMPLE.id)
+        self.assertEqual(len(d), len(sample.Sample.__slots__))
+
+    def test_to_message(self):
+        msg = self.SAMPLE.to_message()
+        self.assertEqual(msg, {
+            'source': 'test-source',
+            'counter_name': 'test',
+            'counter_type': sample.TYPE_CUMULATIVE,
+            'counter_unit': '',
+            'counter_volume': 1,
+            'user_id': 'test',
+            'project_id': 'test',
+            'resource_id': 'test_run_tasks',
+            'timestamp': '2012-05-08T20:23:48.028195',
+            'resource_metadata': {'name': 'TestPublish'},
+            'message_id': self.SAMPLE.id,
+        })
+
+    def test_to_message_signed(self):
+        msg = utils.meter_message_from_counter(self.SAMPLE, 'not-so-secret')
+        self.assertTrue(utils.verify_signature(msg, 'not-so-secret'))
+        del msg['message_signature']
+        self.assertEqual(msg, self.SAMPLE.to_message())
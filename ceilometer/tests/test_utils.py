@@ -100,3 +100,28 @@ class TestUtils(test.BaseTestCase):
                                  ('nested2[1].c', 'B'),
                                  ('nested.a', 'A'),
                                  ('nested.b', 'B')])
+
+    def test_lru_cache(self):
+        cache = utils.LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_lru_cache_many_lookups(self):
+        cache = utils.LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        for i in range(10):
+            cache.get('b')
+            cache.get('a')
+        self.assertTrue(len(cache._queue) <= 8)
+        cache['c'] = 3
+        self.assertEqual(sorted(cache._items), ['a', 'c'])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
@@ -19,6 +19,7 @@
 """Utilities and helper functions."""
 
 import calendar
+import collections
 import datetime
 import decimal
 
@@ -116,3 +117,63 @@ def dict_to_keyval(value, key_base=None):
                     yield key_gen, v
             else:
                 yield key_gen, v
+
+
+class LRUCache(object):
+    """A mapping holding at most size items, evicting the least recently
+    used ones first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._items = {}
+        # The keys from the least to the most recently used one. A key is
+        # appended each time it's used, _refs counts how many times it is
+        # in the queue so only its last use keeps it in the cache.
+        self._queue = collections.deque()
+        self._refs = collections.defaultdict(int)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _use(self, key):
+        self._queue.append(key)
+        self._refs[key] += 1
+        if len(self._queue) > 4 * self.size:
+            # Drop the older uses of the keys so the queue doesn't grow
+            # with the lookups
+            queue = collections.deque()
+            seen = set()
+            for k in reversed(self._queue):
+                if k not in seen:
+                    seen.add(k)
+                    queue.appendleft(k)
+            self._queue = queue
+            self._refs = collections.defaultdict(int,
+                                                 dict.fromkeys(queue, 1))
+
+    def get(self, key, default=None):
+        try:
+            value = self._items[key]
+        except KeyError:
+            return default
+        self._use(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+        self._use(key)
+        while len(self._items) > self.size:
+            k = self._queue.popleft()
+            self._refs[k] -= 1
+            if not self._refs[k]:
+                del self._refs[k]
+                del self._items[k]
+
+    def clear(self):
+        self._items.clear()
+        self._queue.clear()
+        self._refs.clear()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Command line tool timing the dispatch of samples to pipelines.
+
+For each number of pipelines, it publishes the same batches of samples
+through the routing table of a PipelineManager publisher and by handing
+the whole batch to every pipeline, as publishers used to.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import sys
+import time
+
+from ceilometer import pipeline
+from ceilometer import sample
+
+
+def _time(func, repeat):
+    start = time.time()
+    for i in range(repeat):
+        func()
+    return time.time() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='benchmark the dispatch of samples to pipelines',
+    )
+    parser.add_argument(
+        '--pipelines',
+        default=[1, 10, 50],
+        type=int,
+        nargs='+',
+        help='numbers of pipelines to benchmark',
+    )
+    parser.add_argument(
+        '--meters',
+        default=100,
+        type=int,
+        help='number of distinct meters in a batch',
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=1000,
+        type=int,
+        help='number of samples in a batch',
+    )
+    parser.add_argument(
+        '--repeat',
+        default=100,
+        type=int,
+        help='number of batches to publish',
+    )
+    args = parser.parse_args(argv)
+
+    now = datetime.datetime.utcnow()
+    samples = [sample.Sample(name='meter-%d.bytes' % (i % args.meters),
+                             type=sample.TYPE_GAUGE,
+                             unit='B',
+                             volume=i,
+                             user_id='user-id',
+                             project_id='project-id',
+                             resource_id='resource-%d' % i,
+                             timestamp=now.isoformat(),
+                             resource_metadata={})
+               for i in range(args.batch_size)]
+
+    for count in args.pipelines:
+        # Each pipeline gets a few meters of its own, and the last one
+        # gets everything else
+        cfg = [{'name': 'pipeline-%d' % i,
+                'interval': 60,
+                'meters': ['meter-%d.*' % m
+                           for m in range(i, args.meters, count)],
+                'transformers': None,
+                'publishers': ['test://']}
+               for i in range(count - 1)]
+        cfg.append({'name': 'catch-all',
+                    'interval': 60,
+                    'meters': ['!' + m for c in cfg for m in c['meters']]
+                    or ['*'],
+                    'transformers': None,
+                    'publishers': ['test://']})
+        manager = pipeline.PipelineManager(cfg, None)
+
+        def routed():
+            with manager.publisher(None) as p:
+                p(samples)
+
+        def broadcast():
+            for p in manager.pipelines:
+                p.publish_samples(None, samples)
+
+        routed_time = _time(routed, args.repeat)
+        broadcast_time = _time(broadcast, args.repeat)
+        published = sum(len(p.publishers[0].samples)
+                        for p in manager.pipelines)
+        print('%3d pipelines: routed %.3fs, every pipeline %.3fs (x%.1f), '
+              '%d samples published' % (
+                  count, routed_time, broadcast_time,
+                  broadcast_time / routed_time if routed_time else 0,
+                  published))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Command line tool measuring the cost of the RPC publisher topic modes.
+
+It publishes batches of samples through the RPC publisher with only the
+metering topic, with the metering and the per meter topics, and with the
+per meter topics only. The casts are serialised like the AMQP drivers
+do, but not sent.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import sys
+import time
+
+from oslo.config import cfg
+
+from ceilometer.openstack.common import network_utils
+from ceilometer.openstack.common import rpc
+from ceilometer.openstack.common.rpc import common as rpc_common
+from ceilometer.publisher import rpc as rpc_publisher
+from ceilometer import sample
+
+MODES = [
+    ('metering topic', 'rpc://'),
+    ('metering and meter topics', 'rpc://?per_meter_topic=1'),
+    ('meter topics only', 'rpc://?per_meter_topic=1&aggregate_topic=0'),
+]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='benchmark the RPC publisher topic modes',
+    )
+    parser.add_argument(
+        '--meters',
+        default=20,
+        type=int,
+        help='number of distinct meters in a batch',
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=1000,
+        type=int,
+        help='number of samples in a batch',
+    )
+    parser.add_argument(
+        '--repeat',
+        default=20,
+        type=int,
+        help='number of batches to publish',
+    )
+    args = parser.parse_args(argv)
+
+    cfg.CONF([], project='ceilometer')
+    now = datetime.datetime.utcnow().isoformat()
+    samples = [sample.Sample(name='meter-%d' % (i % args.meters),
+                             type=sample.TYPE_GAUGE,
+                             unit='B',
+                             volume=i,
+                             user_id='user-id',
+                             project_id='project-id',
+                             resource_id='resource-%d' % i,
+                             timestamp=now,
+                             resource_metadata={'host': 'compute-1'})
+               for i in range(args.batch_size)]
+
+    sent = []
+
+    def cast(context, topic, msg):
+        sent.append(len(rpc_common.serialize_msg(msg)['oslo.message']))
+
+    rpc.cast = cast
+    for name, url in MODES:
+        publisher = rpc_publisher.RPCPublisher(network_utils.urlsplit(url))
+        del sent[:]
+        start = time.time()
+        for i in range(args.repeat):
+            publisher.publish_samples(None, samples)
+        elapsed = time.time() - start
+        print('%-26s: %.1fms per batch, %d casts, %.0f KiB serialised '
+              'per batch' % (name, elapsed * 1000 / args.repeat,
+                             len(sent) / args.repeat,
+                             sum(sent) / 1024.0 / args.repeat))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
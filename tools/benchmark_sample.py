@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Command line tool measuring the cost of samples through a pipeline.
+
+It creates samples, publishes them through a pipeline dropping part of
+them and turns the published ones into signed metering messages, once
+with the slotted Sample class and once with a copy of the former
+dictionary based one, reporting the CPU time and the memory used by the
+sample instances.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import gc
+import sys
+import time
+import uuid
+
+from oslo.config import cfg
+
+from ceilometer import pipeline
+from ceilometer.publisher import utils
+from ceilometer import sample
+
+
+class DictSample(object):
+    """The Sample class as it was before using __slots__."""
+
+    def __init__(self, name, type, unit, volume, user_id, project_id,
+                 resource_id, timestamp, resource_metadata, source=None):
+        self.name = name
+        self.type = type
+        self.unit = unit
+        self.volume = volume
+        self.user_id = user_id
+        self.project_id = project_id
+        self.resource_id = resource_id
+        self.timestamp = timestamp
+        self.resource_metadata = resource_metadata
+        self.source = source or cfg.CONF.sample_source
+        self.id = str(uuid.uuid1())
+
+    def to_message(self):
+        return {'source': self.source,
+                'counter_name': self.name,
+                'counter_type': self.type,
+                'counter_unit': self.unit,
+                'counter_volume': self.volume,
+                'user_id': self.user_id,
+                'project_id': self.project_id,
+                'resource_id': self.resource_id,
+                'timestamp': self.timestamp,
+                'resource_metadata': self.resource_metadata,
+                'message_id': self.id,
+                }
+
+
+def _instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def _run(cls, args, secret):
+    manager = pipeline.PipelineManager([{
+        'name': 'benchmark',
+        'interval': 60,
+        'meters': ['!*.dropped'],
+        'transformers': None,
+        'publishers': ['test://'],
+    }], None)
+    publisher = manager.pipelines[0].publishers[0]
+    timestamp = datetime.datetime.utcnow().isoformat()
+
+    start = time.clock()
+    samples = [cls(name='meter-%d%s' % (i % 10,
+                                        '.dropped' if i % 100 < args.dropped
+                                        else ''),
+                   type=sample.TYPE_GAUGE,
+                   unit='B',
+                   volume=i,
+                   user_id='user-id',
+                   project_id='project-id',
+                   resource_id='resource-%d' % (i % 100),
+                   timestamp=timestamp,
+                   resource_metadata={})
+               for i in range(args.samples)]
+    with manager.publisher(None) as p:
+        p(samples)
+    published = time.clock()
+    messages = [utils.meter_message_from_counter(s, secret)
+                for s in publisher.samples]
+    signed = time.clock()
+
+    size = sum(_instance_size(s) for s in samples)
+    return published - start, signed - published, size, len(messages)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='benchmark samples through a pipeline',
+    )
+    parser.add_argument(
+        '--samples',
+        default=100000,
+        type=int,
+        help='number of samples to create',
+    )
+    parser.add_argument(
+        '--dropped',
+        default=20,
+        type=int,
+        help='percentage of samples dropped by the pipeline',
+    )
+    args = parser.parse_args(argv)
+
+    cfg.CONF([], project='ceilometer')
+    secret = cfg.CONF.publisher.metering_secret
+
+    results = []
+    for name, cls in (('dict based', DictSample),
+                      ('slotted', sample.Sample)):
+        gc.collect()
+        results.append(_run(cls, args, secret))
+        publish_time, sign_time, size, published = results[-1]
+        print('%-10s: %d samples, %d published, %.3fs CPU to create and '
+              'publish, %.3fs CPU to sign, %.1f MiB of instances' % (
+                  name, args.samples, published, publish_time, sign_time,
+                  size / 1048576.0))
+    (dict_publish, dict_sign, dict_size, _p), \
+        (slot_publish, slot_sign, slot_size, _p) = results
+    print('CPU x%.2f, memory x%.2f' % (
+        (dict_publish + dict_sign) / (slot_publish + slot_sign),
+        float(dict_size) / slot_size))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
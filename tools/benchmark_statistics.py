@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Command line tool comparing the SQL statistics by period strategies.
+
+It seeds the configured SQL database with samples of a meter and then
+times get_meter_statistics() with the GROUP BY period query and with the
+one-query-per-period fallback, checking both return the same results.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import sys
+import time
+
+from oslo.config import cfg
+
+from ceilometer.publisher import utils
+from ceilometer import sample
+from ceilometer import storage
+from ceilometer.storage import impl_sqlalchemy
+
+
+def _time(func):
+    start = time.time()
+    result = list(func())
+    return time.time() - start, result
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='benchmark SQL statistics by period',
+    )
+    parser.add_argument(
+        '--database-connection',
+        default='sqlite://',
+        help='SQL database to seed and query',
+    )
+    parser.add_argument(
+        '--samples',
+        default=10000,
+        type=int,
+        help='number of samples to seed',
+    )
+    parser.add_argument(
+        '--interval',
+        default=60,
+        type=int,
+        help='the period between samples, in seconds',
+    )
+    parser.add_argument(
+        '--resources',
+        default=10,
+        type=int,
+        help='number of resources the samples are spread on',
+    )
+    parser.add_argument(
+        '--period',
+        default=3600,
+        type=int,
+        help='the statistics period, in seconds',
+    )
+    args = parser.parse_args(argv)
+
+    cfg.CONF([], project='ceilometer')
+    cfg.CONF.set_override('connection', args.database_connection,
+                          group='database')
+    conn = storage.get_connection(cfg.CONF)
+    if not isinstance(conn, impl_sqlalchemy.Connection):
+        print('This benchmark only applies to SQL databases')
+        return 1
+    conn.upgrade()
+    # Write synchronously so the data is there when we query it
+    conn.pool = None
+
+    start = datetime.datetime(2013, 1, 1)
+    samples = []
+    for i in range(args.samples):
+        c = sample.Sample(
+            name='benchmark.meter',
+            type=sample.TYPE_GAUGE,
+            unit='B',
+            volume=i,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id='resource-%d' % (i % args.resources),
+            timestamp=start + datetime.timedelta(seconds=i * args.interval),
+            resource_metadata={},
+            source='benchmark',
+        )
+        samples.append(utils.meter_message_from_counter(
+            c, cfg.CONF.publisher.metering_secret))
+    seeding = time.time()
+    conn.record_metering_data_batch(samples)
+    print('Seeded %d samples in %.2fs' % (args.samples,
+                                          time.time() - seeding))
+
+    for groupby in (None, ['resource_id']):
+        f = storage.SampleFilter(meter='benchmark.meter')
+        grouped, results = _time(lambda: conn.get_meter_statistics(
+            f, period=args.period, groupby=groupby))
+
+        bucket = conn._period_bucket
+        conn._period_bucket = lambda *args: None
+        try:
+            looped, expected = _time(lambda: conn.get_meter_statistics(
+                f, period=args.period, groupby=groupby))
+        finally:
+            conn._period_bucket = bucket
+
+        key = lambda s: (s.period_start, sorted((s.groupby or {}).items()))
+        same = ([s.as_dict() for s in sorted(results, key=key)] ==
+                [s.as_dict() for s in sorted(expected, key=key)])
+        print('groupby=%s: %d statistics, GROUP BY period %.3fs, '
+              'query per period %.3fs (x%.1f)%s' % (
+                  groupby, len(results), grouped, looped,
+                  looped / grouped if grouped else 0,
+                  '' if same else ' RESULTS DIFFER'))
+
+    conn.clear()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))